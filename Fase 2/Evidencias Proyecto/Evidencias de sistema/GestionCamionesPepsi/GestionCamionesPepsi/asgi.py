@@ -13,4 +13,6 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'GestionCamionesPepsi.settings')
 
+# Los eventos en vivo (operaciones/eventos.py) usan un distribuidor en memoria:
+# sirva la aplicación con un único proceso (ej: `uvicorn GestionCamionesPepsi.asgi:application`).
 application = get_asgi_application()
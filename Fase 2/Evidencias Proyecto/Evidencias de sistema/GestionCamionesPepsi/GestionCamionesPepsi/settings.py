@@ -37,6 +37,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir también a los demás middleware. Solo se activa con PERFILADO=1.
+    'operaciones.middleware.PerfiladoMiddleware',
+    'operaciones.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'csp.middleware.CSPMiddleware',  # Añadido para Content Security Policy
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -60,6 +63,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'operaciones.context_processors.contadores_pendientes',
             ],
         },
     },
@@ -71,14 +75,90 @@ WSGI_APPLICATION = 'GestionCamionesPepsi.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# El perfil se elige con DB_MOTOR (sqlite por defecto, o postgresql).
+
+def perfil_base_de_datos(entorno):
+    """Retorna la configuración de la base de datos 'default' según las variables de entorno."""
+    if entorno.get('DB_MOTOR', 'sqlite') == 'postgresql':
+        # Requiere `pip install "psycopg[binary]"`.
+        # Con DB_POOL=1 se usa el pool de psycopg; es incompatible con conexiones persistentes.
+        pool = entorno.get('DB_POOL') == '1'
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': entorno.get('DB_NOMBRE', 'gestion_camiones'),
+            'USER': entorno.get('DB_USUARIO', 'postgres'),
+            'PASSWORD': entorno.get('DB_CLAVE', ''),
+            'HOST': entorno.get('DB_HOST', 'localhost'),
+            'PORT': entorno.get('DB_PUERTO', '5432'),
+            'CONN_MAX_AGE': 0 if pool else int(entorno.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'pool': True} if pool else {},
+        }
+
+    # SQLite con WAL: los lectores no bloquean al que escribe, y las escrituras esperan
+    # su turno (busy_timeout) en vez de fallar con "database is locked".
+    return {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': entorno.get('DB_NOMBRE', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            'timeout': 20,
+            # Toma el bloqueo de escritura al iniciar la transacción, así no falla a mitad de ella.
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA busy_timeout=20000;'
+                'PRAGMA mmap_size=134217728;'
+            ),
+        },
     }
+
+
+DATABASES = {
+    'default': perfil_base_de_datos(os.environ),
 }
 
 
+# Caché (se usa para los paneles de cada rol).
+# La caché en memoria es por proceso: con varios workers se debe usar una compartida (REDIS_URL),
+# si no, la invalidación por señales de un proceso no llega a los demás.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'gestion-camiones',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Historial de auditoría (operaciones/auditoria.py). Por defecto los registros de cada transacción se
+# escriben con un INSERT al confirmarla; con AUDITORIA_EN_SEGUNDO_PLANO=1 un hilo los agrupa entre peticiones.
+AUDITORIA_EN_SEGUNDO_PLANO = os.environ.get('AUDITORIA_EN_SEGUNDO_PLANO') == '1'
+
+# Retención del historial: `manage.py archivar_historial` mueve los registros más antiguos
+# que HISTORIAL_RETENCION_DIAS a archivos mensuales comprimidos en HISTORIAL_ARCHIVO_DIR.
+HISTORIAL_RETENCION_DIAS = int(os.environ.get('HISTORIAL_RETENCION_DIAS', 365))
+HISTORIAL_ARCHIVO_DIR = os.environ.get('HISTORIAL_ARCHIVO_DIR', BASE_DIR / 'archivo_historial')
+
+# Perfilado de peticiones (operaciones/perfilado.py). Con PERFILADO=1 se miden el tiempo, las consultas
+# SQL y el render de plantillas de cada vista; las últimas PERFILADO_MUESTRAS peticiones de cada proceso
+# se ven en /perfilado/ (solo staff) y cada respuesta lleva la cabecera Server-Timing.
+# Desactivado, el middleware se quita de la cadena al arrancar y no agrega ningún costo.
+PERFILADO = os.environ.get('PERFILADO') == '1'
+PERFILADO_MUESTRAS = int(os.environ.get('PERFILADO_MUESTRAS', 1000))
+
+# Métricas para Prometheus en /metrics (operaciones/metricas.py). El scraper debe enviar METRICAS_TOKEN
+# en la cabecera "Authorization: Bearer <token>"; si no está definido, solo el personal staff puede verlas.
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
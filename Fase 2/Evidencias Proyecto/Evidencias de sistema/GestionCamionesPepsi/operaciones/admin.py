@@ -6,7 +6,8 @@ from django.utils.safestring import mark_safe
 from .models import (
     Usuario, Sitio, Taller, Vehiculo, Mantenimiento,
     Documento, FotoMantenimiento, Observacion, Pausa,
-    Agenda_Taller, Insumo, Historial_Cambios
+    Agenda_Taller, Insumo, Historial_Cambios,
+    ResumenMensualKPI, ResumenMensualInsumo, ContadorPendientes, ArchivoHistorial
 )
 
 
@@ -68,3 +69,7 @@ admin.site.register(Taller)
 admin.site.register(Agenda_Taller)
 admin.site.register(Insumo)
 admin.site.register(Historial_Cambios)
+admin.site.register(ResumenMensualKPI)
+admin.site.register(ResumenMensualInsumo)
+admin.site.register(ContadorPendientes)
+admin.site.register(ArchivoHistorial)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OperacionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'operaciones'
+
+    def ready(self):
+        # Registra las señales que invalidan la caché de los paneles.
+        from . import signals  # noqa: F401
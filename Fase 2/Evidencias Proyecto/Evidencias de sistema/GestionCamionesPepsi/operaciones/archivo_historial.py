@@ -0,0 +1,114 @@
+# operaciones/archivo_historial.py
+import gzip
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchivoHistorial, Historial_Cambios
+
+# Columnas que se guardan de cada registro. Se agrega el username porque el usuario
+# puede no existir cuando se consulte el archivo.
+CAMPOS_ARCHIVADOS = [
+    'id', 'fecha_cambio', 'usuario_id', 'usuario__username', 'tipo_cambio', 'tipo_evento',
+    'tabla_afectada', 'id_registro_afectado', 'vehiculo_id', 'mantenimiento_id', 'descripcion',
+]
+# Ids por DELETE al borrar lo archivado (bajo el límite de parámetros de SQLite).
+LOTE_BORRADO = 900
+
+
+def directorio_archivo():
+    return Path(settings.HISTORIAL_ARCHIVO_DIR)
+
+
+def _limites_mes(inicio):
+    """Retorna (inicio, fin) del mes local que comienza en `inicio`."""
+    inicio = timezone.localtime(inicio)
+    año, mes = (inicio.year + 1, 1) if inicio.month == 12 else (inicio.year, inicio.month + 1)
+    fin = timezone.make_aware(datetime(año, mes, 1), inicio.tzinfo)
+    return inicio, fin
+
+
+def archivar_historial(antes_de, simular=False):
+    """
+    Mueve los registros de auditoría anteriores a `antes_de` a archivos JSONL comprimidos,
+    uno por mes (si un mes se archiva en varias pasadas, queda en varios archivos).
+    Cada archivo se escribe completo antes de borrar sus filas, y el borrado junto con el
+    registro en ArchivoHistorial ocurre en una transacción.
+    Con `simular=True` solo cuenta. Retorna una lista de (año, mes, cantidad).
+    """
+    viejos = Historial_Cambios.objects.filter(fecha_cambio__lt=antes_de)
+    meses = (
+        viejos.annotate(mes=TruncMonth('fecha_cambio')).values_list('mes', flat=True)
+        .distinct().order_by('mes')
+    )
+
+    resultado = []
+    for inicio_mes in meses:
+        inicio, fin = _limites_mes(inicio_mes)
+        del_mes = viejos.filter(fecha_cambio__gte=inicio, fecha_cambio__lt=fin).order_by('fecha_cambio', 'id')
+
+        if simular:
+            resultado.append((inicio.year, inicio.month, del_mes.count()))
+            continue
+
+        cantidad = _archivar_mes(del_mes, inicio)
+        if cantidad:
+            resultado.append((inicio.year, inicio.month, cantidad))
+    return resultado
+
+
+def _archivar_mes(registros, inicio):
+    directorio = directorio_archivo()
+    directorio.mkdir(parents=True, exist_ok=True)
+    nombre = f"historial_{inicio:%Y-%m}_{timezone.now():%Y%m%d%H%M%S}.jsonl.gz"
+    ruta = directorio / nombre
+    temporal = ruta.with_name(nombre + '.tmp')
+
+    escritos, desde, hasta = [], None, None
+    with gzip.open(temporal, 'wt', encoding='utf-8') as salida:
+        for fila in registros.values(*CAMPOS_ARCHIVADOS).iterator(chunk_size=2000):
+            desde = desde or fila['fecha_cambio']
+            hasta = fila['fecha_cambio']
+            escritos.append(fila['id'])
+            fila['fecha_cambio'] = fila['fecha_cambio'].isoformat()
+            salida.write(json.dumps(fila, ensure_ascii=False) + '\n')
+
+    cantidad = len(escritos)
+    if not cantidad:
+        temporal.unlink()
+        return 0
+
+    os.replace(temporal, ruta)
+    try:
+        with transaction.atomic():
+            # Se borran solo las filas escritas en el archivo, por id. Un registro del mismo mes que
+            # se inserta después de leerlas (la auditoría se escribe diferida y con la fecha del cambio,
+            # y generar_flota inserta fechas pasadas) no se pierde: queda para la próxima pasada.
+            for i in range(0, cantidad, LOTE_BORRADO):
+                registros.filter(id__in=escritos[i:i + LOTE_BORRADO]).delete()
+            ArchivoHistorial.objects.create(
+                año=inicio.year, mes=inicio.month, archivo=nombre,
+                registros=cantidad, desde=desde, hasta=hasta,
+            )
+    except Exception:
+        ruta.unlink(missing_ok=True)
+        raise
+    return cantidad
+
+
+def leer_archivo(archivo, tipo_evento=None):
+    """Recorre los registros de un ArchivoHistorial, opcionalmente filtrados por tipo de evento."""
+    with gzip.open(directorio_archivo() / archivo.archivo, 'rt', encoding='utf-8') as entrada:
+        for linea in entrada:
+            fila = json.loads(linea)
+            if tipo_evento and fila['tipo_evento'] != tipo_evento:
+                continue
+            fila['fecha_cambio'] = parse_datetime(fila['fecha_cambio'])
+            yield fila
@@ -0,0 +1,108 @@
+# operaciones/asignacion.py
+from django.db import transaction
+from django.db.models import Count
+
+from . import transiciones
+from .models import Mantenimiento, Pausa, Usuario
+
+# Costo base según la especialidad del mecánico frente al tipo de atención del trabajo.
+# Con estos valores un especialista sigue siendo preferido hasta tener 2 trabajos más que un generalista.
+COSTO_ESPECIALISTA = 0
+COSTO_GENERAL = 2
+COSTO_OTRA_ESPECIALIDAD = 4
+
+# Un trabajo con una pausa abierta (ej: esperando repuestos) pesa la mitad que uno en curso.
+PESO_TRABAJO_ACTIVO = 1.0
+PESO_TRABAJO_PAUSADO = 0.5
+
+ESTADOS_EN_CURSO = [Mantenimiento.Estado.DIAGNOSTICO, Mantenimiento.Estado.EN_REPARACION]
+
+
+def costo_especialidad(mecanico, tipo_atencion):
+    if tipo_atencion and mecanico.especialidad == tipo_atencion:
+        return COSTO_ESPECIALISTA
+    if mecanico.especialidad == Usuario.Especialidades.GENERAL:
+        return COSTO_GENERAL
+    return COSTO_OTRA_ESPECIALIDAD
+
+
+def cargas_actuales(mecanicos):
+    """
+    Retorna {id_mecanico: carga} según sus mantenimientos en DIAGNOSTICO/EN_REPARACION,
+    contando con menor peso los que tienen una pausa abierta. Usa dos consultas en total.
+    """
+    ids = [m.id for m in mecanicos]
+    en_curso = dict(
+        Mantenimiento.objects.filter(mecanico_asignado_id__in=ids, estado__in=ESTADOS_EN_CURSO)
+        .values('mecanico_asignado_id').annotate(total=Count('id')).values_list('mecanico_asignado_id', 'total')
+    )
+    pausados = dict(
+        Pausa.objects.filter(
+            fin_pausa__isnull=True,
+            mantenimiento__mecanico_asignado_id__in=ids,
+            mantenimiento__estado__in=ESTADOS_EN_CURSO,
+        ).values('mantenimiento__mecanico_asignado_id')
+        .annotate(total=Count('mantenimiento_id', distinct=True))
+        .values_list('mantenimiento__mecanico_asignado_id', 'total')
+    )
+    return {
+        mecanico_id: (en_curso.get(mecanico_id, 0) - pausados.get(mecanico_id, 0)) * PESO_TRABAJO_ACTIVO
+        + pausados.get(mecanico_id, 0) * PESO_TRABAJO_PAUSADO
+        for mecanico_id in ids
+    }
+
+
+def planificar_asignaciones(trabajos, mecanicos, cargas):
+    """
+    Reparte los trabajos (en orden de llegada) eligiendo para cada uno el mecánico de menor costo:
+    costo de especialidad + carga actual. La carga del elegido aumenta antes del siguiente trabajo.
+    Retorna una lista de pares (trabajo, mecanico). No escribe en la base de datos.
+    """
+    cargas = dict(cargas)
+    asignaciones = []
+    if not mecanicos:
+        return asignaciones
+
+    for trabajo in trabajos:
+        agenda = getattr(trabajo, 'agenda', None)
+        tipo_atencion = agenda.tipo_atencion if agenda else None
+        elegido = min(
+            mecanicos,
+            key=lambda m: (costo_especialidad(m, tipo_atencion) + cargas[m.id], m.first_name, m.id),
+        )
+        cargas[elegido.id] += PESO_TRABAJO_ACTIVO
+        asignaciones.append((trabajo, elegido))
+    return asignaciones
+
+
+def despachar_trabajos_pendientes(usuario=None, simular=False):
+    """
+    Asigna de una vez todos los mantenimientos EN_TALLER sin mecánico, considerando
+    especialidad, carga y pausas abiertas. Las asignaciones y los registros de historial
+    se escriben en bloque dentro de una transacción.
+    Con `simular=True` solo calcula el plan. Retorna la lista de pares (trabajo, mecanico).
+    """
+    with transaction.atomic():
+        trabajos = list(
+            Mantenimiento.objects.select_for_update(of=('self',)).filter(
+                estado=Mantenimiento.Estado.EN_TALLER,
+                mecanico_asignado__isnull=True,
+            ).select_related('vehiculo', 'agenda').order_by('fecha_hora_llegada', 'id')
+        )
+        mecanicos = list(Usuario.objects.filter(rol=Usuario.Roles.MECANICO, is_active=True).order_by('first_name'))
+        asignaciones = planificar_asignaciones(trabajos, mecanicos, cargas_actuales(mecanicos))
+
+        if simular or not asignaciones:
+            return asignaciones
+
+        # Un UPDATE por mecánico; la transición se encarga de contadores, paneles, eventos en vivo
+        # y auditoría (escrita en un solo INSERT al confirmar).
+        por_mecanico = {}
+        for trabajo, mecanico in asignaciones:
+            por_mecanico.setdefault(mecanico, []).append(trabajo)
+        for mecanico, suyos in por_mecanico.items():
+            transiciones.aplicar(
+                transiciones.ASIGNAR, suyos, usuario=usuario, mecanico_asignado=mecanico,
+                descripcion=lambda t: f"Asignación automática de mant. de {t.vehiculo.patente} a {t.mecanico_asignado.display_name}.",
+            )
+    return asignaciones
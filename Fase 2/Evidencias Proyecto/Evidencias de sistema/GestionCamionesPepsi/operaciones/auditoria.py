@@ -0,0 +1,159 @@
+# operaciones/auditoria.py
+import atexit
+import functools
+import json
+import logging
+import queue
+import threading
+import time
+import weakref
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Historial_Cambios
+
+logger = logging.getLogger(__name__)
+
+# Modo en segundo plano (settings.AUDITORIA_EN_SEGUNDO_PLANO): máximo de registros por INSERT
+# y cuánto se espera (segundos) para juntar registros de varias peticiones antes de escribir.
+TAMAÑO_LOTE = 500
+ESPERA_LOTE = 1.0
+# Si un lote no se puede escribir se reintenta, esperando 1, 2, 4... segundos entre intentos.
+REINTENTOS = 5
+
+_local = Local()
+
+
+def registrar(**campos):
+    """
+    Registra un cambio en el historial de auditoría (mismos campos que `Historial_Cambios`).
+    Dentro de una transacción el registro se escribe al confirmarla, junto con los demás de la
+    misma transacción (un solo INSERT), y se descarta si se revierte el bloque o el savepoint
+    en que se registró. Fuera de una transacción el cambio ya está confirmado y se escribe de
+    inmediato. Retorna el registro.
+    """
+    registro = Historial_Cambios(**campos)
+    if not transaction.get_connection().in_atomic_block:
+        _escribir([registro])
+        return registro
+
+    lote = getattr(_local, 'lote', None)
+    if lote is None or not lote.abierto():
+        lote = _local.lote = _LoteTransaccion()
+    lote.agregar(registro)
+    return registro
+
+
+class _LoteTransaccion:
+    """
+    Registros de la transacción en curso (el bloque atómico más externo). Cada registro pone su
+    propio on_commit; Django descarta los de un bloque o savepoint revertido, y el primero que se
+    ejecuta tras confirmar escribe de una vez los registros cuyo on_commit sigue pendiente.
+    Solo se usa la API pública: se sabe qué on_commit siguen pendientes por una referencia débil,
+    que muere cuando Django los descarta.
+    """
+    def __init__(self):
+        self.registros = []
+        self.escrito = False
+
+    def agregar(self, registro):
+        al_confirmar = functools.partial(self._escribir)
+        transaction.on_commit(al_confirmar)
+        self.registros.append((registro, weakref.ref(al_confirmar)))
+
+    def abierto(self):
+        # Si la transacción se revirtió entera, ninguno de sus on_commit sigue pendiente.
+        return not self.escrito and any(pendiente() is not None for _, pendiente in self.registros)
+
+    def _escribir(self):
+        if self.escrito:
+            return
+        self.escrito = True
+        _escribir([registro for registro, pendiente in self.registros if pendiente() is not None])
+
+
+def _escribir(registros):
+    if not registros:
+        return
+    if getattr(settings, 'AUDITORIA_EN_SEGUNDO_PLANO', False):
+        escritor.encolar(registros)
+    else:
+        Historial_Cambios.objects.bulk_create(registros)
+
+
+def _como_dict(registro):
+    return {campo.attname: getattr(registro, campo.attname) for campo in registro._meta.concrete_fields}
+
+
+class EscritorEnSegundoPlano:
+    """
+    Escribe los registros de varias peticiones en un hilo aparte, en lotes de hasta TAMAÑO_LOTE.
+    Al cerrar el proceso de forma ordenada (ej: SIGTERM del servidor) se vacía la cola antes de salir;
+    si el proceso muere abruptamente se pierden los registros aún no escritos.
+    """
+    _FIN = object()
+
+    def __init__(self):
+        self.cola = queue.Queue()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def encolar(self, registros):
+        self._iniciar()
+        for registro in registros:
+            self.cola.put(registro)
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._trabajar, name='auditoria', daemon=True)
+                self._hilo.start()
+
+    def _trabajar(self):
+        terminar = False
+        while not terminar:
+            lote = [self.cola.get()]
+            try:
+                while len(lote) < TAMAÑO_LOTE and lote[-1] is not self._FIN:
+                    lote.append(self.cola.get(timeout=ESPERA_LOTE))
+            except queue.Empty:
+                pass
+
+            if lote[-1] is self._FIN:
+                lote.pop()
+                terminar = True
+            self._guardar(lote)
+        connection.close()
+
+    def _guardar(self, lote):
+        if not lote:
+            return
+        for intento in range(REINTENTOS):
+            try:
+                Historial_Cambios.objects.bulk_create(lote)
+                return
+            except Exception:
+                logger.warning("Falló el intento %s de guardar %s registros de auditoría.", intento + 1, len(lote), exc_info=True)
+                # La conexión puede haber quedado inutilizable (ej: la base de datos se reinició).
+                connection.close()
+                if intento + 1 < REINTENTOS:
+                    time.sleep(2 ** intento)
+        # Se dejan los registros completos en el log para poder recuperarlos a mano.
+        logger.error(
+            "No se pudieron guardar %s registros de auditoría tras %s intentos:\n%s", len(lote), REINTENTOS,
+            '\n'.join(json.dumps(_como_dict(registro), default=str, ensure_ascii=False) for registro in lote),
+        )
+
+    def detener(self, espera=30):
+        """Escribe lo pendiente y detiene el hilo."""
+        with self._lock:
+            hilo = self._hilo
+        if hilo is not None and hilo.is_alive():
+            self.cola.put(self._FIN)
+            hilo.join(espera)
+
+
+escritor = EscritorEnSegundoPlano()
+atexit.register(escritor.detener)
@@ -0,0 +1,112 @@
+# operaciones/busqueda.py
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Historial_Cambios, Mantenimiento, Observacion
+
+# Códigos de origen usados en el rowid del índice (ver migración 0018_busqueda_fts).
+FUENTE_HISTORIAL = 1
+FUENTE_MANTENIMIENTO = 2
+FUENTE_OBSERVACION = 3
+
+LIMITE_RESULTADOS = 50
+
+# fuente -> (nombre para mostrar, queryset con las relaciones que usa la página de resultados)
+_FUENTES = {
+    FUENTE_HISTORIAL: ('Historial', lambda: Historial_Cambios.objects.select_related('usuario', 'vehiculo')),
+    FUENTE_MANTENIMIENTO: ('Mantenimiento', lambda: Mantenimiento.objects.select_related('vehiculo')),
+    FUENTE_OBSERVACION: ('Observación', lambda: Observacion.objects.select_related('usuario', 'mantenimiento__vehiculo')),
+}
+
+# Marcas que pone FTS5 alrededor de los términos encontrados; se cambian por <mark> después de escapar.
+_INICIO, _FIN = '\x02', '\x03'
+
+
+class Resultado:
+    """Un registro encontrado: su tipo, el objeto y un fragmento del texto con los términos marcados."""
+    def __init__(self, tipo, objeto, fragmento):
+        self.tipo = tipo
+        self.objeto = objeto
+        self.fragmento = fragmento
+
+
+def _consulta_fts(texto):
+    """
+    Convierte lo escrito por el usuario en una consulta FTS5 segura: cada palabra entre comillas
+    (sin operadores) y la última como prefijo, para que "frenos trase" encuentre "traseros".
+    """
+    palabras = re.findall(r'\w+', texto)
+    if not palabras:
+        return None
+    terminos = [f'"{p}"' for p in palabras]
+    terminos[-1] += '*'
+    return ' '.join(terminos)
+
+
+def _resaltar(fragmento):
+    return mark_safe(escape(fragmento).replace(_INICIO, '<mark>').replace(_FIN, '</mark>'))
+
+
+def buscar(texto, limite=LIMITE_RESULTADOS):
+    """
+    Busca en el historial de auditoría, los textos de los mantenimientos y las observaciones.
+    Con SQLite usa el índice FTS5, ordenado por relevancia (bm25); en otros motores
+    hace una búsqueda simple por contenido. Retorna una lista de Resultado.
+    """
+    if connection.vendor != 'sqlite':
+        return _buscar_sin_indice(texto, limite)
+
+    consulta = _consulta_fts(texto)
+    if consulta is None:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid, snippet(operaciones_busqueda, 0, %s, %s, '…', 16) "
+            "FROM operaciones_busqueda WHERE operaciones_busqueda MATCH %s ORDER BY rank LIMIT %s",
+            [_INICIO, _FIN, consulta, limite],
+        )
+        coincidencias = [(rowid // 4, rowid % 4, fragmento) for rowid, fragmento in cursor.fetchall()]
+
+    # Una consulta por tipo para traer los objetos encontrados.
+    ids = {fuente: [i for i, f, _ in coincidencias if f == fuente] for fuente in _FUENTES}
+    objetos = {
+        fuente: consulta_fuente().in_bulk(ids[fuente]) if ids[fuente] else {}
+        for fuente, (_, consulta_fuente) in _FUENTES.items()
+    }
+
+    resultados = []
+    for registro_id, fuente, fragmento in coincidencias:
+        objeto = objetos.get(fuente, {}).get(registro_id)
+        if objeto is not None:
+            resultados.append(Resultado(_FUENTES[fuente][0], objeto, _resaltar(fragmento)))
+    return resultados
+
+
+def _buscar_sin_indice(texto, limite):
+    palabras = re.findall(r'\w+', texto)
+    if not palabras:
+        return []
+
+    def filtro(*campos):
+        condicion = Q()
+        for palabra in palabras:
+            condicion &= Q(*[Q(**{f'{c}__icontains': palabra}) for c in campos], _connector=Q.OR)
+        return condicion
+
+    fuentes = [
+        (FUENTE_HISTORIAL, filtro('descripcion'), 'descripcion'),
+        (FUENTE_MANTENIMIENTO, filtro('motivo_ingreso', 'diagnostico', 'trabajo_realizado'), 'motivo_ingreso'),
+        (FUENTE_OBSERVACION, filtro('texto'), 'texto'),
+    ]
+    resultados = []
+    for fuente, condicion, campo in fuentes:
+        tipo, consulta_fuente = _FUENTES[fuente]
+        for objeto in consulta_fuente().filter(condicion)[:limite]:
+            resultados.append(Resultado(tipo, objeto, getattr(objeto, campo)[:200]))
+    return resultados[:limite]
+
@@ -0,0 +1,70 @@
+# operaciones/cache_paneles.py
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Tiempo máximo que vive un panel en caché. La invalidación normal es por señales;
+# esto solo acota cambios que no pasan por ellas (ej: editar el nombre de un usuario).
+TIEMPO_CACHE_PANEL = 5 * 60
+
+
+def _clave_version(rol, usuario_id=None):
+    return f"panel:version:{rol}" if usuario_id is None else f"panel:version:{rol}:{usuario_id}"
+
+
+def _versiones(claves):
+    """
+    Lee las versiones actuales. Una versión que no existe se inicializa con la hora actual
+    para no reutilizar nunca un número anterior (ej: si el backend descartó la clave).
+    """
+    versiones = cache.get_many(claves)
+    for clave in claves:
+        if clave not in versiones:
+            cache.add(clave, time.time_ns(), None)
+            versiones[clave] = cache.get(clave)
+    return [versiones[clave] for clave in claves]
+
+
+def _incrementar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, time.time_ns(), None)
+
+
+def obtener_panel(rol, construir, usuario_id=None):
+    """
+    Retorna los datos de un panel desde la caché o los construye con `construir()`.
+    Los paneles globales de un rol se comparten; los personales llevan `usuario_id`.
+    La clave incluye la versión del rol y la del usuario, así invalidar es solo incrementarlas.
+    """
+    claves_version = [_clave_version(rol)]
+    if usuario_id is not None:
+        claves_version.append(_clave_version(rol, usuario_id))
+    versiones = _versiones(claves_version)
+
+    clave = f"panel:{rol}:{usuario_id or '-'}:" + ":".join(str(v) for v in versiones)
+    datos = cache.get(clave)
+    if datos is None:
+        datos = construir()
+        cache.set(clave, datos, TIEMPO_CACHE_PANEL)
+    return datos
+
+
+def invalidar_paneles(roles=(), usuarios=()):
+    """
+    Invalida los paneles de los `roles` indicados (todos sus usuarios) y los paneles personales
+    de `usuarios`, una lista de pares (rol, usuario_id). Se ejecuta al confirmar la transacción,
+    para que ninguna petición concurrente vuelva a guardar datos sin confirmar.
+    """
+    claves = [_clave_version(rol) for rol in roles]
+    claves += [_clave_version(rol, usuario_id) for rol, usuario_id in usuarios if usuario_id is not None]
+    if not claves:
+        return
+
+    def incrementar():
+        for clave in set(claves):
+            _incrementar(clave)
+
+    transaction.on_commit(incrementar)
@@ -0,0 +1,128 @@
+# operaciones/contadores.py
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.db.models import Count, F
+
+from .models import ContadorPendientes, Insumo, Mantenimiento, SolicitudBackup, Usuario
+
+# Cada contador cuenta las filas de un modelo que cumplen una condición.
+# La condición se evalúa sobre un diccionario de valores (para las señales) y,
+# como filtro, para recalcular desde cero.
+CONTADORES = {
+    'backups_pendientes': (
+        SolicitudBackup,
+        lambda v: v.get('estado') == SolicitudBackup.EstadoSolicitud.PENDIENTE,
+        {'estado': SolicitudBackup.EstadoSolicitud.PENDIENTE},
+    ),
+    'insumos_pendientes': (
+        Insumo,
+        lambda v: v.get('estado_aprobacion') == Insumo.EstadoAprobacion.PENDIENTE,
+        {'estado_aprobacion': Insumo.EstadoAprobacion.PENDIENTE},
+    ),
+    'reparaciones_por_validar': (
+        Mantenimiento,
+        lambda v: v.get('estado') == Mantenimiento.Estado.REPARADO,
+        {'estado': Mantenimiento.Estado.REPARADO},
+    ),
+    'trabajos_por_asignar': (
+        Mantenimiento,
+        lambda v: v.get('estado') == Mantenimiento.Estado.EN_TALLER and 'mecanico_asignado_id' in v and v['mecanico_asignado_id'] is None,
+        {'estado': Mantenimiento.Estado.EN_TALLER, 'mecanico_asignado__isnull': True},
+    ),
+    'llegadas_agendadas': (
+        Mantenimiento,
+        lambda v: v.get('estado') == Mantenimiento.Estado.AGENDADO,
+        {'estado': Mantenimiento.Estado.AGENDADO},
+    ),
+    'trabajos_activos': (
+        Mantenimiento,
+        lambda v: v.get('estado') in (Mantenimiento.Estado.DIAGNOSTICO, Mantenimiento.Estado.EN_REPARACION) and v.get('mecanico_asignado_id') is not None,
+        {'estado__in': [Mantenimiento.Estado.DIAGNOSTICO, Mantenimiento.Estado.EN_REPARACION], 'mecanico_asignado__isnull': False},
+    ),
+}
+
+# Contadores que se llevan por usuario: se guarda uno por cada valor del campo indicado
+# (ej. 'trabajos_activos:7' son los trabajos activos del mecánico 7).
+POR_USUARIO = {
+    'trabajos_activos': 'mecanico_asignado_id',
+}
+
+# Contadores que se muestran a cada rol.
+CONTADORES_POR_ROL = {
+    Usuario.Roles.COORDINACION: ['backups_pendientes', 'insumos_pendientes'],
+    Usuario.Roles.SUPERVISOR: ['reparaciones_por_validar'],
+    Usuario.Roles.JEFE_TALLER: ['trabajos_por_asignar'],
+    Usuario.Roles.MECANICO: ['trabajos_activos'],
+    Usuario.Roles.GUARDIA: ['llegadas_agendadas'],
+    # El chofer no tiene una cola de trabajo pendiente: su panel ya muestra el estado de su vehículo.
+}
+
+
+def contadores_de_modelo(modelo):
+    return [(clave, condicion) for clave, (m, condicion, _) in CONTADORES.items() if m is modelo]
+
+
+def clave_de(clave, valores):
+    """Clave con que se guarda el contador `clave` para una fila con estos valores."""
+    campo = POR_USUARIO.get(clave)
+    return _clave_de_usuario(clave, valores.get(campo)) if campo else clave
+
+
+def _clave_de_usuario(clave, usuario_id):
+    return f'{clave}:{usuario_id}'
+
+
+_local = Local()
+
+
+def ajustar(clave, delta):
+    """Suma `delta` al contador con un UPDATE atómico, dentro de la transacción en curso si la hay."""
+    if not delta:
+        return
+    if getattr(_local, 'acumulados', None) is not None:
+        _local.acumulados[clave] += delta
+    elif not ContadorPendientes.objects.filter(clave=clave).update(valor=F('valor') + delta):
+        # Primer ajuste de un contador por usuario: todavía no tiene fila.
+        _, creado = ContadorPendientes.objects.get_or_create(clave=clave, defaults={'valor': delta})
+        if not creado:
+            ContadorPendientes.objects.filter(clave=clave).update(valor=F('valor') + delta)
+
+
+@contextmanager
+def en_bloque():
+    """Junta los ajustes hechos dentro del bloque y los aplica al salir, un UPDATE por contador."""
+    anteriores = getattr(_local, 'acumulados', None)
+    _local.acumulados = Counter()
+    try:
+        yield
+    finally:
+        acumulados, _local.acumulados = _local.acumulados, anteriores
+    for clave, delta in acumulados.items():
+        ajustar(clave, delta)
+
+
+def leer(claves, usuario_id=None):
+    """
+    Lee los contadores indicados desde la tabla de contadores (nunca recorre las tablas originales).
+    De los contadores por usuario se lee el de `usuario_id`.
+    """
+    guardadas = {clave: _clave_de_usuario(clave, usuario_id) if clave in POR_USUARIO else clave for clave in claves}
+    valores = dict(ContadorPendientes.objects.filter(clave__in=guardadas.values()).values_list('clave', 'valor'))
+    return {clave: valores.get(guardada, 0) for clave, guardada in guardadas.items()}
+
+
+def recalcular():
+    """Recalcula todos los contadores contando las filas reales. Sirve para corregir desajustes."""
+    for clave, (modelo, _, filtro) in CONTADORES.items():
+        campo = POR_USUARIO.get(clave)
+        if not campo:
+            ContadorPendientes.objects.update_or_create(
+                clave=clave, defaults={'valor': modelo.objects.filter(**filtro).count()}
+            )
+            continue
+        ContadorPendientes.objects.filter(clave__startswith=f'{clave}:').update(valor=0)
+        por_usuario = modelo.objects.filter(**filtro).order_by().values(campo).annotate(valor=Count('pk')).values_list(campo, 'valor')
+        for usuario_id, valor in por_usuario:
+            ContadorPendientes.objects.update_or_create(clave=_clave_de_usuario(clave, usuario_id), defaults={'valor': valor})
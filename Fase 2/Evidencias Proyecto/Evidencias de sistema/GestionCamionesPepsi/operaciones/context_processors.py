@@ -0,0 +1,16 @@
+# operaciones/context_processors.py
+from django.utils.functional import SimpleLazyObject
+
+from . import contadores
+
+
+def contadores_pendientes(request):
+    """
+    Expone a todas las plantillas los contadores de trabajo pendiente del rol del usuario
+    como `pendientes`. Se leen de forma perezosa: solo se consultan si la plantilla los usa.
+    """
+    usuario = getattr(request, 'user', None)
+    claves = contadores.CONTADORES_POR_ROL.get(getattr(usuario, 'rol', None), []) if usuario and usuario.is_authenticated else []
+    if not claves:
+        return {'pendientes': {}}
+    return {'pendientes': SimpleLazyObject(lambda: contadores.leer(claves, usuario.pk))}
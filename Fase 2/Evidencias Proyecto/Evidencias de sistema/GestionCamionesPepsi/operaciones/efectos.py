@@ -0,0 +1,142 @@
+# operaciones/efectos.py
+from collections import Counter
+
+from . import contadores
+from .cache_paneles import invalidar_paneles
+from .eventos import publicar_cambio_estado
+from .models import Insumo, Mantenimiento, SolicitudBackup, Usuario, Vehiculo
+
+Roles = Usuario.Roles
+
+# Campos cuyo valor anterior se necesita al guardar: para invalidar el panel de quien deja
+# de tener asignado un registro y para ajustar los contadores de pendientes.
+CAMPOS_ANTERIORES = {
+    Mantenimiento: ['estado', 'mecanico_asignado_id'],
+    Vehiculo: ['chofer_asignado_id'],
+    Insumo: ['estado_aprobacion'],
+    SolicitudBackup: ['estado'],
+}
+
+
+def al_guardar(instancia, anteriores, creado=False):
+    """
+    Efectos de haber guardado `instancia`: contadores de pendientes, caché de paneles, eventos
+    en vivo y mantenimiento activo del vehículo. `anteriores` son los valores de
+    CAMPOS_ANTERIORES antes del cambio ({} si se acaba de crear).
+    Lo llaman los receivers de post_save (save() y create()) y los servicios que cambian filas
+    con un UPDATE, que no emite señales (transiciones.aplicar, actualizar_si).
+    """
+    modelo = type(instancia)
+    if modelo is Mantenimiento:
+        _invalidar_mantenimiento(instancia, anteriores)
+        _ajustar_contadores(instancia, anteriores, creado)
+        _publicar_cambio_estado(instancia, anteriores, creado)
+        _actualizar_mantenimiento_activo(instancia, anteriores, creado)
+    elif modelo is Vehiculo:
+        _invalidar_vehiculo(instancia, anteriores)
+    elif modelo in (Insumo, SolicitudBackup):
+        _ajustar_contadores(instancia, anteriores, creado)
+
+
+def al_eliminar(instancia):
+    """Efectos de haber eliminado `instancia` (caché de paneles y contadores de pendientes)."""
+    modelo = type(instancia)
+    if modelo is Mantenimiento:
+        _invalidar_mantenimiento(instancia, {})
+    elif modelo is Vehiculo:
+        _invalidar_vehiculo(instancia, {})
+    for clave, condicion in contadores.contadores_de_modelo(modelo):
+        if condicion(instancia.__dict__):
+            contadores.ajustar(contadores.clave_de(clave, instancia.__dict__), -1)
+
+
+def actualizar_si(instancia, anteriores, **valores):
+    """
+    Guarda `valores` con un UPDATE condicionado a que la fila siga teniendo los valores
+    `anteriores` (ej. {'estado': PENDIENTE}). Si otro usuario ya la cambió no se actualiza nada
+    y retorna False. Si se actualizó, aplica los efectos del cambio con esos valores anteriores,
+    así los contadores se ajustan una sola vez aunque dos peticiones procesen la misma fila a la vez.
+    """
+    modelo = type(instancia)
+    if not modelo._base_manager.filter(pk=instancia.pk, **anteriores).update(**valores):
+        return False
+    for campo, valor in valores.items():
+        setattr(instancia, campo, valor)
+    al_guardar(instancia, anteriores)
+    return True
+
+
+# --- Caché de paneles ---
+
+def _invalidar_mantenimiento(mantenimiento, anteriores):
+    choferes = {mantenimiento.solicitado_por_id}
+    if Mantenimiento.vehiculo.is_cached(mantenimiento):
+        choferes.add(mantenimiento.vehiculo.chofer_asignado_id)
+
+    invalidar_paneles(
+        roles=[Roles.SUPERVISOR, Roles.JEFE_TALLER],
+        usuarios=[
+            (Roles.MECANICO, mantenimiento.mecanico_asignado_id),
+            (Roles.MECANICO, anteriores.get('mecanico_asignado_id')),
+        ] + [(Roles.CHOFER, chofer_id) for chofer_id in choferes],
+    )
+
+
+def _invalidar_vehiculo(vehiculo, anteriores):
+    # Los datos del vehículo aparecen en los trabajos de todos los paneles de taller.
+    invalidar_paneles(
+        roles=[Roles.SUPERVISOR, Roles.JEFE_TALLER, Roles.MECANICO],
+        usuarios=[
+            (Roles.CHOFER, vehiculo.chofer_asignado_id),
+            (Roles.CHOFER, anteriores.get('chofer_asignado_id')),
+        ],
+    )
+
+
+# --- Contadores de pendientes ---
+# Se ajusta cada contador solo en la diferencia, sin volver a contar la tabla. Las condiciones
+# se evalúan sobre los valores cargados (`__dict__`) para no disparar consultas por campos
+# diferidos; los que no se cargaron conservan su valor anterior. En los contadores por usuario
+# la fila puede pasar de un usuario a otro (ej. reasignar el mecánico).
+
+def _ajustar_contadores(instancia, anteriores, creado):
+    actuales = {**anteriores, **instancia.__dict__}
+    deltas = Counter()
+    for clave, condicion in contadores.contadores_de_modelo(type(instancia)):
+        if not creado and condicion(anteriores):
+            deltas[contadores.clave_de(clave, anteriores)] -= 1
+        if condicion(actuales):
+            deltas[contadores.clave_de(clave, actuales)] += 1
+    for clave, delta in deltas.items():
+        contadores.ajustar(clave, delta)
+
+
+# --- Eventos en vivo ---
+
+def _publicar_cambio_estado(mantenimiento, anteriores, creado):
+    if 'estado' not in mantenimiento.__dict__:
+        return
+    estado_anterior = None if creado else anteriores.get('estado')
+    if creado or estado_anterior != mantenimiento.estado:
+        publicar_cambio_estado(mantenimiento, estado_anterior)
+
+
+# --- Mantenimiento activo del vehículo ---
+# Se ajusta solo cuando un mantenimiento se abre o se finaliza.
+
+def _actualizar_mantenimiento_activo(mantenimiento, anteriores, creado):
+    if 'estado' not in mantenimiento.__dict__:
+        return
+    finalizado = mantenimiento.estado == Mantenimiento.Estado.FINALIZADO
+    estaba_finalizado = True if creado else anteriores.get('estado') == Mantenimiento.Estado.FINALIZADO
+    if finalizado == estaba_finalizado:
+        return
+
+    if finalizado:
+        Vehiculo.objects.filter(patente=mantenimiento.vehiculo_id, mantenimiento_activo=mantenimiento).update(mantenimiento_activo=None)
+    else:
+        Vehiculo.objects.filter(patente=mantenimiento.vehiculo_id).update(mantenimiento_activo=mantenimiento)
+
+    # Mantiene al día el vehículo ya cargado, para que un save() posterior no escriba el valor viejo.
+    if Mantenimiento.vehiculo.is_cached(mantenimiento):
+        mantenimiento.vehiculo.mantenimiento_activo = None if finalizado else mantenimiento
@@ -0,0 +1,116 @@
+# operaciones/eventos.py
+import asyncio
+import json
+import queue
+import threading
+
+from django.db import transaction
+
+from .models import Mantenimiento, Usuario
+
+# Cada cuánto se envía un comentario vacío para mantener viva la conexión y detectar desconexiones.
+INTERVALO_LATIDO = 15
+
+# Roles que deben enterarse cuando un mantenimiento entra o sale de cada estado.
+Estado = Mantenimiento.Estado
+Roles = Usuario.Roles
+ROLES_POR_ESTADO = {
+    Estado.AGENDADO: [Roles.GUARDIA],
+    Estado.EN_TALLER: [Roles.GUARDIA, Roles.JEFE_TALLER],
+    Estado.DIAGNOSTICO: [Roles.JEFE_TALLER],
+    Estado.REPARADO: [Roles.SUPERVISOR],
+    Estado.VALIDADO: [Roles.SUPERVISOR, Roles.GUARDIA],
+    Estado.FINALIZADO: [Roles.GUARDIA],
+}
+ROLES_CON_EVENTOS = sorted({rol for roles in ROLES_POR_ESTADO.values() for rol in roles})
+
+
+class _SuscripcionAsync:
+    """Suscriptor servido por ASGI: recibe los eventos en una cola del event loop."""
+    def __init__(self, loop):
+        self.loop = loop
+        self.cola = asyncio.Queue()
+
+    def entregar(self, evento):
+        # Se puede publicar desde el hilo de una vista síncrona.
+        self.loop.call_soon_threadsafe(self.cola.put_nowait, evento)
+
+
+class _SuscripcionSync:
+    """Suscriptor servido por WSGI (ej: runserver): recibe los eventos en una cola de hilos."""
+    def __init__(self):
+        self.cola = queue.Queue()
+
+    def entregar(self, evento):
+        self.cola.put_nowait(evento)
+
+
+class Broker:
+    """
+    Distribuidor de eventos en memoria, por rol. No necesita servicios externos, pero solo
+    alcanza a los clientes conectados al mismo proceso: se debe servir con un único worker.
+    """
+    def __init__(self):
+        self._suscripciones = {}
+        self._lock = threading.Lock()
+
+    def _suscribir(self, rol, suscripcion):
+        with self._lock:
+            self._suscripciones.setdefault(rol, set()).add(suscripcion)
+
+    def _desuscribir(self, rol, suscripcion):
+        with self._lock:
+            self._suscripciones.get(rol, set()).discard(suscripcion)
+
+    def publicar(self, roles, tipo, datos):
+        mensaje = f"event: {tipo}\ndata: {json.dumps(datos)}\n\n"
+        with self._lock:
+            suscripciones = [s for rol in set(roles) for s in self._suscripciones.get(rol, ())]
+        for suscripcion in suscripciones:
+            suscripcion.entregar(mensaje)
+
+    async def flujo_async(self, rol):
+        suscripcion = _SuscripcionAsync(asyncio.get_running_loop())
+        self._suscribir(rol, suscripcion)
+        try:
+            yield ": conectado\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(suscripcion.cola.get(), INTERVALO_LATIDO)
+                except asyncio.TimeoutError:
+                    yield ": latido\n\n"
+        finally:
+            self._desuscribir(rol, suscripcion)
+
+    def flujo_sync(self, rol):
+        suscripcion = _SuscripcionSync()
+        self._suscribir(rol, suscripcion)
+        try:
+            yield ": conectado\n\n"
+            while True:
+                try:
+                    yield suscripcion.cola.get(timeout=INTERVALO_LATIDO)
+                except queue.Empty:
+                    yield ": latido\n\n"
+        finally:
+            self._desuscribir(rol, suscripcion)
+
+
+broker = Broker()
+
+
+def publicar_cambio_estado(mantenimiento, estado_anterior):
+    """
+    Avisa a los roles interesados que un mantenimiento cambió de estado.
+    Se publica al confirmar la transacción, para que los clientes no lean datos sin confirmar.
+    """
+    roles = ROLES_POR_ESTADO.get(estado_anterior, []) + ROLES_POR_ESTADO.get(mantenimiento.estado, [])
+    if not roles:
+        return
+    datos = {
+        'id': mantenimiento.id,
+        'patente': mantenimiento.vehiculo_id,
+        'estado': mantenimiento.estado,
+        'estado_anterior': estado_anterior,
+    }
+    transaction.on_commit(lambda: broker.publicar(roles, 'mantenimiento', datos))
@@ -0,0 +1,127 @@
+# operaciones/exports.py
+import csv
+import tempfile
+from bisect import bisect_left
+
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+# Cantidad de filas que se traen desde la base de datos en cada viaje del cursor.
+CHUNK_SIZE = 2000
+
+COLUMNAS_REPORTE_MANTENIMIENTOS = [
+    'ID Mantenimiento', 'Patente', 'Vehículo', 'Mecánico', 'Especialidad Mecánico',
+    'Chofer', 'Fecha Solicitud', 'Fecha Finalización', 'Horas en Taller', 'Taller',
+    'Sitio del Vehículo', 'Diagnóstico', 'Trabajo Realizado', 'Backup Otorgado', 'Patente Backup',
+]
+
+
+class IndiceBackups:
+    """
+    Índice de backups entregados, agrupados por chofer y ordenados por fecha de atención.
+    Permite encontrar el backup que cae dentro del intervalo de un mantenimiento con
+    búsqueda binaria, en vez de recorrer todas las solicitudes del chofer.
+    """
+    def __init__(self, solicitudes):
+        # `solicitudes` debe venir ordenado por chofer y fecha de atención.
+        self._fechas = {}
+        self._patentes = {}
+        for sb in solicitudes:
+            self._fechas.setdefault(sb.chofer_id, []).append(sb.fecha_atencion)
+            # La patente es la clave primaria de Vehiculo, así que no hace falta el JOIN.
+            self._patentes.setdefault(sb.chofer_id, []).append(sb.vehiculo_asignado_id)
+
+    def buscar(self, chofer_id, desde, hasta):
+        """
+        Retorna la patente del primer backup atendido entre `desde` y `hasta` (inclusive),
+        o None si no hay. Un extremo en None se considera abierto.
+        """
+        fechas = self._fechas.get(chofer_id)
+        if not fechas:
+            return None
+        i = bisect_left(fechas, desde) if desde else 0
+        if i < len(fechas) and (hasta is None or fechas[i] <= hasta):
+            return self._patentes[chofer_id][i]
+        return None
+
+
+def filas_reporte_mantenimientos(mantenimientos, indice_backups):
+    """
+    Genera, una a una, las filas del reporte de mantenimientos finalizados.
+    Recorre el queryset con un cursor (`iterator`) para no cargar el año completo en memoria.
+    """
+    for mant in mantenimientos.iterator(chunk_size=CHUNK_SIZE):
+        horas_en_taller = 'N/A'
+        if mant.fecha_hora_llegada and mant.fecha_salida_real:
+            delta = mant.fecha_salida_real - mant.fecha_hora_llegada
+            horas_en_taller = round(delta.total_seconds() / 3600, 2)
+
+        # Backup entregado al chofer mientras el vehículo estaba en el taller.
+        backup_patente = indice_backups.buscar(mant.solicitado_por_id, mant.fecha_hora_llegada, mant.fecha_salida_real)
+
+        yield [
+            mant.id,
+            mant.vehiculo.patente,
+            f"{mant.vehiculo.marca} {mant.vehiculo.modelo}",
+            mant.mecanico_asignado.display_name if mant.mecanico_asignado else "N/A",
+            mant.mecanico_asignado.get_especialidad_display() if mant.mecanico_asignado else "N/A",
+            mant.solicitado_por.display_name if mant.solicitado_por else "N/A",
+            mant.fecha_solicitud.strftime('%Y-%m-%d'),
+            mant.fecha_salida_real.strftime('%Y-%m-%d'),
+            horas_en_taller,
+            mant.taller.nombre_taller if mant.taller else "N/A",
+            mant.vehiculo.sitio.nombre_sitio if mant.vehiculo.sitio else "N/A",
+            mant.diagnostico,
+            mant.trabajo_realizado,
+            "Sí" if backup_patente else "No",
+            backup_patente or "N/A",
+        ]
+
+
+class _Eco:
+    """Objeto tipo archivo que devuelve lo escrito en vez de guardarlo (para csv.writer)."""
+    def write(self, value):
+        return value
+
+
+def respuesta_csv(columnas, filas, nombre_archivo):
+    """
+    Respuesta CSV en streaming: cada fila se envía al cliente apenas se genera,
+    por lo que la memoria usada no depende de la cantidad de filas.
+    """
+    writer = csv.writer(_Eco())
+
+    def contenido():
+        yield '\ufeff'  # BOM para que Excel reconozca el UTF-8.
+        yield writer.writerow(columnas)
+        for fila in filas:
+            yield writer.writerow(fila)
+
+    response = StreamingHttpResponse(contenido(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.csv"'
+    return response
+
+
+def respuesta_xlsx(columnas, filas, nombre_archivo, titulo_hoja='Hoja1'):
+    """
+    Respuesta Excel construida con un libro `write_only` de openpyxl.
+    Las filas se escriben directo a disco a medida que llegan, y el archivo
+    temporal resultante se envía por bloques con FileResponse.
+    """
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(title=titulo_hoja)
+    hoja.append(columnas)
+    for fila in filas:
+        hoja.append(fila)
+
+    # El archivo temporal se elimina solo cuando FileResponse lo cierra.
+    archivo = tempfile.TemporaryFile(suffix='.xlsx')
+    libro.save(archivo)
+    archivo.seek(0)
+
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f"{nombre_archivo}.xlsx",
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
@@ -0,0 +1,350 @@
+# operaciones/flota_sintetica.py
+import random
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from . import contadores
+from .cache_paneles import invalidar_paneles
+from .kpis import reconstruir_resumenes
+from .models import (
+    Agenda_Taller, Historial_Cambios, Insumo, Mantenimiento, Observacion, Pausa, Sitio,
+    SolicitudBackup, Taller, Usuario, Vehiculo,
+)
+
+Roles = Usuario.Roles
+Estado = Mantenimiento.Estado
+EstadoVehiculo = Vehiculo.EstadoVehiculo
+TipoEvento = Historial_Cambios.TipoEvento
+
+# Todo lo generado lleva este prefijo (usuarios, sitios y talleres) para reconocerlo.
+PREFIJO = 'sint'
+CLAVE_PREDETERMINADA = 'flota-sintetica'
+
+MODELOS = [('Volvo', 'FH'), ('Volvo', 'FM'), ('Scania', 'R450'), ('Mercedes-Benz', 'Actros'), ('Iveco', 'Stralis'), ('Hino', '500')]
+NOMBRES = ['Juan', 'María', 'Pedro', 'Camila', 'Luis', 'Valentina', 'Jorge', 'Francisca', 'Carlos', 'Javiera']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda']
+
+# motivo del chofer -> (diagnóstico, trabajo realizado, insumos posibles, tipo de atención)
+FALLAS = [
+    ("Ruido al frenar", "Pastillas de freno gastadas", "Cambio de pastillas delanteras",
+     ['Pastillas de freno', 'Líquido de frenos'], Agenda_Taller.TipoAtencion.MECANICA),
+    ("Mantención preventiva por kilometraje", "Sin observaciones", "Cambio de aceite y filtros",
+     ['Aceite de motor', 'Filtro de aceite', 'Filtro de aire'], Agenda_Taller.TipoAtencion.RUTINA),
+    ("Luces traseras no encienden", "Fusible y ampolleta quemados", "Reemplazo de fusible y ampolletas",
+     ['Fusible', 'Ampolleta'], Agenda_Taller.TipoAtencion.ELECTRICIDAD),
+    ("Batería no carga", "Alternador con falla", "Reparación de alternador y cambio de batería",
+     ['Batería', 'Escobillas de alternador'], Agenda_Taller.TipoAtencion.ELECTRICIDAD),
+    ("Pérdida de potencia en subidas", "Filtro de combustible tapado", "Cambio de filtro de combustible",
+     ['Filtro de combustible'], Agenda_Taller.TipoAtencion.MECANICA),
+    ("Vibración en el volante", "Neumáticos desbalanceados", "Balanceo y alineación",
+     ['Neumático', 'Contrapesos'], Agenda_Taller.TipoAtencion.MECANICA),
+    ("Permiso de circulación por vencer", "Revisión técnica pendiente", "Revisión de documentos y luces",
+     [], Agenda_Taller.TipoAtencion.DOCUMENTACION),
+]
+MOTIVOS_PAUSA = ['Esperando repuestos', 'Colación', 'Apoyo en otro vehículo', 'Esperando aprobación de insumo']
+OBSERVACIONES_GUARDIA = ['rayón lateral', 'espejo trizado', 'sin observaciones visibles', 'parachoques suelto']
+
+# Estados de los mantenimientos abiertos, con su peso relativo.
+ESTADOS_ABIERTOS = [
+    (Estado.AGENDADO, 4), (Estado.EN_TALLER, 2), (Estado.DIAGNOSTICO, 3),
+    (Estado.EN_REPARACION, 3), (Estado.REPARADO, 2), (Estado.VALIDADO, 1),
+]
+_ORDEN = [Estado.AGENDADO, Estado.EN_TALLER, Estado.DIAGNOSTICO, Estado.EN_REPARACION, Estado.REPARADO, Estado.VALIDADO, Estado.FINALIZADO]
+
+
+def _alcanzo(estado, etapa):
+    return _ORDEN.index(estado) >= _ORDEN.index(etapa)
+
+
+def hay_datos_sinteticos():
+    return Usuario.objects.filter(username__startswith=f'{PREFIJO}_').exists()
+
+
+class _Generador:
+    def __init__(self, semilla, hasta, clave, lote):
+        self.azar = random.Random(semilla)
+        self.hasta = hasta
+        self.lote = lote
+        self.clave = make_password(clave)  # Un solo hash: calcularlo por usuario tomaría minutos.
+        self.creados = Counter()
+
+    def _crear(self, modelo, objetos, fechas=()):
+        """
+        Inserta `objetos` por lotes. `fechas` son campos con auto_now_add que se fijaron a mano
+        para repartir el historial en el tiempo: bulk_create los pisa con la hora actual, así
+        que se restauran después con bulk_update.
+        """
+        fijadas = [[getattr(objeto, campo) for campo in fechas] for objeto in objetos] if fechas else None
+        objetos = modelo.objects.bulk_create(objetos, batch_size=self.lote)
+        if fechas:
+            for objeto, valores in zip(objetos, fijadas):
+                for campo, valor in zip(fechas, valores):
+                    setattr(objeto, campo, valor)
+            modelo.objects.bulk_update(objetos, fechas, batch_size=self.lote)
+        self.creados[modelo.__name__] += len(objetos)
+        return objetos
+
+    def _hora_habil(self, dia):
+        hora = time(self.azar.randint(8, 17), self.azar.choice([0, 30]))
+        return timezone.make_aware(datetime.combine(dia, hora))
+
+    def usuarios(self, rol, cantidad):
+        especialidades = list(Usuario.Especialidades)
+        return self._crear(Usuario, [
+            Usuario(
+                username=f'{PREFIJO}_{rol.lower()}_{i:04d}', password=self.clave, rol=rol,
+                first_name=self.azar.choice(NOMBRES), last_name=self.azar.choice(APELLIDOS),
+                especialidad=especialidades[i % len(especialidades)] if rol == Roles.MECANICO else None,
+            )
+            for i in range(1, cantidad + 1)
+        ])
+
+    def maestros(self, sitios, talleres, usuarios_por_rol, choferes):
+        self.sitios = self._crear(Sitio, [Sitio(nombre_sitio=f'{PREFIJO} sitio {i:03d}') for i in range(1, sitios + 1)])
+        self.talleres = self._crear(Taller, [
+            Taller(nombre_taller=f'{PREFIJO} taller {i:03d}', ubicacion=self.sitios[i % sitios].nombre_sitio)
+            for i in range(talleres)
+        ])
+        self.personal = {
+            rol: self.usuarios(rol, choferes if rol == Roles.CHOFER else usuarios_por_rol)
+            for rol in Roles
+        }
+
+    def vehiculos(self, cantidad, backups, proporcion_abiertos):
+        """La flota y los backups. Cada vehículo lleva en `_abierto` el estado de su mantenimiento en curso, si tiene."""
+        choferes = self.personal[Roles.CHOFER]
+        estados, pesos = zip(*ESTADOS_ABIERTOS)
+        flota = []
+        for i in range(cantidad):
+            marca, modelo = self.azar.choice(MODELOS)
+            vehiculo = Vehiculo(
+                patente=f'SN{i:05d}', marca=marca, modelo=modelo, año=self.azar.randint(2012, self.hasta.year),
+                sitio=self.azar.choice(self.sitios), chofer_asignado=choferes[i % len(choferes)],
+                estado_actual=EstadoVehiculo.EN_RUTA,
+            )
+            vehiculo._abierto = None
+            if self.azar.random() < 0.02:
+                vehiculo.estado_actual = EstadoVehiculo.DE_BAJA
+            elif self.azar.random() < proporcion_abiertos:
+                vehiculo._abierto = self.azar.choices(estados, pesos)[0]
+                if vehiculo._abierto == Estado.VALIDADO:
+                    vehiculo.estado_actual = EstadoVehiculo.DISPONIBLE
+                elif vehiculo._abierto != Estado.AGENDADO:
+                    vehiculo.estado_actual = EstadoVehiculo.EN_TALLER
+            flota.append(vehiculo)
+        for i in range(backups):
+            marca, modelo = self.azar.choice(MODELOS)
+            en_uso = self.azar.random() < 0.3
+            vehiculo = Vehiculo(
+                patente=f'SB{i:04d}', marca=marca, modelo=modelo, año=self.azar.randint(2012, self.hasta.year),
+                sitio=self.azar.choice(self.sitios), es_backup=True,
+                chofer_asignado=self.azar.choice(choferes) if en_uso else None,
+                estado_actual=self.azar.choice([EstadoVehiculo.ASIGNADO, EstadoVehiculo.EN_RUTA]) if en_uso else EstadoVehiculo.DISPONIBLE,
+            )
+            vehiculo._abierto = None
+            flota.append(vehiculo)
+        return self._crear(Vehiculo, flota)
+
+    def _mantenimiento(self, vehiculo, solicitud, estado):
+        """
+        Un mantenimiento en `estado`, con fechas y responsables coherentes con las etapas que pasó.
+        Desde la solicitud hasta la salida pasan a lo más 9 días.
+        """
+        motivo, diagnostico, trabajo, insumos, tipo = self.azar.choice(FALLAS)
+        llegada = solicitud + timedelta(hours=self.azar.randint(2, 72))
+        cita = llegada if estado != Estado.AGENDADO else self._hora_habil((self.hasta + timedelta(days=self.azar.randint(1, 7))).date())
+        reparado = llegada + timedelta(hours=self.azar.randint(3, 96))
+        validado = reparado + timedelta(hours=self.azar.randint(1, 24))
+        asignado = _alcanzo(estado, Estado.DIAGNOSTICO)
+        m = Mantenimiento(
+            vehiculo=vehiculo, estado=estado, taller=self.azar.choice(self.talleres), motivo_ingreso=motivo,
+            solicitado_por=vehiculo.chofer_asignado or self.azar.choice(self.personal[Roles.CHOFER]),
+            fecha_solicitud=solicitud,
+            fecha_hora_llegada=llegada if _alcanzo(estado, Estado.EN_TALLER) else None,
+            fecha_salida_estimada=llegada + timedelta(days=2),
+            mecanico_asignado=self.azar.choice(self.personal[Roles.MECANICO]) if asignado else None,
+            diagnostico=diagnostico if asignado else '',
+            trabajo_realizado=trabajo if _alcanzo(estado, Estado.REPARADO) else '',
+            validado_por=self.azar.choice(self.personal[Roles.SUPERVISOR]) if _alcanzo(estado, Estado.VALIDADO) else None,
+            fecha_validacion=validado if _alcanzo(estado, Estado.VALIDADO) else None,
+            fecha_salida_real=validado + timedelta(hours=self.azar.randint(1, 8)) if estado == Estado.FINALIZADO else None,
+        )
+        m._plan = (insumos, tipo, cita, reparado)
+        return m
+
+    def historial_de(self, vehiculo, desde, por_año):
+        """Mantenimientos finalizados repartidos entre `desde` y `hasta`, más el abierto si corresponde."""
+        dias = (self.hasta - desde).days
+        cantidad = max(0, round(self.azar.gauss(por_año * dias / 365, 1)))
+        inicios = sorted(self.azar.randrange(dias - 10) for _ in range(cantidad))
+        mantenimientos = [
+            self._mantenimiento(vehiculo, self._hora_habil((desde + timedelta(days=d)).date()), Estado.FINALIZADO)
+            for d in inicios
+        ]
+        if vehiculo._abierto:
+            # Los agendados se pidieron hace poco y tienen la cita en los próximos días; el resto
+            # se pidió con margen para haber pasado por sus etapas antes de `hasta`.
+            atras = timedelta(hours=self.azar.randint(1, 48)) if vehiculo._abierto == Estado.AGENDADO \
+                else timedelta(days=self.azar.randint(10, 15))
+            mantenimientos.append(self._mantenimiento(vehiculo, self.hasta - atras, vehiculo._abierto))
+        return mantenimientos
+
+    def detalles(self, mantenimientos):
+        """Agenda, insumos, pausas, observaciones y auditoría de cada mantenimiento."""
+        personal = self.personal
+        agenda, insumos, pausas, observaciones, historial = [], [], [], [], []
+
+        def evento(m, tipo, usuario, fecha, descripcion, tipo_cambio=Historial_Cambios.TipoCambio.EDICION):
+            historial.append(Historial_Cambios(
+                usuario=usuario, tipo_cambio=tipo_cambio, tipo_evento=tipo, tabla_afectada='Mantenimiento',
+                id_registro_afectado=m.id, vehiculo_id=m.vehiculo_id, mantenimiento=m,
+                descripcion=descripcion, fecha_cambio=fecha,
+            ))
+
+        for m in mantenimientos:
+            nombres_insumo, tipo_atencion, cita, reparado = m._plan
+            patente = m.vehiculo_id
+            agenda.append(Agenda_Taller(
+                taller=m.taller, mantenimiento=m, tipo_atencion=tipo_atencion,
+                hora_inicio=cita, hora_final=cita + timedelta(hours=1),
+            ))
+            evento(m, TipoEvento.SOLICITUD_MANTENIMIENTO, m.solicitado_por, m.fecha_solicitud,
+                   f"Chofer solicitó mantenimiento para el {timezone.localtime(cita):%d/%m}",
+                   tipo_cambio=Historial_Cambios.TipoCambio.CREACION)
+            if not m.fecha_hora_llegada:
+                continue
+
+            guardia = self.azar.choice(personal[Roles.GUARDIA])
+            evento(m, TipoEvento.ENTRADA_TALLER, guardia, m.fecha_hora_llegada,
+                   f"Vehículo {patente} ingresó al taller para mantenimiento #{m.id} a las {timezone.localtime(m.fecha_hora_llegada):%H:%M}.")
+            if self.azar.random() < 0.3:
+                observaciones.append(Observacion(
+                    mantenimiento=m, usuario=guardia, tipo=Observacion.Tipo.ENTRADA_GUARDIA,
+                    texto=f"OBSERVACIÓN DE GUARDIA (ENTRADA): {self.azar.choice(OBSERVACIONES_GUARDIA)}",
+                    fecha=m.fecha_hora_llegada,
+                ))
+            mecanico = m.mecanico_asignado
+            if not mecanico:
+                continue
+
+            asignacion = m.fecha_hora_llegada + timedelta(minutes=self.azar.randint(10, 180))
+            evento(m, TipoEvento.ASIGNACION_MECANICO, self.azar.choice(personal[Roles.JEFE_TALLER]), asignacion,
+                   f"Jefe de Taller asignó mant. de {patente} a {mecanico.display_name}.")
+
+            reparando = _alcanzo(m.estado, Estado.EN_REPARACION)
+            for nombre in nombres_insumo:
+                if self.azar.random() < 0.6:
+                    continue
+                pedido = asignacion + timedelta(hours=1)
+                resuelto = _alcanzo(m.estado, Estado.REPARADO) or (reparando and self.azar.random() < 0.7)
+                estado = (Insumo.EstadoAprobacion.APROBADO if self.azar.random() < 0.9 else Insumo.EstadoAprobacion.RECHAZADO) \
+                    if resuelto else Insumo.EstadoAprobacion.PENDIENTE
+                insumos.append(Insumo(
+                    mantenimiento=m, nombre_insumo=nombre, cantidad=self.azar.randint(1, 4), solicitado_por=mecanico,
+                    fecha_solicitud=pedido, estado_aprobacion=estado,
+                    aprobado_por=self.azar.choice(personal[Roles.COORDINACION]) if resuelto else None,
+                    fecha_aprobacion=pedido + timedelta(hours=self.azar.randint(1, 12)) if resuelto else None,
+                ))
+
+            for n in range(self.azar.choice([0, 0, 1, 1, 2]) if reparando else 0):
+                inicio = asignacion + timedelta(hours=2 + 3 * n)
+                # Una pausa abierta solo en los trabajos que siguen en reparación.
+                abierta = m.estado == Estado.EN_REPARACION and n == 0 and self.azar.random() < 0.3
+                pausas.append(Pausa(
+                    mantenimiento=m, mecanico=mecanico, motivo=self.azar.choice(MOTIVOS_PAUSA), inicio_pausa=inicio,
+                    fin_pausa=None if abierta else inicio + timedelta(minutes=self.azar.randint(10, 120)),
+                ))
+
+            if _alcanzo(m.estado, Estado.REPARADO):
+                evento(m, TipoEvento.CIERRE_REPARACION, mecanico, reparado, "Mecánico marcó la reparación como finalizada.")
+            if m.validado_por:
+                if self.azar.random() < 0.05:
+                    observaciones.append(Observacion(
+                        mantenimiento=m, usuario=m.validado_por, tipo=Observacion.Tipo.RECHAZO_SUPERVISOR,
+                        texto="Falta ajustar el trabajo antes de validar.", fecha=reparado,
+                    ))
+                evento(m, TipoEvento.VALIDACION_REPARACION, m.validado_por, m.fecha_validacion,
+                       f"Reparación validada por supervisor. Patente: {patente}")
+            if m.fecha_salida_real:
+                evento(m, TipoEvento.SALIDA_TALLER, self.azar.choice(personal[Roles.GUARDIA]), m.fecha_salida_real,
+                       f"Vehículo {patente} salió del taller. Mantenimiento #{m.id} finalizado.")
+
+        self._crear(Agenda_Taller, agenda)
+        self._crear(Insumo, insumos)
+        self._crear(Pausa, pausas, fechas=['inicio_pausa'])
+        self._crear(Observacion, observaciones, fechas=['fecha'])
+        self._crear(Historial_Cambios, historial)
+
+    def bloques_libres(self, dias, por_dia):
+        """Horarios sin reservar en cada taller para los próximos `dias` días hábiles."""
+        bloques = []
+        for taller in self.talleres:
+            for d in range(1, dias + 1):
+                dia = (self.hasta + timedelta(days=d)).date()
+                if dia.weekday() >= 5:
+                    continue
+                for hora in sorted(self.azar.sample(range(8, 18), min(por_dia, 10))):
+                    inicio = timezone.make_aware(datetime.combine(dia, time(hora)))
+                    bloques.append(Agenda_Taller(
+                        taller=taller, tipo_atencion=self.azar.choice(list(Agenda_Taller.TipoAtencion)),
+                        hora_inicio=inicio, hora_final=inicio + timedelta(hours=1),
+                    ))
+        self._crear(Agenda_Taller, bloques)
+
+    def solicitudes_backup(self, proporcion):
+        self._crear(SolicitudBackup, [
+            SolicitudBackup(chofer=chofer, motivo="Vehículo en taller",
+                            fecha_solicitud=self.hasta - timedelta(hours=self.azar.randint(1, 48)))
+            for chofer in self.personal[Roles.CHOFER] if self.azar.random() < proporcion
+        ], fechas=['fecha_solicitud'])
+
+
+def generar_flota(
+    sitios=5, talleres=3, usuarios_por_rol=5, choferes=None, vehiculos=200, backups=20,
+    años=3, mantenimientos_por_año=4, proporcion_abiertos=0.15, semilla=1, hasta=None,
+    clave=CLAVE_PREDETERMINADA, lote=1000,
+):
+    """
+    Llena la base de datos con una flota sintética: sitios, talleres, usuarios de cada rol
+    (`choferes`, por defecto uno por vehículo), vehículos y backups, y `años` de historial de
+    mantenimientos con su agenda, insumos, pausas, observaciones y auditoría.
+
+    Con la misma `semilla`, parámetros y fecha `hasta` (por defecto, ahora) genera los mismos datos.
+    Se inserta con bulk_create por lotes de `lote` filas y los vehículos se procesan en grupos, así
+    que la memoria no crece con el tamaño de la flota. Como bulk_create no emite señales, al final
+    se recalculan el mantenimiento activo de cada vehículo, los contadores y los resúmenes de KPIs.
+    Retorna un Counter con las filas creadas por modelo.
+    """
+    hasta = hasta or timezone.now()
+    generador = _Generador(semilla, hasta, clave, lote)
+    desde = hasta - timedelta(days=365 * años)
+
+    with transaction.atomic():
+        generador.maestros(sitios, talleres, usuarios_por_rol, choferes or max(vehiculos, 1))
+        flota = generador.vehiculos(vehiculos, backups, proporcion_abiertos)
+        generador.bloques_libres(dias=14, por_dia=6)
+        generador.solicitudes_backup(0.05)
+
+    # Grupos de vehículos con alrededor de `lote` mantenimientos cada uno.
+    por_grupo = max(1, lote // max(1, años * mantenimientos_por_año))
+    for inicio in range(0, len(flota), por_grupo):
+        with transaction.atomic():
+            mantenimientos = []
+            for vehiculo in flota[inicio:inicio + por_grupo]:
+                mantenimientos += generador.historial_de(vehiculo, desde, mantenimientos_por_año)
+
+            generador.detalles(generador._crear(Mantenimiento, mantenimientos))
+
+    with transaction.atomic():
+        Vehiculo.objects.filter(sitio__in=generador.sitios).update(mantenimiento_activo=Subquery(
+            Mantenimiento.objects.filter(vehiculo_id=OuterRef('pk')).exclude(estado=Estado.FINALIZADO).values('id')[:1]
+        ))
+        contadores.recalcular()
+        reconstruir_resumenes()
+        invalidar_paneles(roles=list(Roles))
+    return generador.creados
@@ -285,4 +285,10 @@ class MantenimientoSolicitudForm(forms.ModelForm):
         if user:
             self.fields['vehiculo'].queryset = Vehiculo.objects.filter(chofer_asignado=user)
             if self.fields['vehiculo'].queryset.count() == 1:
-                self.fields['vehiculo'].initial = self.fields['vehiculo'].queryset.first()
\ No newline at end of file
+                self.fields['vehiculo'].initial = self.fields['vehiculo'].queryset.first()
+
+    def clean_vehiculo(self):
+        vehiculo = self.cleaned_data['vehiculo']
+        if vehiculo.mantenimiento_activo_id:
+            raise forms.ValidationError("Este vehículo ya tiene un mantenimiento en curso.")
+        return vehiculo
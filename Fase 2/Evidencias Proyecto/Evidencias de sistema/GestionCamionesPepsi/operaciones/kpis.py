@@ -0,0 +1,112 @@
+# operaciones/kpis.py
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from .models import Insumo, Mantenimiento, ResumenMensualInsumo, ResumenMensualKPI
+
+
+def registrar_mantenimiento_finalizado(mantenimiento):
+    """
+    Suma un mantenimiento recién FINALIZADO a los resúmenes mensuales de KPIs.
+    Debe llamarse una sola vez, en el momento en que el mantenimiento se cierra.
+    """
+    fecha_local = timezone.localtime(mantenimiento.fecha_salida_real)
+    periodo = {
+        'año': fecha_local.year,
+        'mes': fecha_local.month,
+        'taller_id': mantenimiento.taller_id,
+        'sitio_id': mantenimiento.vehiculo.sitio_id,
+    }
+
+    insumos = list(
+        mantenimiento.insumos.values('nombre_insumo').annotate(total=Count('id'))
+    )
+
+    segundos = 0
+    con_tiempo = 0
+    if mantenimiento.fecha_hora_llegada:
+        segundos = int((mantenimiento.fecha_salida_real - mantenimiento.fecha_hora_llegada).total_seconds())
+        con_tiempo = 1
+
+    with transaction.atomic():
+        resumen = _resumen_del_periodo(ResumenMensualKPI, **periodo)
+        # Actualizamos con F() para que dos cierres simultáneos no se pisen.
+        ResumenMensualKPI.objects.filter(pk=resumen.pk).update(
+            total_mantenimientos=F('total_mantenimientos') + 1,
+            total_insumos=F('total_insumos') + sum(i['total'] for i in insumos),
+            segundos_en_taller=F('segundos_en_taller') + segundos,
+            mantenimientos_con_tiempo=F('mantenimientos_con_tiempo') + con_tiempo,
+        )
+
+        for insumo in insumos:
+            resumen_insumo = _resumen_del_periodo(ResumenMensualInsumo, nombre_insumo=insumo['nombre_insumo'], **periodo)
+            ResumenMensualInsumo.objects.filter(pk=resumen_insumo.pk).update(total=F('total') + insumo['total'])
+
+
+def _resumen_del_periodo(modelo, **clave):
+    """
+    Busca o crea la fila de resumen del periodo. Si un cierre simultáneo la crea primero, la
+    restricción única rechaza este INSERT y se usa la que quedó.
+    """
+    resumen = modelo.objects.filter(**clave).first()
+    if resumen is None:
+        try:
+            with transaction.atomic():
+                resumen = modelo.objects.create(**clave)
+        except IntegrityError:
+            resumen = modelo.objects.get(**clave)
+    return resumen
+
+
+def reconstruir_resumenes():
+    """
+    Recalcula desde cero los resúmenes mensuales a partir del historial de mantenimientos.
+    Retorna la cantidad de filas creadas en cada tabla.
+    """
+    finalizados = Mantenimiento.objects.filter(
+        estado=Mantenimiento.Estado.FINALIZADO,
+        fecha_salida_real__isnull=False,
+    )
+
+    periodos_kpi = finalizados.annotate(
+        año=ExtractYear('fecha_salida_real'),
+        mes=ExtractMonth('fecha_salida_real'),
+        sitio_id=F('vehiculo__sitio_id'),
+    ).values('año', 'mes', 'taller_id', 'sitio_id').annotate(
+        total_mantenimientos=Count('id'),
+        segundos_en_taller=Sum(ExpressionWrapper(
+            F('fecha_salida_real') - F('fecha_hora_llegada'), output_field=DurationField()
+        )),
+        mantenimientos_con_tiempo=Count('fecha_hora_llegada'),
+    ).order_by()
+
+    insumos_por_periodo = Insumo.objects.filter(mantenimiento__in=finalizados).annotate(
+        año=ExtractYear('mantenimiento__fecha_salida_real'),
+        mes=ExtractMonth('mantenimiento__fecha_salida_real'),
+        taller_id=F('mantenimiento__taller_id'),
+        sitio_id=F('mantenimiento__vehiculo__sitio_id'),
+    ).values('año', 'mes', 'taller_id', 'sitio_id', 'nombre_insumo').annotate(total=Count('id')).order_by()
+
+    resumenes_insumo = [ResumenMensualInsumo(**fila) for fila in insumos_por_periodo]
+
+    total_insumos = {}
+    for r in resumenes_insumo:
+        clave = (r.año, r.mes, r.taller_id, r.sitio_id)
+        total_insumos[clave] = total_insumos.get(clave, 0) + r.total
+
+    resumenes_kpi = []
+    for fila in periodos_kpi:
+        duracion = fila['segundos_en_taller']
+        fila['segundos_en_taller'] = int(duracion.total_seconds()) if duracion else 0
+        fila['total_insumos'] = total_insumos.get((fila['año'], fila['mes'], fila['taller_id'], fila['sitio_id']), 0)
+        resumenes_kpi.append(ResumenMensualKPI(**fila))
+
+    with transaction.atomic():
+        ResumenMensualKPI.objects.all().delete()
+        ResumenMensualInsumo.objects.all().delete()
+        ResumenMensualKPI.objects.bulk_create(resumenes_kpi, batch_size=500)
+        ResumenMensualInsumo.objects.bulk_create(resumenes_insumo, batch_size=500)
+
+    return len(resumenes_kpi), len(resumenes_insumo)
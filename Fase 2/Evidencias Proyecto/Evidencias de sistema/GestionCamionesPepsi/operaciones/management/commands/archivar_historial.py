@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from operaciones.archivo_historial import archivar_historial
+
+
+class Command(BaseCommand):
+    help = "Mueve los registros de auditoría antiguos a archivos mensuales comprimidos (JSONL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=settings.HISTORIAL_RETENCION_DIAS,
+            help="Días de historial que se mantienen en la tabla (por defecto HISTORIAL_RETENCION_DIAS).",
+        )
+        parser.add_argument(
+            '--simular', action='store_true',
+            help="Muestra cuántos registros se archivarían por mes, sin moverlos.",
+        )
+
+    def handle(self, *args, **options):
+        antes_de = timezone.now() - timedelta(days=options['dias'])
+        resultado = archivar_historial(antes_de, simular=options['simular'])
+        for año, mes, cantidad in resultado:
+            self.stdout.write(f"{mes:02d}/{año}: {cantidad} registros")
+
+        total = sum(cantidad for _, _, cantidad in resultado)
+        if options['simular']:
+            self.stdout.write(self.style.WARNING(f"Simulación: se archivarían {total} registros anteriores al {antes_de:%d/%m/%Y}."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Se archivaron {total} registros anteriores al {antes_de:%d/%m/%Y}."))
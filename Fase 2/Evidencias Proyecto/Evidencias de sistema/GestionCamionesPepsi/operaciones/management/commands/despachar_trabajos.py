@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from operaciones.asignacion import despachar_trabajos_pendientes
+
+
+class Command(BaseCommand):
+    help = "Asigna automáticamente los mantenimientos EN_TALLER sin mecánico según especialidad y carga de trabajo."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--simular', action='store_true',
+            help="Muestra las asignaciones que se harían, sin guardarlas.",
+        )
+
+    def handle(self, *args, **options):
+        asignaciones = despachar_trabajos_pendientes(simular=options['simular'])
+        for trabajo, mecanico in asignaciones:
+            self.stdout.write(f"{trabajo.vehiculo.patente} (mant. #{trabajo.id}) -> {mecanico.display_name}")
+
+        if options['simular']:
+            self.stdout.write(self.style.WARNING(f"Simulación: {len(asignaciones)} trabajos se asignarían."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Se asignaron {len(asignaciones)} trabajos."))
@@ -0,0 +1,59 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from operaciones.flota_sintetica import CLAVE_PREDETERMINADA, PREFIJO, generar_flota, hay_datos_sinteticos
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera una flota sintética con años de historial de mantenimientos, para reproducir la carga "
+        "de producción. Con la misma semilla, parámetros y fecha --hasta genera siempre los mismos datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sitios', type=int, default=5)
+        parser.add_argument('--talleres', type=int, default=3)
+        parser.add_argument('--usuarios-por-rol', type=int, default=5, help="Usuarios de cada rol, salvo choferes.")
+        parser.add_argument('--choferes', type=int, help="Por defecto, uno por vehículo.")
+        parser.add_argument('--vehiculos', type=int, default=200)
+        parser.add_argument('--backups', type=int, default=20)
+        parser.add_argument('--años', type=int, default=3, help="Años de historial de mantenimientos.")
+        parser.add_argument('--mantenimientos-por-año', type=int, default=4, help="Promedio por vehículo.")
+        parser.add_argument('--abiertos', type=float, default=0.15, help="Proporción de vehículos con un mantenimiento en curso.")
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--hasta', help="Fecha final del historial (AAAA-MM-DD). Por defecto, ahora.")
+        parser.add_argument('--clave', default=CLAVE_PREDETERMINADA, help="Contraseña de todos los usuarios generados.")
+        parser.add_argument('--lote', type=int, default=1000, help="Filas por INSERT.")
+
+    def handle(self, *args, **options):
+        if options['años'] < 1 or options['vehiculos'] < 1 or options['sitios'] < 1 or options['talleres'] < 1:
+            raise CommandError("Se necesita al menos un año, un vehículo, un sitio y un taller.")
+        if not 0 <= options['abiertos'] <= 1:
+            raise CommandError("--abiertos debe estar entre 0 y 1.")
+        if hay_datos_sinteticos():
+            raise CommandError(f"Ya hay usuarios '{PREFIJO}_*' en la base de datos: genere la flota en una base vacía.")
+
+        hasta = None
+        if options['hasta']:
+            try:
+                hasta = timezone.make_aware(datetime.strptime(options['hasta'], '%Y-%m-%d').replace(hour=12))
+            except ValueError:
+                raise CommandError("--hasta debe tener el formato AAAA-MM-DD.")
+
+        inicio = time.perf_counter()
+        creados = generar_flota(
+            sitios=options['sitios'], talleres=options['talleres'], usuarios_por_rol=options['usuarios_por_rol'],
+            choferes=options['choferes'], vehiculos=options['vehiculos'], backups=options['backups'],
+            años=options['años'], mantenimientos_por_año=options['mantenimientos_por_año'],
+            proporcion_abiertos=options['abiertos'], semilla=options['semilla'], hasta=hasta,
+            clave=options['clave'], lote=options['lote'],
+        )
+        for modelo, cantidad in creados.items():
+            self.stdout.write(f"{modelo}: {cantidad}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Flota sintética generada en {time.perf_counter() - inicio:.1f} s. "
+            f"Usuarios '{PREFIJO}_<rol>_NNNN' con la contraseña '{options['clave']}'."
+        ))
@@ -0,0 +1,114 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from operaciones.models import Mantenimiento, Usuario, Vehiculo
+
+# Índices agregados en la migración 0019 para los filtros más usados, y el índice único
+# de un mantenimiento abierto por vehículo (migración 0020).
+INDICES = [
+    'mant_estado_fecha_idx', 'mant_vehiculo_estado_idx', 'mant_mecanico_estado_idx',
+    'mant_estado_salida_idx', 'mant_por_asignar_idx', 'mant_un_activo_por_vehiculo',
+    'vehiculo_backup_estado_idx', 'vehiculo_chofer_backup_idx',
+]
+
+
+def consultas_por_vista():
+    """
+    Las consultas principales de cada vista, con valores de ejemplo tomados de la base de datos.
+    Retorna (consultas, omitidas): las vistas cuyo valor de ejemplo no existe (ej: no hay
+    mecánicos) se omiten en vez de filtrar por None, que daría otro plan.
+    """
+    Estado = Mantenimiento.Estado
+    mecanico = Usuario.objects.filter(rol=Usuario.Roles.MECANICO).first()
+    chofer = Usuario.objects.filter(rol=Usuario.Roles.CHOFER, vehiculos__isnull=False).first()
+    vehiculo = Vehiculo.objects.filter(mantenimientos__isnull=False).first()
+    año = Mantenimiento.objects.filter(fecha_salida_real__isnull=False).values_list('fecha_salida_real__year', flat=True).first()
+    ejemplos = {'mecanico': mecanico, 'chofer': chofer, 'vehiculo': vehiculo, 'año': año}
+
+    # (vista, valores de ejemplo que necesita, consulta)
+    por_vista = [
+        ('jefe_taller_dashboard', [], lambda: Mantenimiento.objects.filter(
+            estado=Estado.EN_TALLER, mecanico_asignado__isnull=True).order_by('fecha_hora_llegada')),
+        ('mecanico_dashboard (activos)', ['mecanico'], lambda: Mantenimiento.objects.filter(
+            mecanico_asignado=mecanico, estado__in=[Estado.DIAGNOSTICO, Estado.EN_REPARACION])),
+        ('mecanico_dashboard (completados)', ['mecanico'], lambda: Mantenimiento.objects.filter(
+            mecanico_asignado=mecanico, estado__in=[Estado.REPARADO, Estado.VALIDADO, Estado.FINALIZADO]
+        ).order_by('-fecha_salida_real')),
+        ('supervisor_dashboard', [], lambda: Mantenimiento.objects.filter(estado=Estado.REPARADO).order_by('fecha_solicitud')),
+        ('supervisor_reportes (exportar)', ['año'], lambda: Mantenimiento.objects.filter(
+            fecha_salida_real__year=año, estado=Estado.FINALIZADO)),
+        ('registro_entrada', [], lambda: Mantenimiento.objects.filter(estado=Estado.AGENDADO)),
+        ('registro_salida', ['vehiculo'], lambda: Vehiculo.objects.filter(
+            patente=vehiculo.patente).select_related('mantenimiento_activo')),
+        ('chofer_dashboard', ['chofer'], lambda: Vehiculo.objects.filter(chofer_asignado=chofer).select_related(
+            'sitio', 'mantenimiento_activo__taller').order_by('patente')),
+        ('gestion_backups', [], lambda: Vehiculo.objects.filter(es_backup=True, estado_actual=Vehiculo.EstadoVehiculo.DISPONIBLE)),
+        ('intercambio_vehiculo', ['chofer'], lambda: Vehiculo.objects.filter(
+            chofer_asignado=chofer, es_backup=True, estado_actual=Vehiculo.EstadoVehiculo.EN_RUTA)),
+    ]
+
+    consultas, omitidas = [], []
+    for vista, necesita, consulta in por_vista:
+        faltan = [n for n in necesita if ejemplos[n] is None]
+        if faltan:
+            omitidas.append((vista, faltan))
+        else:
+            consultas.append((vista, consulta()))
+    return consultas, omitidas
+
+
+class Command(BaseCommand):
+    help = (
+        "Muestra el plan y el tiempo de las consultas principales de cada vista, con y sin los "
+        "índices compuestos y parciales. Los índices se quitan dentro de una transacción que se revierte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20, help="Ejecuciones por consulta para medir el tiempo.")
+
+    def _medir(self, consultas, repeticiones):
+        resultado = {}
+        for vista, consulta in consultas:
+            plan = consulta.explain()
+            list(consulta.all())  # Primera ejecución fuera de la medición (caché de páginas).
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                list(consulta.all())
+            resultado[vista] = (plan, (time.perf_counter() - inicio) * 1000 / repeticiones)
+        return resultado
+
+    def handle(self, *args, **options):
+        repeticiones = options['repeticiones']
+        if not Mantenimiento.objects.exists():
+            self.stdout.write(self.style.WARNING("No hay mantenimientos: los planes no serán representativos."))
+
+        consultas, omitidas = consultas_por_vista()
+        for vista, faltan in omitidas:
+            self.stdout.write(self.style.WARNING(f"Se omite {vista}: no hay datos de ejemplo ({', '.join(faltan)})."))
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        con_indices = self._medir(consultas, repeticiones)
+
+        # Conexión nueva: el módulo sqlite3 guarda las sentencias preparadas y podría
+        # reutilizar los planes calculados con los índices.
+        connection.close()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for nombre in INDICES:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(nombre)}")
+            sin_indices = self._medir(consultas, repeticiones)
+            transaction.set_rollback(True)
+
+        for vista, _ in consultas:
+            plan_antes, ms_antes = sin_indices[vista]
+            plan_despues, ms_despues = con_indices[vista]
+            self.stdout.write(self.style.MIGRATE_HEADING(vista))
+            self.stdout.write(f"  sin índices ({ms_antes:.2f} ms):")
+            for linea in plan_antes.splitlines():
+                self.stdout.write(f"    {linea}")
+            self.stdout.write(f"  con índices ({ms_despues:.2f} ms):")
+            for linea in plan_despues.splitlines():
+                self.stdout.write(f"    {linea}")
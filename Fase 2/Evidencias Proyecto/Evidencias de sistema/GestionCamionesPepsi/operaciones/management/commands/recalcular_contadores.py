@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from operaciones import contadores
+from operaciones.models import ContadorPendientes
+
+
+class Command(BaseCommand):
+    help = "Recalcula los contadores de trabajo pendiente contando las filas reales."
+
+    def handle(self, *args, **options):
+        contadores.recalcular()
+        for clave, valor in ContadorPendientes.objects.order_by('clave').values_list('clave', 'valor'):
+            self.stdout.write(f"{clave}: {valor}")
+        self.stdout.write(self.style.SUCCESS("Contadores recalculados."))
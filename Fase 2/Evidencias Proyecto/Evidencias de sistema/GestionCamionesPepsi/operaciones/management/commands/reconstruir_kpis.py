@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from operaciones.kpis import reconstruir_resumenes
+
+
+class Command(BaseCommand):
+    help = "Recalcula los resúmenes mensuales de KPIs a partir del historial de mantenimientos finalizados."
+
+    def handle(self, *args, **options):
+        total_kpi, total_insumos = reconstruir_resumenes()
+        self.stdout.write(self.style.SUCCESS(
+            f"Resúmenes reconstruidos: {total_kpi} de KPIs y {total_insumos} de insumos."
+        ))
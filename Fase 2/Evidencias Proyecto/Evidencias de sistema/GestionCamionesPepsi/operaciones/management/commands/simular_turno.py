@@ -0,0 +1,252 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import Resolver404, resolve, reverse
+from django.utils import timezone
+
+from operaciones.flota_sintetica import CLAVE_PREDETERMINADA, PREFIJO
+from operaciones.models import Agenda_Taller, Mantenimiento, Usuario, Vehiculo
+
+Roles = Usuario.Roles
+Estado = Mantenimiento.Estado
+
+
+class _SinRedirecciones(HTTPRedirectHandler):
+    # Cada redirección se mide como una petición aparte, así que no se siguen.
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Sesion:
+    """Un navegador con la sesión iniciada de un usuario. Registra la latencia de cada petición."""
+
+    def __init__(self, base, username, clave, registrar):
+        self.base = base
+        self.cookies = CookieJar()
+        self.navegador = build_opener(HTTPCookieProcessor(self.cookies), _SinRedirecciones)
+        self.registrar = registrar
+        self.get(reverse('login'))
+        estado = self.post(reverse('login'), {'username': username, 'password': clave})
+        if estado != 302:
+            raise CommandError(f"No se pudo iniciar sesión como {username} (HTTP {estado}).")
+
+    def _csrf(self):
+        return next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+
+    def _pedir(self, ruta, datos=None):
+        cuerpo = None
+        if datos is not None:
+            cuerpo = urlencode({**datos, 'csrfmiddlewaretoken': self._csrf()}).encode()
+        peticion = Request(self.base + ruta, data=cuerpo)
+        inicio = time.perf_counter()
+        try:
+            with self.navegador.open(peticion, timeout=60) as respuesta:
+                respuesta.read()  # La latencia incluye el cuerpo completo (exportaciones, por ejemplo).
+                estado = respuesta.status
+        except HTTPError as error:
+            estado = error.code
+        self.registrar(ruta, time.perf_counter() - inicio, estado)
+        return estado
+
+    def get(self, ruta):
+        return self._pedir(ruta)
+
+    def post(self, ruta, datos):
+        return self._pedir(ruta, datos)
+
+
+# --- Acciones del turno. Cada una elige sus datos en la base de datos y los envía como lo haría la persona. ---
+
+def entrada_guardia(turno, azar):
+    sesion = turno.sesion(turno.usuario(Roles.GUARDIA, azar))
+    sesion.get(reverse('guardia_dashboard'))
+    sesion.get(reverse('registro_entrada'))
+    patentes = list(Mantenimiento.objects.filter(estado=Estado.AGENDADO).values_list('vehiculo_id', flat=True)[:50])
+    if patentes:
+        sesion.post(reverse('registro_entrada'), {'patente': azar.choice(patentes), 'observaciones': 'Sin observaciones'})
+
+
+def reserva_chofer(turno, azar):
+    vehiculo = Vehiculo.objects.filter(
+        es_backup=False, chofer_asignado__isnull=False, mantenimiento_activo__isnull=True,
+    ).exclude(estado_actual=Vehiculo.EstadoVehiculo.DE_BAJA).order_by('?').values('patente', 'chofer_asignado__username').first()
+    if not vehiculo:
+        return
+    sesion = turno.sesion(vehiculo['chofer_asignado__username'])
+    sesion.get(reverse('chofer_dashboard'))
+    sesion.get(reverse('solicitar_atencion'))
+    bloques = list(Agenda_Taller.objects.filter(
+        mantenimiento__isnull=True, hora_inicio__gt=timezone.now(),
+    ).values_list('id', flat=True)[:50])
+    if bloques:
+        sesion.post(reverse('solicitar_atencion'), {
+            'vehiculo': vehiculo['patente'], 'motivo_ingreso': 'Ruido en la suspensión', 'agenda_slot': azar.choice(bloques),
+        })
+
+
+def actualizacion_mecanico(turno, azar):
+    trabajo = Mantenimiento.objects.filter(
+        estado__in=[Estado.DIAGNOSTICO, Estado.EN_REPARACION], mecanico_asignado__isnull=False,
+    ).order_by('?').values('id', 'mecanico_asignado__username').first()
+    if not trabajo:
+        return
+    sesion = turno.sesion(trabajo['mecanico_asignado__username'])
+    sesion.get(reverse('mecanico_dashboard'))
+    detalle = reverse('detalle_mantenimiento', args=[trabajo['id']])
+    sesion.get(detalle)
+    sesion.post(detalle, {
+        'form_name': 'diagnostico', 'diagnostico': 'Revisión en curso',
+        'trabajo_realizado': f'Avance registrado a las {timezone.localtime():%H:%M}',
+    })
+
+
+def exportacion_reporte(turno, azar):
+    sesion = turno.sesion(turno.usuario(Roles.SUPERVISOR, azar))
+    sesion.get(reverse('supervisor_reportes'))
+    formato = azar.choice(['csv', 'xlsx'])
+    sesion.get(reverse('supervisor_reportes') + '?' + urlencode({'export': formato, 'month': 'all'}))
+
+
+def consulta_paneles(turno, azar):
+    rol, ruta = azar.choice([
+        (Roles.SUPERVISOR, 'supervisor_dashboard'), (Roles.SUPERVISOR, 'seguimiento_mantenimientos'),
+        (Roles.JEFE_TALLER, 'jefe_taller_dashboard'), (Roles.COORDINACION, 'coordinacion_dashboard'),
+        (Roles.COORDINACION, 'gestion_insumos'), (Roles.GUARDIA, 'registro_salida'),
+    ])
+    turno.sesion(turno.usuario(rol, azar)).get(reverse(ruta))
+
+
+# (acción, peso): proporción de cada tarea en un turno.
+MEZCLA_TURNO = [
+    (entrada_guardia, 20),
+    (reserva_chofer, 15),
+    (actualizacion_mecanico, 30),
+    (exportacion_reporte, 5),
+    (consulta_paneles, 30),
+]
+
+
+class Turno:
+    """Estado compartido entre los clientes: latencias por nombre de URL y usuarios disponibles por rol."""
+
+    def __init__(self, base, clave):
+        self.base = base
+        self.clave = clave
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+        self._candado = threading.Lock()
+        self._local = threading.local()
+        self.usuarios = {
+            rol: list(Usuario.objects.filter(rol=rol, is_active=True, username__startswith=f'{PREFIJO}_')
+                      .values_list('username', flat=True))
+            for rol in Roles
+        }
+        faltan = [rol.label for rol in Roles if not self.usuarios[rol]]
+        if faltan:
+            raise CommandError(f"No hay usuarios sintéticos de: {', '.join(faltan)}. Ejecute primero generar_flota.")
+
+    def registrar(self, ruta, segundos, estado):
+        try:
+            nombre = resolve(urlsplit(ruta).path).url_name
+        except Resolver404:
+            nombre = ruta
+        with self._candado:
+            self.latencias[nombre].append(segundos)
+            if estado >= 400:
+                self.errores[nombre] += 1
+
+    def usuario(self, rol, azar):
+        return azar.choice(self.usuarios[rol])
+
+    def sesion(self, username):
+        # Cada cliente guarda sus propias sesiones: iniciar sesión también es parte de la carga.
+        sesiones = self._local.__dict__.setdefault('sesiones', {})
+        if username not in sesiones:
+            sesiones[username] = Sesion(self.base, username, self.clave, self.registrar)
+        return sesiones[username]
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por rango más cercano."""
+    indice = max(0, round(p / 100 * len(valores_ordenados)) - 1)
+    return valores_ordenados[min(indice, len(valores_ordenados) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Reproduce un turno (entradas de guardia, reservas, actualizaciones de mecánicos, exportaciones "
+        "y consultas de paneles) contra un servidor en ejecución, con varios clientes concurrentes, y "
+        "muestra la latencia p50/p95/p99 por nombre de URL. Usa los usuarios de generar_flota y debe "
+        "apuntar a la misma base de datos que el servidor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Dirección del servidor.")
+        parser.add_argument('--clientes', type=int, default=8, help="Clientes concurrentes.")
+        parser.add_argument('--duracion', type=float, default=60, help="Segundos de simulación.")
+        parser.add_argument('--pausa', type=float, default=0.0, help="Segundos de espera entre acciones de un cliente.")
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--clave', default=CLAVE_PREDETERMINADA, help="Contraseña de los usuarios generados.")
+
+    def _cliente(self, turno, numero, fin, pausa, semilla, fallas):
+        azar = random.Random(semilla * 1000 + numero)
+        acciones, pesos = zip(*MEZCLA_TURNO)
+        try:
+            while time.monotonic() < fin:
+                accion = azar.choices(acciones, pesos)[0]
+                try:
+                    accion(turno, azar)
+                except (URLError, OSError) as error:
+                    fallas.append(f"{accion.__name__}: {error}")
+                if pausa:
+                    time.sleep(azar.uniform(0, 2 * pausa))
+        except Exception as error:
+            fallas.append(f"cliente {numero}: {error}")
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        base = options['url'].rstrip('/')
+        turno = Turno(base, options['clave'])
+        try:
+            Sesion(base, turno.usuarios[Roles.GUARDIA][0], options['clave'], lambda *a: None)
+        except URLError as error:
+            raise CommandError(f"No se pudo conectar con {base}: {error.reason}. ¿Está corriendo el servidor?")
+
+        fin = time.monotonic() + options['duracion']
+        fallas = []
+        clientes = [
+            threading.Thread(target=self._cliente, args=(turno, n, fin, options['pausa'], options['semilla'], fallas))
+            for n in range(options['clientes'])
+        ]
+        inicio = time.perf_counter()
+        for cliente in clientes:
+            cliente.start()
+        for cliente in clientes:
+            cliente.join()
+        transcurrido = time.perf_counter() - inicio
+
+        total = sum(len(v) for v in turno.latencias.values())
+        self.stdout.write(f"{'URL':<32}{'peticiones':>11}{'errores':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'máx ms':>9}")
+        for nombre in sorted(turno.latencias, key=lambda n: -len(turno.latencias[n])):
+            tiempos = sorted(turno.latencias[nombre])
+            ms = [percentil(tiempos, p) * 1000 for p in (50, 95, 99)] + [tiempos[-1] * 1000]
+            self.stdout.write(
+                f"{nombre:<32}{len(tiempos):>11}{turno.errores[nombre]:>9}" + ''.join(f"{v:>9.1f}" for v in ms)
+            )
+        for falla in fallas[:10]:
+            self.stdout.write(self.style.ERROR(falla))
+
+        resumen = f"{total} peticiones en {transcurrido:.1f} s ({total / transcurrido:.1f}/s) con {options['clientes']} clientes."
+        if fallas or any(turno.errores.values()):
+            self.stdout.write(self.style.WARNING(resumen + f" {sum(turno.errores.values())} respuestas con error, {len(fallas)} fallas de conexión."))
+        else:
+            self.stdout.write(self.style.SUCCESS(resumen))
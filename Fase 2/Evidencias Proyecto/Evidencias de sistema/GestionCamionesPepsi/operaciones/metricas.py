@@ -0,0 +1,139 @@
+# operaciones/metricas.py
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import CharField, Count, F, Value
+
+from .models import Insumo, Mantenimiento, SolicitudBackup, Vehiculo
+
+# Límites (en segundos) de los buckets del histograma de latencia.
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Los indicadores de negocio se calculan a lo más una vez cada TIEMPO_CACHE_NEGOCIO segundos,
+# así que un scrape frecuente no agrega carga a la base de datos.
+TIEMPO_CACHE_NEGOCIO = 10
+CLAVE_CACHE_NEGOCIO = 'metricas:negocio'
+
+_candado = threading.Lock()
+# (vista, método, estado HTTP) -> peticiones
+_peticiones = defaultdict(int)
+# vista -> [cantidad por bucket (el último es +Inf), suma de segundos, cantidad]
+_latencias = {}
+# vista -> consultas SQL
+_consultas = defaultdict(int)
+
+
+def observar(vista, metodo, estado, segundos, consultas):
+    """Registra una petición terminada. `vista` es el nombre de la URL, nunca la ruta (para acotar las series)."""
+    bucket = bisect_left(LIMITES_LATENCIA, segundos)
+    with _candado:
+        _peticiones[(vista, metodo, estado)] += 1
+        histograma = _latencias.setdefault(vista, [[0] * (len(LIMITES_LATENCIA) + 1), 0.0, 0])
+        histograma[0][bucket] += 1
+        histograma[1] += segundos
+        histograma[2] += 1
+        _consultas[vista] += consultas
+
+
+def reiniciar():
+    with _candado:
+        _peticiones.clear()
+        _latencias.clear()
+        _consultas.clear()
+
+
+def _etiquetas(**valores):
+    escapar = lambda v: str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return '{' + ','.join(f'{k}="{escapar(v)}"' for k, v in valores.items()) + '}'
+
+
+def _calcular_negocio():
+    """
+    Vehículos por estado, mantenimientos abiertos por estado, solicitudes de backup pendientes
+    e insumos pendientes, en una sola consulta (UNION ALL de conteos agrupados).
+    """
+    def grupo(queryset, serie, campo):
+        return (
+            queryset.order_by()
+            .annotate(serie=Value(serie, output_field=CharField()), etiqueta=F(campo))
+            .values('serie', 'etiqueta').annotate(total=Count('pk'))
+            .values_list('serie', 'etiqueta', 'total')
+        )
+
+    consulta = grupo(Vehiculo.objects.all(), 'vehiculos', 'estado_actual').union(
+        grupo(Mantenimiento.objects.exclude(estado=Mantenimiento.Estado.FINALIZADO), 'mantenimientos', 'estado'),
+        grupo(SolicitudBackup.objects.filter(estado=SolicitudBackup.EstadoSolicitud.PENDIENTE), 'backups', 'estado'),
+        grupo(Insumo.objects.filter(estado_aprobacion=Insumo.EstadoAprobacion.PENDIENTE), 'insumos', 'estado_aprobacion'),
+        all=True,
+    )
+    totales = defaultdict(dict)
+    for serie, etiqueta, total in consulta:
+        totales[serie][etiqueta] = total
+    return dict(totales)
+
+
+def indicadores_negocio():
+    return cache.get_or_set(CLAVE_CACHE_NEGOCIO, _calcular_negocio, TIEMPO_CACHE_NEGOCIO)
+
+
+def exposicion():
+    """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+    with _candado:
+        peticiones = dict(_peticiones)
+        latencias = {vista: (list(buckets), suma, cantidad) for vista, (buckets, suma, cantidad) in _latencias.items()}
+        consultas = dict(_consultas)
+
+    lineas = [
+        '# HELP gestion_peticiones_total Peticiones HTTP atendidas por vista, método y estado.',
+        '# TYPE gestion_peticiones_total counter',
+    ]
+    for (vista, metodo, estado), total in sorted(peticiones.items()):
+        lineas.append(f'gestion_peticiones_total{_etiquetas(vista=vista, metodo=metodo, estado=estado)} {total}')
+
+    lineas += [
+        '# HELP gestion_peticion_duracion_segundos Duración de las peticiones por vista.',
+        '# TYPE gestion_peticion_duracion_segundos histogram',
+    ]
+    for vista, (buckets, suma, cantidad) in sorted(latencias.items()):
+        acumulado = 0
+        for limite, veces in zip(LIMITES_LATENCIA + ('+Inf',), buckets):
+            acumulado += veces
+            lineas.append(f'gestion_peticion_duracion_segundos_bucket{_etiquetas(vista=vista, le=limite)} {acumulado}')
+        lineas.append(f'gestion_peticion_duracion_segundos_sum{_etiquetas(vista=vista)} {suma:.6f}')
+        lineas.append(f'gestion_peticion_duracion_segundos_count{_etiquetas(vista=vista)} {cantidad}')
+
+    lineas += [
+        '# HELP gestion_consultas_sql_total Consultas SQL ejecutadas por vista.',
+        '# TYPE gestion_consultas_sql_total counter',
+    ]
+    for vista, total in sorted(consultas.items()):
+        lineas.append(f'gestion_consultas_sql_total{_etiquetas(vista=vista)} {total}')
+
+    negocio = indicadores_negocio()
+    lineas += [
+        '# HELP gestion_vehiculos Vehículos por estado actual.',
+        '# TYPE gestion_vehiculos gauge',
+    ]
+    # Se publican todos los estados, aunque estén en cero, para que las series no desaparezcan.
+    for estado in Vehiculo.EstadoVehiculo:
+        lineas.append(f'gestion_vehiculos{_etiquetas(estado=estado.value)} {negocio.get("vehiculos", {}).get(estado.value, 0)}')
+
+    lineas += [
+        '# HELP gestion_mantenimientos_abiertos Mantenimientos no finalizados por estado.',
+        '# TYPE gestion_mantenimientos_abiertos gauge',
+    ]
+    for estado in Mantenimiento.Estado:
+        if estado != Mantenimiento.Estado.FINALIZADO:
+            lineas.append(f'gestion_mantenimientos_abiertos{_etiquetas(estado=estado.value)} {negocio.get("mantenimientos", {}).get(estado.value, 0)}')
+
+    lineas += [
+        '# HELP gestion_solicitudes_backup_pendientes Solicitudes de vehículo de respaldo sin atender.',
+        '# TYPE gestion_solicitudes_backup_pendientes gauge',
+        f'gestion_solicitudes_backup_pendientes {sum(negocio.get("backups", {}).values())}',
+        '# HELP gestion_insumos_pendientes Insumos esperando aprobación.',
+        '# TYPE gestion_insumos_pendientes gauge',
+        f'gestion_insumos_pendientes {sum(negocio.get("insumos", {}).values())}',
+    ]
+    return '\n'.join(lineas) + '\n'
@@ -1,6 +1,14 @@
 # operaciones/middleware.py
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.utils.cache import add_never_cache_headers
 
+from . import metricas, perfilado
+
 class NoCacheMiddleware:
     """
     Middleware para añadir cabeceras 'Cache-Control: no-store' a las respuestas
@@ -15,8 +23,66 @@ class NoCacheMiddleware:
         # Procesar la petición y obtener la respuesta de la vista
         response = self.get_response(request)
 
-        # Si el usuario está autenticado, añadir las cabeceras para no cachear
-        if request.user.is_authenticated:
+        # Si el usuario está autenticado, añadir las cabeceras para no cachear.
+        # Se respetan las vistas que ya definen su propio Cache-Control (ej: feeds con ETag).
+        if request.user.is_authenticated and not response.has_header('Cache-Control'):
             add_never_cache_headers(response)
             
-        return response
\ No newline at end of file
+        return response
+
+
+class PerfiladoMiddleware:
+    """
+    Con PERFILADO=1, mide cada petición (tiempo total, consultas SQL, tiempo en SQL y en
+    plantillas), la guarda en el buffer de operaciones/perfilado.py y agrega la cabecera
+    Server-Timing, visible con `curl -I` o en las herramientas del navegador.
+    Si está desactivado, Django lo quita de la cadena al arrancar.
+    """
+    def __init__(self, get_response):
+        if not settings.PERFILADO:
+            raise MiddlewareNotUsed
+        perfilado.instalar()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        with perfilado.medir() as en_curso:
+            response = self.get_response(request)
+        medicion = perfilado.registrar(request, response, en_curso, (time.perf_counter() - inicio) * 1000)
+
+        response['Server-Timing'] = (
+            f'total;dur={medicion.total_ms:.1f}, '
+            f'sql;dur={medicion.sql_ms:.1f};desc="{medicion.consultas} consultas", '
+            f'plantillas;dur={medicion.plantillas_ms:.1f}'
+        )
+        return response
+
+
+class MetricasMiddleware:
+    """
+    Cuenta cada petición, su duración y sus consultas SQL por nombre de URL, para /metrics
+    (ver operaciones/metricas.py). Los contadores son del proceso: con varios workers, cada
+    scrape ve solo los del worker que lo atiende.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        consultas = [0]
+
+        def contar(execute, sql, params, many, context):
+            consultas[0] += 1
+            return execute(sql, params, many, context)
+
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(contar))
+            response = self.get_response(request)
+        segundos = time.perf_counter() - inicio
+
+        match = request.resolver_match
+        metricas.observar(
+            match.view_name if match else 'sin_ruta', request.method, response.status_code, segundos, consultas[0],
+        )
+        return response
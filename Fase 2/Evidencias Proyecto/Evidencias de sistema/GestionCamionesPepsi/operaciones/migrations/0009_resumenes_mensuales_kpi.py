@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0008_merge_20251117_1005'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenMensualInsumo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('año', models.PositiveIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('nombre_insumo', models.CharField(max_length=100)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('sitio', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_insumo', to='operaciones.sitio')),
+                ('taller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_insumo', to='operaciones.taller')),
+            ],
+            options={
+                'verbose_name': 'Resumen Mensual de Insumos',
+                'verbose_name_plural': 'Resúmenes Mensuales de Insumos',
+                'constraints': [models.UniqueConstraint(fields=('año', 'mes', 'taller', 'sitio', 'nombre_insumo'), name='resumen_insumo_unico_por_periodo')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenMensualKPI',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('año', models.PositiveIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('total_mantenimientos', models.PositiveIntegerField(default=0)),
+                ('total_insumos', models.PositiveIntegerField(default=0)),
+                ('segundos_en_taller', models.BigIntegerField(default=0)),
+                ('mantenimientos_con_tiempo', models.PositiveIntegerField(default=0)),
+                ('sitio', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_kpi', to='operaciones.sitio')),
+                ('taller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_kpi', to='operaciones.taller')),
+            ],
+            options={
+                'verbose_name': 'Resumen Mensual de KPIs',
+                'verbose_name_plural': 'Resúmenes Mensuales de KPIs',
+                'constraints': [models.UniqueConstraint(fields=('año', 'mes', 'taller', 'sitio'), name='resumen_kpi_unico_por_periodo')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0009_resumenes_mensuales_kpi'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historial_cambios',
+            name='mantenimiento',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='historial', to='operaciones.mantenimiento'),
+        ),
+        migrations.AddField(
+            model_name='historial_cambios',
+            name='tipo_evento',
+            field=models.CharField(choices=[('ENTRADA_TALLER', 'Entrada a taller'), ('SALIDA_TALLER', 'Salida de taller (mantenimiento finalizado)'), ('SALIDA_VEHICULO', 'Salida de vehículo'), ('ASIGNACION_BACKUP', 'Asignación de backup'), ('ENTREGA_BACKUP', 'Entrega de backup'), ('SALIDA_BACKUP', 'Salida de backup'), ('DEVOLUCION_BACKUP', 'Devolución de backup'), ('INTERCAMBIO_BACKUP', 'Intercambio de backup'), ('SOLICITUD_MANTENIMIENTO', 'Solicitud de mantenimiento'), ('ASIGNACION_MECANICO', 'Asignación de mecánico'), ('DIAGNOSTICO', 'Actualización de diagnóstico'), ('INSUMO_SOLICITADO', 'Insumo solicitado'), ('INSUMO_APROBADO', 'Insumo aprobado'), ('INSUMO_RECHAZADO', 'Insumo rechazado'), ('FOTO_EVIDENCIA', 'Foto de evidencia'), ('INICIO_PAUSA', 'Inicio de pausa'), ('FIN_PAUSA', 'Fin de pausa'), ('CIERRE_REPARACION', 'Cierre de reparación'), ('VALIDACION_REPARACION', 'Validación de reparación'), ('RECHAZO_REPARACION', 'Rechazo de reparación'), ('AGENDA', 'Gestión de agenda'), ('USUARIO', 'Gestión de usuarios'), ('DOCUMENTO', 'Gestión de documentos'), ('OTRO', 'Otro')], default='OTRO', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='historial_cambios',
+            name='vehiculo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='historial', to='operaciones.vehiculo'),
+        ),
+        migrations.AddIndex(
+            model_name='historial_cambios',
+            index=models.Index(fields=['tipo_evento', '-fecha_cambio'], name='historial_evento_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+import re
+
+from django.db import migrations
+
+# Patrones de texto que escribían las vistas antes de existir `tipo_evento`.
+# El orden importa: se usa la primera coincidencia.
+PATRONES = [
+    ('ingresó al taller para mantenimiento', 'ENTRADA_TALLER'),
+    ('salió del recinto tras finalizar mantenimiento', 'SALIDA_TALLER'),
+    ('salió del recinto', 'SALIDA_VEHICULO'),
+    ('registró salida de backup', 'SALIDA_BACKUP'),
+    ('registró ingreso de backup', 'DEVOLUCION_BACKUP'),
+    ('intercambio procesado', 'INTERCAMBIO_BACKUP'),
+    ('backup', 'ENTREGA_BACKUP'),
+    ('chofer solicitó mantenimiento', 'SOLICITUD_MANTENIMIENTO'),
+    ('asignó mant.', 'ASIGNACION_MECANICO'),
+    ('actualizó diagnóstico', 'DIAGNOSTICO'),
+    ('añadió insumo', 'INSUMO_SOLICITADO'),
+    ('aprobó insumo', 'INSUMO_APROBADO'),
+    ('rechazó insumo', 'INSUMO_RECHAZADO'),
+    ('subió foto', 'FOTO_EVIDENCIA'),
+    ('inició pausa', 'INICIO_PAUSA'),
+    ('terminó la pausa', 'FIN_PAUSA'),
+    ('marcó la reparación como finalizada', 'CIERRE_REPARACION'),
+    ('reparación validada', 'VALIDACION_REPARACION'),
+    ('vuelve a diagnóstico', 'RECHAZO_REPARACION'),
+]
+
+EVENTOS_POR_TABLA = {
+    'Agenda_Taller': 'AGENDA',
+    'Usuario': 'USUARIO',
+    'Documento': 'DOCUMENTO',
+}
+
+TAMAÑO_LOTE = 2000
+
+RE_MANTENIMIENTO = re.compile(r'mant(?:enimiento)?\.? #(\d+)')
+
+
+def clasificar(registro):
+    descripcion = registro.descripcion.lower()
+    for patron, tipo_evento in PATRONES:
+        if patron in descripcion:
+            return tipo_evento
+    return EVENTOS_POR_TABLA.get(registro.tabla_afectada, 'OTRO')
+
+
+def poblar_tipo_evento(apps, schema_editor):
+    Historial_Cambios = apps.get_model('operaciones', 'Historial_Cambios')
+    Vehiculo = apps.get_model('operaciones', 'Vehiculo')
+    Mantenimiento = apps.get_model('operaciones', 'Mantenimiento')
+
+    patentes = set(Vehiculo.objects.values_list('patente', flat=True))
+    vehiculo_por_mantenimiento = dict(Mantenimiento.objects.values_list('id', 'vehiculo_id'))
+
+    # Recorremos por rangos de id para no mantener un cursor abierto mientras actualizamos.
+    ultimo_id = 0
+    while True:
+        lote = list(Historial_Cambios.objects.filter(id__gt=ultimo_id).order_by('id')[:TAMAÑO_LOTE])
+        if not lote:
+            break
+        for registro in lote:
+            registro.tipo_evento = clasificar(registro)
+
+            if registro.tabla_afectada == 'Vehiculo' and registro.id_registro_afectado in patentes:
+                registro.vehiculo_id = registro.id_registro_afectado
+
+            id_mantenimiento = None
+            if registro.tabla_afectada == 'Mantenimiento':
+                id_mantenimiento = registro.id_registro_afectado
+            else:
+                coincidencia = RE_MANTENIMIENTO.search(registro.descripcion)
+                if coincidencia:
+                    id_mantenimiento = coincidencia.group(1)
+            if id_mantenimiento and id_mantenimiento.isdigit() and int(id_mantenimiento) in vehiculo_por_mantenimiento:
+                registro.mantenimiento_id = int(id_mantenimiento)
+                if not registro.vehiculo_id:
+                    registro.vehiculo_id = vehiculo_por_mantenimiento[registro.mantenimiento_id]
+
+        Historial_Cambios.objects.bulk_update(lote, ['tipo_evento', 'vehiculo', 'mantenimiento'])
+        ultimo_id = lote[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0010_historial_tipo_evento'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_tipo_evento, migrations.RunPython.noop),
+    ]
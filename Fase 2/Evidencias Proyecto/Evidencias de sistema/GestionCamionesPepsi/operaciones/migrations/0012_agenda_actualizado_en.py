@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0011_backfill_historial_tipo_evento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agenda_taller',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='agenda_taller',
+            index=models.Index(fields=['hora_inicio', 'hora_final'], name='agenda_ventana_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0012_agenda_actualizado_en'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='observacion',
+            name='tipo',
+            field=models.CharField(choices=[('GENERAL', 'General'), ('ENTRADA_GUARDIA', 'Observación de guardia (entrada)'), ('RECHAZO_SUPERVISOR', 'Rechazo de supervisor')], default='GENERAL', max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='observacion',
+            index=models.Index(fields=['mantenimiento', 'tipo', '-fecha'], name='observacion_tipo_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+# Prefijos de texto que escribían las vistas antes de existir `Observacion.tipo`.
+PREFIJOS = [
+    ('RECHAZO DE SUPERVISOR:', 'RECHAZO_SUPERVISOR'),
+    ('OBSERVACIÓN DE GUARDIA (ENTRADA):', 'ENTRADA_GUARDIA'),
+]
+
+
+def poblar_tipo(apps, schema_editor):
+    Observacion = apps.get_model('operaciones', 'Observacion')
+    for prefijo, tipo in PREFIJOS:
+        Observacion.objects.filter(texto__startswith=prefijo).update(tipo=tipo)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0013_observacion_tipo'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_tipo, migrations.RunPython.noop),
+    ]
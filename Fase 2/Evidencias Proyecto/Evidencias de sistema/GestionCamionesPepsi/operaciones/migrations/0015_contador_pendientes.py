@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:47
+
+from django.db import migrations, models
+
+
+def inicializar_contadores(apps, schema_editor):
+    ContadorPendientes = apps.get_model('operaciones', 'ContadorPendientes')
+    SolicitudBackup = apps.get_model('operaciones', 'SolicitudBackup')
+    Insumo = apps.get_model('operaciones', 'Insumo')
+    Mantenimiento = apps.get_model('operaciones', 'Mantenimiento')
+
+    valores = {
+        'backups_pendientes': SolicitudBackup.objects.filter(estado='PENDIENTE').count(),
+        'insumos_pendientes': Insumo.objects.filter(estado_aprobacion='PENDIENTE').count(),
+        'reparaciones_por_validar': Mantenimiento.objects.filter(estado='REPARADO').count(),
+        'trabajos_por_asignar': Mantenimiento.objects.filter(estado='EN_TALLER', mecanico_asignado__isnull=True).count(),
+    }
+    ContadorPendientes.objects.bulk_create([
+        ContadorPendientes(clave=clave, valor=valor) for clave, valor in valores.items()
+    ])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0014_backfill_observacion_tipo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorPendientes',
+            fields=[
+                ('clave', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('valor', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador de Pendientes',
+                'verbose_name_plural': 'Contadores de Pendientes',
+            },
+        ),
+        migrations.RunPython(inicializar_contadores, migrations.RunPython.noop),
+    ]
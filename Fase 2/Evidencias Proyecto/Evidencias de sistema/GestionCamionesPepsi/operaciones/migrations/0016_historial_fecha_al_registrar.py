@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0015_contador_pendientes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historial_cambios',
+            name='fecha_cambio',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0016_historial_fecha_al_registrar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoHistorial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('año', models.PositiveIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('archivo', models.CharField(help_text='Nombre del archivo dentro de HISTORIAL_ARCHIVO_DIR', max_length=255, unique=True)),
+                ('registros', models.PositiveIntegerField()),
+                ('desde', models.DateTimeField()),
+                ('hasta', models.DateTimeField()),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archivo de Historial',
+                'verbose_name_plural': 'Archivos de Historial',
+                'ordering': ['-año', '-mes', '-creado_en'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='historial_cambios',
+            index=models.Index(fields=['-fecha_cambio'], name='historial_fecha_idx'),
+        ),
+    ]
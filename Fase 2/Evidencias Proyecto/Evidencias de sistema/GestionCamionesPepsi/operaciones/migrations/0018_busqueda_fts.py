@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# Índice de texto completo (SQLite FTS5) para la búsqueda global. Una sola tabla virtual
+# para todas las fuentes: el rowid codifica el origen, rowid = id * 4 + FUENTE, así los
+# triggers actualizan o borran por rowid sin recorrer el índice.
+FUENTES = [
+    # (código, tabla, expresión de texto, columnas que disparan la reindexación)
+    (1, 'operaciones_historial_cambios', "{t}.descripcion", ['descripcion']),
+    (2, 'operaciones_mantenimiento',
+     "{t}.motivo_ingreso || ' ' || {t}.diagnostico || ' ' || {t}.trabajo_realizado",
+     ['motivo_ingreso', 'diagnostico', 'trabajo_realizado']),
+    (3, 'operaciones_observacion', "{t}.texto", ['texto']),
+]
+
+
+def _sql_crear():
+    sentencias = [
+        "CREATE VIRTUAL TABLE operaciones_busqueda USING fts5(texto, tokenize = 'unicode61 remove_diacritics 2')",
+    ]
+    for codigo, tabla, texto, columnas in FUENTES:
+        nuevo, viejo = texto.format(t='new'), texto.format(t='old')
+        cambio = ' OR '.join(f"old.{c} IS NOT new.{c}" for c in columnas)
+        sentencias += [
+            f"""CREATE TRIGGER {tabla}_busqueda_ai AFTER INSERT ON {tabla} BEGIN
+                INSERT INTO operaciones_busqueda(rowid, texto) VALUES (new.id * 4 + {codigo}, {nuevo});
+            END""",
+            f"""CREATE TRIGGER {tabla}_busqueda_au AFTER UPDATE ON {tabla} WHEN {cambio} BEGIN
+                DELETE FROM operaciones_busqueda WHERE rowid = old.id * 4 + {codigo};
+                INSERT INTO operaciones_busqueda(rowid, texto) VALUES (new.id * 4 + {codigo}, {nuevo});
+            END""",
+            f"""CREATE TRIGGER {tabla}_busqueda_ad AFTER DELETE ON {tabla} BEGIN
+                DELETE FROM operaciones_busqueda WHERE rowid = old.id * 4 + {codigo};
+            END""",
+            f"INSERT INTO operaciones_busqueda(rowid, texto) SELECT id * 4 + {codigo}, {texto.format(t=tabla)} FROM {tabla}",
+        ]
+    return sentencias
+
+
+def _sql_eliminar():
+    sentencias = []
+    for _, tabla, _, _ in FUENTES:
+        sentencias += [f"DROP TRIGGER IF EXISTS {tabla}_busqueda_{sufijo}" for sufijo in ('ai', 'au', 'ad')]
+    return sentencias + ["DROP TABLE IF EXISTS operaciones_busqueda"]
+
+
+def crear_indice(apps, schema_editor):
+    # FTS5 es propio de SQLite; en otros motores la búsqueda usa consultas normales (ver busqueda.py).
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sentencia in _sql_crear():
+        schema_editor.execute(sentencia)
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sentencia in _sql_eliminar():
+        schema_editor.execute(sentencia)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0017_archivo_historial'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
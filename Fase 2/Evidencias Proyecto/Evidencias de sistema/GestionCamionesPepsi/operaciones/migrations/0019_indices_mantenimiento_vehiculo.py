@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0018_busqueda_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mantenimiento',
+            index=models.Index(fields=['estado', 'fecha_solicitud'], name='mant_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mantenimiento',
+            index=models.Index(fields=['vehiculo', 'estado'], name='mant_vehiculo_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mantenimiento',
+            index=models.Index(fields=['mecanico_asignado', 'estado'], name='mant_mecanico_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mantenimiento',
+            index=models.Index(fields=['estado', 'fecha_salida_real'], name='mant_estado_salida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mantenimiento',
+            index=models.Index(condition=models.Q(('estado', 'EN_TALLER'), ('mecanico_asignado__isnull', True)), fields=['fecha_hora_llegada'], name='mant_por_asignar_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mantenimiento',
+            index=models.Index(condition=models.Q(('estado', 'FINALIZADO'), _negated=True), fields=['vehiculo', '-fecha_solicitud'], name='mant_activos_vehiculo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiculo',
+            index=models.Index(fields=['es_backup', 'estado_actual'], name='vehiculo_backup_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiculo',
+            index=models.Index(fields=['chofer_asignado', 'es_backup'], name='vehiculo_chofer_backup_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def poblar_mantenimiento_activo(apps, schema_editor):
+    Mantenimiento = apps.get_model('operaciones', 'Mantenimiento')
+    Vehiculo = apps.get_model('operaciones', 'Vehiculo')
+    abiertos = Mantenimiento.objects.exclude(estado='FINALIZADO')
+
+    # La restricción no se puede crear si ya hay vehículos con más de un mantenimiento abierto:
+    # se deben finalizar los sobrantes a mano antes de migrar.
+    duplicados = list(
+        abiertos.values('vehiculo_id').annotate(total=Count('id')).filter(total__gt=1)
+        .values_list('vehiculo_id', flat=True)
+    )
+    if duplicados:
+        raise RuntimeError(
+            "Los siguientes vehículos tienen más de un mantenimiento sin finalizar: "
+            f"{', '.join(duplicados)}. Finalice los que sobran y vuelva a ejecutar la migración."
+        )
+
+    Vehiculo.objects.update(mantenimiento_activo=Subquery(
+        abiertos.filter(vehiculo_id=OuterRef('pk')).values('id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0019_indices_mantenimiento_vehiculo'),
+    ]
+
+    operations = [
+        # Lo reemplaza el índice único de la restricción.
+        migrations.RemoveIndex(
+            model_name='mantenimiento',
+            name='mant_activos_vehiculo_idx',
+        ),
+        migrations.AddField(
+            model_name='vehiculo',
+            name='mantenimiento_activo',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vehiculo_en_curso', to='operaciones.mantenimiento'),
+        ),
+        migrations.RunPython(poblar_mantenimiento_activo, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='mantenimiento',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'FINALIZADO'), _negated=True), fields=('vehiculo',), name='mant_un_activo_por_vehiculo', violation_error_message='Este vehículo ya tiene un mantenimiento en curso.'),
+        ),
+    ]
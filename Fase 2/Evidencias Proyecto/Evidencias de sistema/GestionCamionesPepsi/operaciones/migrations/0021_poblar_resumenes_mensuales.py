@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-17 22:05
+
+from django.db import migrations
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def poblar_resumenes(apps, schema_editor):
+    # 0009 solo creó las tablas: sin esto los reportes muestran ceros hasta ejecutar reconstruir_kpis.
+    # Es una copia del cálculo de kpis.reconstruir_resumenes, con los modelos históricos.
+    Mantenimiento = apps.get_model('operaciones', 'Mantenimiento')
+    Insumo = apps.get_model('operaciones', 'Insumo')
+    ResumenMensualKPI = apps.get_model('operaciones', 'ResumenMensualKPI')
+    ResumenMensualInsumo = apps.get_model('operaciones', 'ResumenMensualInsumo')
+
+    finalizados = Mantenimiento.objects.filter(estado='FINALIZADO', fecha_salida_real__isnull=False)
+
+    periodos_kpi = finalizados.annotate(
+        año=ExtractYear('fecha_salida_real'),
+        mes=ExtractMonth('fecha_salida_real'),
+        sitio_id=F('vehiculo__sitio_id'),
+    ).values('año', 'mes', 'taller_id', 'sitio_id').annotate(
+        total_mantenimientos=Count('id'),
+        segundos_en_taller=Sum(ExpressionWrapper(
+            F('fecha_salida_real') - F('fecha_hora_llegada'), output_field=DurationField()
+        )),
+        mantenimientos_con_tiempo=Count('fecha_hora_llegada'),
+    ).order_by()
+
+    insumos_por_periodo = Insumo.objects.filter(mantenimiento__in=finalizados).annotate(
+        año=ExtractYear('mantenimiento__fecha_salida_real'),
+        mes=ExtractMonth('mantenimiento__fecha_salida_real'),
+        taller_id=F('mantenimiento__taller_id'),
+        sitio_id=F('mantenimiento__vehiculo__sitio_id'),
+    ).values('año', 'mes', 'taller_id', 'sitio_id', 'nombre_insumo').annotate(total=Count('id')).order_by()
+
+    resumenes_insumo = [ResumenMensualInsumo(**fila) for fila in insumos_por_periodo]
+
+    total_insumos = {}
+    for r in resumenes_insumo:
+        clave = (r.año, r.mes, r.taller_id, r.sitio_id)
+        total_insumos[clave] = total_insumos.get(clave, 0) + r.total
+
+    resumenes_kpi = []
+    for fila in periodos_kpi:
+        duracion = fila['segundos_en_taller']
+        fila['segundos_en_taller'] = int(duracion.total_seconds()) if duracion else 0
+        fila['total_insumos'] = total_insumos.get((fila['año'], fila['mes'], fila['taller_id'], fila['sitio_id']), 0)
+        resumenes_kpi.append(ResumenMensualKPI(**fila))
+
+    # También deja una sola fila por periodo donde los cierres concurrentes duplicaron alguna (ver 0022).
+    ResumenMensualKPI.objects.all().delete()
+    ResumenMensualInsumo.objects.all().delete()
+    ResumenMensualKPI.objects.bulk_create(resumenes_kpi, batch_size=500)
+    ResumenMensualInsumo.objects.bulk_create(resumenes_insumo, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0020_mantenimiento_activo'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:42
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0021_poblar_resumenes_mensuales'),
+    ]
+
+    # Los periodos sin taller o sin sitio que estuvieran repetidos (los NULL no chocaban en la
+    # restricción anterior) ya quedaron en una sola fila al recalcular los resúmenes en 0021.
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='resumenmensualinsumo',
+            name='resumen_insumo_unico_por_periodo',
+        ),
+        migrations.RemoveConstraint(
+            model_name='resumenmensualkpi',
+            name='resumen_kpi_unico_por_periodo',
+        ),
+        migrations.AddConstraint(
+            model_name='resumenmensualinsumo',
+            constraint=models.UniqueConstraint(models.F('año'), models.F('mes'), django.db.models.functions.comparison.Coalesce('taller', 0), django.db.models.functions.comparison.Coalesce('sitio', 0), models.F('nombre_insumo'), name='resumen_insumo_unico_por_periodo'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumenmensualkpi',
+            constraint=models.UniqueConstraint(models.F('año'), models.F('mes'), django.db.models.functions.comparison.Coalesce('taller', 0), django.db.models.functions.comparison.Coalesce('sitio', 0), name='resumen_kpi_unico_por_periodo'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def inicializar_contadores(apps, schema_editor):
+    ContadorPendientes = apps.get_model('operaciones', 'ContadorPendientes')
+    Mantenimiento = apps.get_model('operaciones', 'Mantenimiento')
+
+    valores = {'llegadas_agendadas': Mantenimiento.objects.filter(estado='AGENDADO').count()}
+    activos = (
+        Mantenimiento.objects.filter(estado__in=['DIAGNOSTICO', 'EN_REPARACION'], mecanico_asignado__isnull=False)
+        .order_by().values('mecanico_asignado_id').annotate(valor=Count('pk')).values_list('mecanico_asignado_id', 'valor')
+    )
+    for mecanico_id, valor in activos:
+        valores[f'trabajos_activos:{mecanico_id}'] = valor
+    ContadorPendientes.objects.bulk_create([
+        ContadorPendientes(clave=clave, valor=valor) for clave, valor in valores.items()
+    ])
+
+
+def eliminar_contadores(apps, schema_editor):
+    ContadorPendientes = apps.get_model('operaciones', 'ContadorPendientes')
+    ContadorPendientes.objects.filter(clave='llegadas_agendadas').delete()
+    ContadorPendientes.objects.filter(clave__startswith='trabajos_activos:').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0022_resumenes_unicos_sin_taller_o_sitio'),
+    ]
+
+    operations = [
+        migrations.RunPython(inicializar_contadores, eliminar_contadores),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone 
@@ -79,6 +80,21 @@ class Vehiculo(models.Model):
     sitio = models.ForeignKey(Sitio, on_delete=models.PROTECT, null=True, related_name="vehiculos") 
     es_backup = models.BooleanField(default=False, help_text="Marcar si es un vehículo de respaldo.") 
     estado_actual = models.CharField(max_length=50, choices=EstadoVehiculo.choices, default=EstadoVehiculo.DISPONIBLE) 
+    # Mantenimiento no finalizado del vehículo (a lo más uno). Lo mantienen las señales al guardar o
+    # transicionar un Mantenimiento; permite obtenerlo con un select_related en vez de buscarlo.
+    mantenimiento_activo = models.OneToOneField(
+        'Mantenimiento',
+        on_delete=models.SET_NULL,
+        null=True, blank=True, editable=False,
+        related_name='vehiculo_en_curso'
+    )
+
+    class Meta:
+        indexes = [
+            # Listas de backups por estado (Coordinación y Guardia) y vehículos de cada chofer.
+            models.Index(fields=['es_backup', 'estado_actual'], name='vehiculo_backup_estado_idx'),
+            models.Index(fields=['chofer_asignado', 'es_backup'], name='vehiculo_chofer_backup_idx'),
+        ]
 
     def __str__(self):
         return f"{self.marca} {self.modelo} ({self.patente})"
@@ -131,6 +147,30 @@ class Mantenimiento(models.Model):
     )
     fecha_validacion = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Listas por estado de cada panel (Supervisor, Guardia), en orden de solicitud.
+            models.Index(fields=['estado', 'fecha_solicitud'], name='mant_estado_fecha_idx'),
+            models.Index(fields=['vehiculo', 'estado'], name='mant_vehiculo_estado_idx'),
+            models.Index(fields=['mecanico_asignado', 'estado'], name='mant_mecanico_estado_idx'),
+            # Reportes y KPIs: `fecha_salida_real__year` se traduce a un rango, así que sirve este índice.
+            models.Index(fields=['estado', 'fecha_salida_real'], name='mant_estado_salida_idx'),
+            # Parciales: solo contienen las pocas filas que buscan el Jefe de Taller y el panel del chofer.
+            models.Index(
+                fields=['fecha_hora_llegada'], name='mant_por_asignar_idx',
+                condition=models.Q(estado='EN_TALLER', mecanico_asignado__isnull=True),
+            ),
+        ]
+        constraints = [
+            # Un vehículo tiene a lo más un mantenimiento abierto. El índice único también sirve
+            # para buscar el mantenimiento activo de un vehículo.
+            models.UniqueConstraint(
+                fields=['vehiculo'], name='mant_un_activo_por_vehiculo',
+                condition=~models.Q(estado='FINALIZADO'),
+                violation_error_message="Este vehículo ya tiene un mantenimiento en curso.",
+            ),
+        ]
+
     def __str__(self):
         return f"Mantenimiento para {self.vehiculo.patente} - {self.get_estado_display()}"
 
@@ -159,13 +199,22 @@ class FotoMantenimiento(models.Model):
 
 # 8. Modelo para Observaciones y Bitácora
 class Observacion(models.Model):
+    class Tipo(models.TextChoices):
+        GENERAL = 'GENERAL', 'General'
+        ENTRADA_GUARDIA = 'ENTRADA_GUARDIA', 'Observación de guardia (entrada)'
+        RECHAZO_SUPERVISOR = 'RECHAZO_SUPERVISOR', 'Rechazo de supervisor'
+
     mantenimiento = models.ForeignKey(Mantenimiento, on_delete=models.CASCADE, related_name='observaciones')
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
+    tipo = models.CharField(max_length=30, choices=Tipo.choices, default=Tipo.GENERAL)
     texto = models.TextField()
     fecha = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['fecha'] 
+        indexes = [
+            models.Index(fields=['mantenimiento', 'tipo', '-fecha'], name='observacion_tipo_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Obs. de {self.usuario.username} en {self.mantenimiento.vehiculo.patente}"
@@ -198,9 +247,14 @@ class Agenda_Taller(models.Model):
     tipo_atencion = models.CharField(max_length=50, choices=TipoAtencion.choices)
     hora_inicio = models.DateTimeField()
     hora_final = models.DateTimeField()
+    # Se usa para el ETag/Last-Modified del calendario; las actualizaciones masivas deben fijarlo a mano.
+    actualizado_en = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['hora_inicio']
+        indexes = [
+            models.Index(fields=['hora_inicio', 'hora_final'], name='agenda_ventana_idx'),
+        ]
         verbose_name = "Bloque de Agenda"
         verbose_name_plural = "Agenda del Taller"
 
@@ -235,15 +289,60 @@ class Historial_Cambios(models.Model):
         LOGIN = 'LOGIN', 'Inicio Sesión'
         ACCESO = 'ACCESO', 'Acceso'
 
-    fecha_cambio = models.DateTimeField(auto_now_add=True)
+    class TipoEvento(models.TextChoices):
+        # Movimientos en portería
+        ENTRADA_TALLER = 'ENTRADA_TALLER', 'Entrada a taller'
+        SALIDA_TALLER = 'SALIDA_TALLER', 'Salida de taller (mantenimiento finalizado)'
+        SALIDA_VEHICULO = 'SALIDA_VEHICULO', 'Salida de vehículo'
+        # Vehículos de respaldo
+        ASIGNACION_BACKUP = 'ASIGNACION_BACKUP', 'Asignación de backup'
+        ENTREGA_BACKUP = 'ENTREGA_BACKUP', 'Entrega de backup'
+        SALIDA_BACKUP = 'SALIDA_BACKUP', 'Salida de backup'
+        DEVOLUCION_BACKUP = 'DEVOLUCION_BACKUP', 'Devolución de backup'
+        INTERCAMBIO_BACKUP = 'INTERCAMBIO_BACKUP', 'Intercambio de backup'
+        # Ciclo del mantenimiento
+        SOLICITUD_MANTENIMIENTO = 'SOLICITUD_MANTENIMIENTO', 'Solicitud de mantenimiento'
+        ASIGNACION_MECANICO = 'ASIGNACION_MECANICO', 'Asignación de mecánico'
+        DIAGNOSTICO = 'DIAGNOSTICO', 'Actualización de diagnóstico'
+        INSUMO_SOLICITADO = 'INSUMO_SOLICITADO', 'Insumo solicitado'
+        INSUMO_APROBADO = 'INSUMO_APROBADO', 'Insumo aprobado'
+        INSUMO_RECHAZADO = 'INSUMO_RECHAZADO', 'Insumo rechazado'
+        FOTO_EVIDENCIA = 'FOTO_EVIDENCIA', 'Foto de evidencia'
+        INICIO_PAUSA = 'INICIO_PAUSA', 'Inicio de pausa'
+        FIN_PAUSA = 'FIN_PAUSA', 'Fin de pausa'
+        CIERRE_REPARACION = 'CIERRE_REPARACION', 'Cierre de reparación'
+        VALIDACION_REPARACION = 'VALIDACION_REPARACION', 'Validación de reparación'
+        RECHAZO_REPARACION = 'RECHAZO_REPARACION', 'Rechazo de reparación'
+        # Administración
+        AGENDA = 'AGENDA', 'Gestión de agenda'
+        USUARIO = 'USUARIO', 'Gestión de usuarios'
+        DOCUMENTO = 'DOCUMENTO', 'Gestión de documentos'
+        OTRO = 'OTRO', 'Otro'
+
+    # Eventos que alimentan los reportes de Coordinación.
+    EVENTOS_BACKUP = [
+        TipoEvento.ASIGNACION_BACKUP, TipoEvento.ENTREGA_BACKUP, TipoEvento.SALIDA_BACKUP,
+        TipoEvento.DEVOLUCION_BACKUP, TipoEvento.INTERCAMBIO_BACKUP,
+    ]
+    EVENTOS_ENTRADA_SALIDA = [TipoEvento.ENTRADA_TALLER, TipoEvento.SALIDA_TALLER]
+
+    # Se fija al registrar el cambio y no al guardarlo, porque la escritura puede diferirse (ver auditoria.py).
+    fecha_cambio = models.DateTimeField(default=timezone.now, editable=False)
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     tipo_cambio = models.CharField(max_length=50, choices=TipoCambio.choices)
+    tipo_evento = models.CharField(max_length=50, choices=TipoEvento.choices, default=TipoEvento.OTRO)
     tabla_afectada = models.CharField(max_length=100, blank=True)
     id_registro_afectado = models.CharField(max_length=50, blank=True)
+    vehiculo = models.ForeignKey(Vehiculo, on_delete=models.SET_NULL, null=True, blank=True, related_name='historial')
+    mantenimiento = models.ForeignKey(Mantenimiento, on_delete=models.SET_NULL, null=True, blank=True, related_name='historial')
     descripcion = models.TextField(help_text="Descripción del cambio realizado")
 
     class Meta:
         ordering = ['-fecha_cambio']
+        indexes = [
+            models.Index(fields=['tipo_evento', '-fecha_cambio'], name='historial_evento_fecha_idx'),
+            models.Index(fields=['-fecha_cambio'], name='historial_fecha_idx'),
+        ]
         verbose_name = "Registro de Auditoría"
         verbose_name_plural = "Registros de Auditoría"
 
@@ -273,4 +372,82 @@ class SolicitudBackup(models.Model):
         verbose_name_plural = "Solicitudes de Backup"
 
     def __str__(self):
-        return f"Solicitud de {self.chofer.display_name} el {self.fecha_solicitud.strftime('%d/%m/%Y')}"
\ No newline at end of file
+        return f"Solicitud de {self.chofer.display_name} el {self.fecha_solicitud.strftime('%d/%m/%Y')}"
+
+# 14. Resumen mensual de KPIs de mantenimientos finalizados
+class ResumenMensualKPI(models.Model):
+    año = models.PositiveIntegerField()
+    mes = models.PositiveSmallIntegerField()
+    taller = models.ForeignKey(Taller, on_delete=models.SET_NULL, null=True, blank=True, related_name='resumenes_kpi')
+    sitio = models.ForeignKey(Sitio, on_delete=models.SET_NULL, null=True, blank=True, related_name='resumenes_kpi')
+    total_mantenimientos = models.PositiveIntegerField(default=0)
+    total_insumos = models.PositiveIntegerField(default=0)
+    # Para el tiempo promedio en taller: suma de segundos y cantidad de mantenimientos con llegada registrada.
+    segundos_en_taller = models.BigIntegerField(default=0)
+    mantenimientos_con_tiempo = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Con COALESCE, los resúmenes sin taller o sin sitio (NULL) también chocan entre sí:
+            # en una restricción sobre las columnas, dos NULL cuentan como distintos.
+            models.UniqueConstraint(
+                'año', 'mes', Coalesce('taller', 0), Coalesce('sitio', 0), name='resumen_kpi_unico_por_periodo',
+            ),
+        ]
+        verbose_name = "Resumen Mensual de KPIs"
+        verbose_name_plural = "Resúmenes Mensuales de KPIs"
+
+    def __str__(self):
+        return f"KPIs {self.mes:02d}/{self.año} - {self.taller or 'Sin taller'} / {self.sitio or 'Sin sitio'}"
+
+# 15. Resumen mensual de insumos utilizados
+class ResumenMensualInsumo(models.Model):
+    año = models.PositiveIntegerField()
+    mes = models.PositiveSmallIntegerField()
+    taller = models.ForeignKey(Taller, on_delete=models.SET_NULL, null=True, blank=True, related_name='resumenes_insumo')
+    sitio = models.ForeignKey(Sitio, on_delete=models.SET_NULL, null=True, blank=True, related_name='resumenes_insumo')
+    nombre_insumo = models.CharField(max_length=100)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                'año', 'mes', Coalesce('taller', 0), Coalesce('sitio', 0), 'nombre_insumo',
+                name='resumen_insumo_unico_por_periodo',
+            ),
+        ]
+        verbose_name = "Resumen Mensual de Insumos"
+        verbose_name_plural = "Resúmenes Mensuales de Insumos"
+
+    def __str__(self):
+        return f"{self.nombre_insumo} x{self.total} ({self.mes:02d}/{self.año})"
+
+# 16. Contadores de trabajo pendiente (badges de los paneles)
+class ContadorPendientes(models.Model):
+    clave = models.CharField(max_length=50, primary_key=True)
+    valor = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Contador de Pendientes"
+        verbose_name_plural = "Contadores de Pendientes"
+
+    def __str__(self):
+        return f"{self.clave}: {self.valor}"
+
+# 17. Archivos del historial de auditoría (registros antiguos movidos fuera de la tabla)
+class ArchivoHistorial(models.Model):
+    año = models.PositiveIntegerField()
+    mes = models.PositiveSmallIntegerField()
+    archivo = models.CharField(max_length=255, unique=True, help_text="Nombre del archivo dentro de HISTORIAL_ARCHIVO_DIR")
+    registros = models.PositiveIntegerField()
+    desde = models.DateTimeField()
+    hasta = models.DateTimeField()
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-año', '-mes', '-creado_en']
+        verbose_name = "Archivo de Historial"
+        verbose_name_plural = "Archivos de Historial"
+
+    def __str__(self):
+        return f"Historial {self.mes:02d}/{self.año} ({self.registros} registros)"
@@ -0,0 +1,129 @@
+# operaciones/paginacion.py
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+TAMAÑO_PAGINA = 50
+
+
+class PaginaKeyset:
+    """Resultado de una página: los objetos y los cursores para moverse a la siguiente o anterior."""
+    def __init__(self, objetos, cursor_siguiente=None, cursor_anterior=None):
+        self.objetos = objetos
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def tiene_siguiente(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def tiene_anterior(self):
+        return self.cursor_anterior is not None
+
+    @property
+    def tiene_otras_paginas(self):
+        return self.tiene_siguiente or self.tiene_anterior
+
+
+def _campo(modelo, nombre):
+    nombre = nombre.lstrip('-')
+    return modelo._meta.pk if nombre == 'pk' else modelo._meta.get_field(nombre)
+
+
+def _codificar_cursor(objeto, campos):
+    valores = [campo.value_to_string(objeto) for campo in campos]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip('=')
+
+
+def _decodificar_cursor(cursor, campos):
+    """Convierte el cursor de la URL en valores Python. Retorna None si el cursor no es válido."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if not isinstance(valores, list) or len(valores) != len(campos):
+            return None
+        return [campo.to_python(valor) for campo, valor in zip(campos, valores)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _filtro_posterior(orden, valores):
+    """
+    Construye el predicado "fila posterior al cursor" para un orden compuesto, ej:
+    (a < x) OR (a = x AND b < y) para el orden ('-a', '-b').
+    """
+    filtro = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        operador = 'lt' if campo.startswith('-') else 'gt'
+        filtro |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+        iguales[nombre] = valor
+    return filtro
+
+
+def _invertir(orden):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden]
+
+
+def paginar_keyset(request, queryset, orden, tamaño=TAMAÑO_PAGINA):
+    """
+    Pagina un queryset por "keyset" (seek): en vez de OFFSET, cada página filtra
+    a partir de los valores de la última fila vista, por lo que la página N cuesta
+    lo mismo que la primera.
+
+    `orden` es una tupla de campos no nulos cuyo último elemento debe ser único
+    (normalmente la clave primaria), ej: ('-fecha_solicitud', '-id').
+    Los cursores viajan en los parámetros GET `despues` y `antes`, junto a los filtros actuales.
+    """
+    campos = [_campo(queryset.model, campo) for campo in orden]
+    despues = request.GET.get('despues')
+    antes = request.GET.get('antes')
+
+    valores_despues = _decodificar_cursor(despues, campos) if despues else None
+    valores_antes = _decodificar_cursor(antes, campos) if antes and not valores_despues else None
+
+    if valores_antes:
+        # Página anterior: recorremos el orden inverso y luego damos vuelta el resultado.
+        filas = list(
+            queryset.filter(_filtro_posterior(_invertir(orden), valores_antes))
+            .order_by(*_invertir(orden))[:tamaño + 1]
+        )
+        hay_mas_atras = len(filas) > tamaño
+        objetos = filas[:tamaño][::-1]
+        return PaginaKeyset(
+            objetos,
+            cursor_siguiente=_codificar_cursor(objetos[-1], campos) if objetos else None,
+            cursor_anterior=_codificar_cursor(objetos[0], campos) if hay_mas_atras else None,
+        )
+
+    pagina = queryset.order_by(*orden)
+    if valores_despues:
+        pagina = pagina.filter(_filtro_posterior(orden, valores_despues))
+    filas = list(pagina[:tamaño + 1])
+    hay_mas = len(filas) > tamaño
+    objetos = filas[:tamaño]
+    return PaginaKeyset(
+        objetos,
+        cursor_siguiente=_codificar_cursor(objetos[-1], campos) if hay_mas else None,
+        cursor_anterior=_codificar_cursor(objetos[0], campos) if valores_despues and objetos else None,
+    )
+
+
+class KeysetPaginationMixin:
+    """
+    Mixin para ListView que reemplaza la lista completa por una página keyset.
+    Las vistas definen `orden_keyset` y, opcionalmente, `tamaño_pagina`.
+    """
+    orden_keyset = ('pk',)
+    tamaño_pagina = TAMAÑO_PAGINA
+
+    def get_context_data(self, **kwargs):
+        pagina = paginar_keyset(self.request, self.object_list, self.orden_keyset, self.tamaño_pagina)
+        kwargs['object_list'] = pagina.objetos
+        context = super().get_context_data(**kwargs)
+        context['pagina'] = pagina
+        return context
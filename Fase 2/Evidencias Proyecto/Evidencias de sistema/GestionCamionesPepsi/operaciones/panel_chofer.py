@@ -0,0 +1,52 @@
+# operaciones/panel_chofer.py
+from .models import Mantenimiento, Vehiculo
+
+
+class ResumenChofer:
+    """
+    Foto del estado de un chofer para su panel: sus vehículos y los mantenimientos abiertos
+    de su vehículo principal. Se carga con una consulta y todo lo demás se deriva en memoria.
+    """
+    def __init__(self, chofer):
+        # Todos los vehículos del chofer, tanto principales como de respaldo, con su mantenimiento en curso.
+        self.vehiculos = list(
+            Vehiculo.objects.filter(chofer_asignado=chofer)
+            .select_related('sitio', 'mantenimiento_activo__taller').order_by('patente')
+        )
+        self.vehiculos_principales = [v for v in self.vehiculos if not v.es_backup]
+        self.vehiculos_backup = [v for v in self.vehiculos if v.es_backup]
+
+        # El vehículo principal del chofer, incluso si está en taller.
+        self.vehiculo_principal = self.vehiculos_principales[0] if self.vehiculos_principales else None
+
+        # Un vehículo tiene a lo más un mantenimiento abierto (ver Vehiculo.mantenimiento_activo).
+        self.mantenimientos_abiertos = []
+        if self.vehiculo_principal and self.vehiculo_principal.mantenimiento_activo:
+            mantenimiento = self.vehiculo_principal.mantenimiento_activo
+            # Reutilizamos el vehículo ya cargado (con su sitio) en vez de volver a unirlo.
+            mantenimiento.vehiculo = self.vehiculo_principal
+            self.mantenimientos_abiertos = [mantenimiento]
+
+    def _primer_backup(self, estado):
+        return next((v for v in self.vehiculos_backup if v.estado_actual == estado), None)
+
+    @property
+    def backup_por_retirar(self):
+        """Backup asignado que el chofer aún no retira del recinto."""
+        return self._primer_backup(Vehiculo.EstadoVehiculo.ASIGNADO)
+
+    @property
+    def backup_en_uso(self):
+        return self._primer_backup(Vehiculo.EstadoVehiculo.EN_RUTA)
+
+    @property
+    def mantenimiento_actual(self):
+        """El mantenimiento no finalizado del vehículo principal."""
+        return self.mantenimientos_abiertos[0] if self.mantenimientos_abiertos else None
+
+    @property
+    def mantenimiento_listo(self):
+        """Mantenimiento del vehículo principal ya VALIDADO, listo para retiro."""
+        return next(
+            (m for m in self.mantenimientos_abiertos if m.estado == Mantenimiento.Estado.VALIDADO), None
+        )
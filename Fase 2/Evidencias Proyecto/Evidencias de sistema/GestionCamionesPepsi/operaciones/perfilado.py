@@ -0,0 +1,164 @@
+# operaciones/perfilado.py
+import threading
+import time
+from collections import Counter, defaultdict, deque, namedtuple
+from contextlib import ExitStack, contextmanager
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+from django.utils import timezone
+
+# Una petición medida. duplicadas: las consultas repetidas más frecuentes, como (sql, veces).
+Medicion = namedtuple('Medicion', [
+    'fecha', 'vista', 'metodo', 'ruta', 'estado', 'total_ms', 'consultas', 'sql_ms', 'plantillas_ms', 'duplicadas',
+])
+
+DUPLICADAS_POR_PETICION = 5
+LARGO_MAXIMO_SQL = 300
+
+_candado = threading.Lock()
+_mediciones = deque(maxlen=settings.PERFILADO_MUESTRAS)
+# Medición en curso de la petición actual (la usan el contador de SQL y el de plantillas).
+_local = Local()
+
+
+class _EnCurso:
+    def __init__(self):
+        self.sql = Counter()
+        self.sql_ms = 0.0
+        self.plantillas_ms = 0.0
+        self.plantillas_abiertas = 0
+
+
+def _contar_consulta(execute, sql, params, many, context):
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        en_curso = getattr(_local, 'en_curso', None)
+        if en_curso is not None:
+            en_curso.sql_ms += (time.perf_counter() - inicio) * 1000
+            # Se agrupa por la sentencia con sus marcadores, sin los valores: así un N+1 aparece como una sola.
+            en_curso.sql[sql] += 1
+
+
+_render_original = Template.render
+
+
+def _render_medido(self, context=None, request=None):
+    en_curso = getattr(_local, 'en_curso', None)
+    if en_curso is None:
+        return _render_original(self, context, request)
+    # Solo se mide la plantilla exterior: un render dentro de otro (ej. un template tag) ya está incluido.
+    en_curso.plantillas_abiertas += 1
+    inicio = time.perf_counter()
+    try:
+        return _render_original(self, context, request)
+    finally:
+        en_curso.plantillas_abiertas -= 1
+        if not en_curso.plantillas_abiertas:
+            en_curso.plantillas_ms += (time.perf_counter() - inicio) * 1000
+
+
+def instalar():
+    """
+    Empieza a medir el render de las plantillas, reemplazando Template.render en todo el proceso.
+    Se llama solo si el perfilado está activo; llamarla de nuevo no hace nada.
+    Retorna True si lo instaló esta llamada.
+    """
+    with _candado:
+        if Template.render is _render_medido:
+            return False
+        Template.render = _render_medido
+        return True
+
+
+def desinstalar():
+    """Vuelve al render original de las plantillas (ej: al terminar una prueba)."""
+    with _candado:
+        if Template.render is _render_medido:
+            Template.render = _render_original
+
+
+@contextmanager
+def medir():
+    """
+    Mide la petición en curso: entrega un objeto con las consultas (por sentencia), el tiempo en
+    SQL y el tiempo de render de plantillas. El tiempo en SQL es el de ejecutar cada sentencia;
+    leer y convertir las filas se cuenta en la vista. Las consultas que se ejecutan al recorrer
+    un queryset dentro de la plantilla se cuentan también en el tiempo de plantillas.
+    """
+    en_curso = _local.en_curso = _EnCurso()
+    try:
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(_contar_consulta))
+            yield en_curso
+    finally:
+        _local.en_curso = None
+
+
+def registrar(request, response, en_curso, total_ms):
+    """Guarda la medición de una petición en el buffer circular y la retorna."""
+    match = request.resolver_match
+    medicion = Medicion(
+        fecha=timezone.now(),
+        vista=match.view_name if match else request.path,
+        metodo=request.method,
+        ruta=request.get_full_path()[:200],
+        estado=response.status_code,
+        total_ms=total_ms,
+        consultas=sum(en_curso.sql.values()),
+        sql_ms=en_curso.sql_ms,
+        plantillas_ms=en_curso.plantillas_ms,
+        duplicadas=[
+            (sql[:LARGO_MAXIMO_SQL], veces)
+            for sql, veces in en_curso.sql.most_common(DUPLICADAS_POR_PETICION) if veces > 1
+        ],
+    )
+    with _candado:
+        _mediciones.append(medicion)
+    return medicion
+
+
+def mediciones():
+    with _candado:
+        return list(_mediciones)
+
+
+def vaciar():
+    with _candado:
+        _mediciones.clear()
+
+
+class ResumenVista:
+    """Promedios y percentil 95 de las mediciones de una vista."""
+    def __init__(self, vista, mediciones):
+        tiempos = sorted(m.total_ms for m in mediciones)
+        cantidad = len(mediciones)
+        self.vista = vista
+        self.peticiones = cantidad
+        self.total_ms = sum(tiempos) / cantidad
+        self.p95_ms = tiempos[min(cantidad - 1, int(cantidad * 0.95))]
+        self.max_ms = tiempos[-1]
+        self.consultas = sum(m.consultas for m in mediciones) / cantidad
+        self.sql_ms = sum(m.sql_ms for m in mediciones) / cantidad
+        self.plantillas_ms = sum(m.plantillas_ms for m in mediciones) / cantidad
+
+        duplicadas = Counter()
+        for medicion in mediciones:
+            for sql, veces in medicion.duplicadas:
+                duplicadas[sql] += veces
+        # Veces promedio por petición de cada consulta repetida.
+        self.duplicadas = [(sql, veces / cantidad) for sql, veces in duplicadas.most_common(DUPLICADAS_POR_PETICION)]
+
+
+def resumen_por_vista():
+    """Un ResumenVista por nombre de URL, de la que más tiempo acumula a la que menos."""
+    por_vista = defaultdict(list)
+    for medicion in mediciones():
+        por_vista[medicion.vista].append(medicion)
+    resumenes = [ResumenVista(vista, lista) for vista, lista in por_vista.items()]
+    return sorted(resumenes, key=lambda r: r.total_ms * r.peticiones, reverse=True)
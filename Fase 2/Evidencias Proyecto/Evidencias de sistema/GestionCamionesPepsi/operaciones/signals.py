@@ -0,0 +1,66 @@
+# operaciones/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import efectos
+from .cache_paneles import invalidar_paneles
+from .models import Agenda_Taller, Insumo, Mantenimiento, SolicitudBackup, Usuario, Vehiculo
+
+Roles = Usuario.Roles
+
+
+@receiver(pre_save, sender=Mantenimiento)
+@receiver(pre_save, sender=Vehiculo)
+@receiver(pre_save, sender=Insumo)
+@receiver(pre_save, sender=SolicitudBackup)
+def _leer_valores_anteriores(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Se leen de la base de datos (y no al cargar la instancia) para no trabajar con valores viejos.
+    instance._valores_anteriores = {}
+    if raw or instance._state.adding:
+        return
+    campos = efectos.CAMPOS_ANTERIORES[sender]
+    if update_fields is not None and not {sender._meta.get_field(campo).attname for campo in update_fields} & set(campos):
+        # El save() no escribe ninguno de estos campos: no cambian y no hace falta consultarlos.
+        instance._valores_anteriores = {campo: instance.__dict__[campo] for campo in campos if campo in instance.__dict__}
+        return
+    instance._valores_anteriores = sender._base_manager.filter(pk=instance.pk).values(*campos).first() or {}
+
+
+# Los efectos de guardar y eliminar (caché de paneles, contadores de pendientes, eventos en vivo
+# y mantenimiento activo) están en `efectos`, que también usan los servicios que hacen UPDATE.
+
+@receiver(post_save, sender=Mantenimiento)
+@receiver(post_save, sender=Vehiculo)
+@receiver(post_save, sender=Insumo)
+@receiver(post_save, sender=SolicitudBackup)
+def _guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    efectos.al_guardar(instance, instance._valores_anteriores, creado=created)
+
+
+@receiver(post_delete, sender=Mantenimiento)
+@receiver(post_delete, sender=Vehiculo)
+@receiver(post_delete, sender=Insumo)
+@receiver(post_delete, sender=SolicitudBackup)
+def _eliminado(sender, instance, **kwargs):
+    efectos.al_eliminar(instance)
+
+
+# --- Caché de paneles ---
+
+@receiver([post_save, post_delete], sender=Agenda_Taller)
+def _agenda_cambiada(sender, instance, **kwargs):
+    # Solo los bloques reservados aparecen en los paneles (tipo de atención y hora del trabajo).
+    if instance.mantenimiento_id:
+        invalidar_paneles(roles=[Roles.JEFE_TALLER, Roles.MECANICO])
+
+
+@receiver(post_save, sender=Usuario)
+def _usuario_cambiado(sender, instance, update_fields=None, **kwargs):
+    # El login solo actualiza last_login; no afecta a ningún panel.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    if instance.rol == Roles.MECANICO:
+        # La lista de mecánicos disponibles del Jefe de Taller.
+        invalidar_paneles(roles=[Roles.JEFE_TALLER])
@@ -1,3 +1,943 @@
-from django.test import TestCase
+import re
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, transaction
+from django.template.backends.django import Template
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from GestionCamionesPepsi.settings import perfil_base_de_datos
+
+from . import archivo_historial, auditoria, busqueda, contadores, efectos, metricas, perfilado, transiciones, urls
+from .flota_sintetica import generar_flota
+from .management.commands.medir_indices import consultas_por_vista
+from .kpis import reconstruir_resumenes, registrar_mantenimiento_finalizado
+from .models import (
+    Agenda_Taller, ArchivoHistorial, ContadorPendientes, Documento, FotoMantenimiento, Historial_Cambios, Insumo, Mantenimiento,
+    Observacion, Pausa, ResumenMensualInsumo, ResumenMensualKPI, Sitio, SolicitudBackup, Taller, Usuario, Vehiculo,
+)
+
+
+class PerfilBaseDeDatosTests(SimpleTestCase):
+    """Configuración que arma settings.py para cada valor de DB_MOTOR."""
+
+    def test_sqlite_por_defecto_con_wal(self):
+        perfil = perfil_base_de_datos({})
+        self.assertEqual(perfil['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertIn('PRAGMA journal_mode=WAL;', perfil['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA synchronous=NORMAL;', perfil['OPTIONS']['init_command'])
+        self.assertEqual(perfil['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+
+    def test_postgresql_con_conexiones_persistentes(self):
+        perfil = perfil_base_de_datos({'DB_MOTOR': 'postgresql', 'DB_NOMBRE': 'flota', 'DB_CONN_MAX_AGE': '120'})
+        self.assertEqual(perfil['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(perfil['NAME'], 'flota')
+        self.assertEqual(perfil['CONN_MAX_AGE'], 120)
+        self.assertTrue(perfil['CONN_HEALTH_CHECKS'])
+        self.assertEqual(perfil['OPTIONS'], {})
+
+    def test_postgresql_con_pool(self):
+        perfil = perfil_base_de_datos({'DB_MOTOR': 'postgresql', 'DB_POOL': '1'})
+        self.assertEqual(perfil['OPTIONS'], {'pool': True})
+        self.assertEqual(perfil['CONN_MAX_AGE'], 0)
+
+
+class ConexionActivaTests(TestCase):
+    """
+    Verifica que la conexión real use el perfil elegido. La suite se corre una vez por perfil:
+        python manage.py test
+        DB_MOTOR=postgresql python manage.py test
+    """
+
+    def test_sqlite_aplica_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Perfil PostgreSQL activo.")
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+    def test_postgresql_revisa_conexiones(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest("Perfil SQLite activo.")
+        self.assertTrue(connection.settings_dict['CONN_HEALTH_CHECKS'])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+# --- Presupuesto de consultas por vista ---
+
+Roles = Usuario.Roles
+Estado = Mantenimiento.Estado
+
+# Ninguna vista debería necesitar más consultas que esto, tenga la base 10 o 1.000 filas.
+MAXIMO_CONSULTAS = 25
+
+# Estados de los mantenimientos abiertos del conjunto de prueba, repartidos en partes iguales.
+ESTADOS_ABIERTOS = [
+    Estado.AGENDADO, Estado.EN_TALLER, Estado.DIAGNOSTICO,
+    Estado.EN_REPARACION, Estado.REPARADO, Estado.VALIDADO,
+]
+
+# Rutas que no se pueden medir con un GET: cierran la sesión o son un flujo que no termina.
+RUTAS_EXCLUIDAS = {'logout', 'eventos_en_vivo'}
+
+
+def crear_flota(cantidad, actores):
+    """
+    Agrega `cantidad` vehículos (con su chofer), cada uno con un mantenimiento abierto y otro
+    finalizado, y sus insumos, pausas, observaciones, fotos, documentos, agenda, historial y
+    solicitudes de backup. Usa bulk_create, así que después ajusta a mano lo que mantienen las señales.
+    """
+    inicio = Vehiculo.objects.count()
+    ahora = timezone.now()
+    sitio, taller, mecanico = actores['sitio'], actores['taller'], actores[Roles.MECANICO]
+
+    choferes = Usuario.objects.bulk_create([
+        Usuario(username=f'chofer{inicio + i}', password='!', rol=Roles.CHOFER, first_name='Chofer', last_name=str(inicio + i))
+        for i in range(cantidad)
+    ])
+    vehiculos = Vehiculo.objects.bulk_create([
+        Vehiculo(patente=f'T{inicio + i:05d}', marca='Volvo', modelo='FH', año=2020, sitio=sitio,
+                 chofer_asignado=choferes[i], estado_actual=Vehiculo.EstadoVehiculo.EN_TALLER)
+        for i in range(cantidad)
+    ])
+    estados_backup = [Vehiculo.EstadoVehiculo.DISPONIBLE, Vehiculo.EstadoVehiculo.ASIGNADO, Vehiculo.EstadoVehiculo.EN_RUTA]
+    Vehiculo.objects.bulk_create([
+        Vehiculo(patente=f'B{inicio + i:05d}', marca='Volvo', modelo='FM', año=2019, sitio=sitio, es_backup=True,
+                 estado_actual=estados_backup[i % 3], chofer_asignado=choferes[i] if i % 3 else None)
+        for i in range(0, cantidad, 5)
+    ])
+
+    abiertos, finalizados = [], []
+    for i, vehiculo in enumerate(vehiculos):
+        estado = ESTADOS_ABIERTOS[i % len(ESTADOS_ABIERTOS)]
+        en_taller = estado != Estado.AGENDADO
+        asignado = estado not in (Estado.AGENDADO, Estado.EN_TALLER)
+        abiertos.append(Mantenimiento(
+            vehiculo=vehiculo, solicitado_por=choferes[i], taller=taller, estado=estado,
+            motivo_ingreso=f'Ruido en frenos {i}', fecha_solicitud=ahora - timedelta(days=2),
+            fecha_hora_llegada=ahora - timedelta(days=1) if en_taller else None,
+            mecanico_asignado=mecanico if asignado else None,
+            diagnostico='Pastillas gastadas' if asignado else '',
+            trabajo_realizado='Cambio de pastillas' if asignado else '',
+            validado_por=actores[Roles.SUPERVISOR] if estado == Estado.VALIDADO else None,
+            fecha_validacion=ahora if estado == Estado.VALIDADO else None,
+        ))
+        finalizados.append(Mantenimiento(
+            vehiculo=vehiculo, solicitado_por=choferes[i], taller=taller, estado=Estado.FINALIZADO,
+            motivo_ingreso='Mantención preventiva', mecanico_asignado=mecanico,
+            fecha_solicitud=ahora - timedelta(days=30), fecha_hora_llegada=ahora - timedelta(days=29),
+            fecha_salida_real=ahora - timedelta(days=28), diagnostico='OK', trabajo_realizado='Cambio de aceite',
+            validado_por=actores[Roles.SUPERVISOR], fecha_validacion=ahora - timedelta(days=28),
+        ))
+    abiertos = Mantenimiento.objects.bulk_create(abiertos)
+    finalizados = Mantenimiento.objects.bulk_create(finalizados)
+    # Historial del vehículo del chofer de prueba, que crece con el conjunto.
+    Mantenimiento.objects.bulk_create([
+        Mantenimiento(vehiculo=actores['vehiculo'], solicitado_por=actores[Roles.CHOFER], taller=taller,
+                      estado=Estado.FINALIZADO, motivo_ingreso='Revisión', mecanico_asignado=mecanico,
+                      fecha_hora_llegada=ahora - timedelta(days=10), fecha_salida_real=ahora - timedelta(days=9))
+        for _ in range(cantidad)
+    ])
+
+    Insumo.objects.bulk_create(
+        [Insumo(mantenimiento=m, nombre_insumo='Pastillas de freno', solicitado_por=mecanico) for m in abiertos]
+        + [Insumo(mantenimiento=m, nombre_insumo='Aceite', solicitado_por=mecanico,
+                  estado_aprobacion=Insumo.EstadoAprobacion.APROBADO, aprobado_por=actores[Roles.JEFE_TALLER])
+           for m in finalizados]
+    )
+    Pausa.objects.bulk_create([
+        Pausa(mantenimiento=m, mecanico=mecanico, motivo='Esperando repuestos',
+              fin_pausa=None if m.estado == Estado.EN_REPARACION else ahora)
+        for m in abiertos if m.mecanico_asignado_id
+    ])
+    Observacion.objects.bulk_create([
+        Observacion(mantenimiento=m, usuario=actores[Roles.GUARDIA], tipo=Observacion.Tipo.ENTRADA_GUARDIA,
+                    texto='OBSERVACIÓN DE GUARDIA (ENTRADA): rayón lateral')
+        for m in abiertos
+    ])
+    FotoMantenimiento.objects.bulk_create([
+        FotoMantenimiento(mantenimiento=m, imagen='fotos_mantenimiento/prueba.jpg', subido_por=mecanico)
+        for m in abiertos
+    ])
+    Documento.objects.bulk_create([
+        Documento(vehiculo=v, nombre_documento='Seguro', archivo='documentos_vehiculos/prueba.pdf',
+                  subido_por=actores[Roles.SUPERVISOR])
+        for v in vehiculos
+    ])
+    Agenda_Taller.objects.bulk_create(
+        [Agenda_Taller(taller=taller, mantenimiento=m, tipo_atencion=Agenda_Taller.TipoAtencion.MECANICA,
+                       hora_inicio=ahora - timedelta(hours=2), hora_final=ahora - timedelta(hours=1))
+         for m in abiertos]
+        + [Agenda_Taller(taller=taller, tipo_atencion=Agenda_Taller.TipoAtencion.RUTINA,
+                         hora_inicio=ahora + timedelta(days=1, hours=i % 8),
+                         hora_final=ahora + timedelta(days=1, hours=i % 8 + 1))
+           for i in range(cantidad)]
+    )
+    eventos = list(Historial_Cambios.TipoEvento)
+    Historial_Cambios.objects.bulk_create([
+        Historial_Cambios(usuario=actores[Roles.GUARDIA], tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
+                          tipo_evento=eventos[i % len(eventos)], tabla_afectada='Mantenimiento',
+                          id_registro_afectado=m.id, vehiculo_id=m.vehiculo_id, mantenimiento=m,
+                          descripcion=f'Cambio de pastillas de freno en {m.vehiculo_id}')
+        for i, m in enumerate(abiertos + finalizados)
+    ])
+    SolicitudBackup.objects.bulk_create([
+        SolicitudBackup(chofer=chofer, motivo='Vehículo en taller',
+                        estado=SolicitudBackup.EstadoSolicitud.PENDIENTE if i % 2 else SolicitudBackup.EstadoSolicitud.ATENDIDA)
+        for i, chofer in enumerate(choferes)
+    ])
+
+    for m in abiertos:
+        Vehiculo.objects.filter(patente=m.vehiculo_id).update(mantenimiento_activo=m)
+    contadores.recalcular()
+    reconstruir_resumenes()
+
+
+@override_settings(AUDITORIA_EN_SEGUNDO_PLANO=False)
+class PresupuestoConsultasTests(TestCase):
+    """
+    Carga cada ruta de operaciones/urls.py con cada rol, primero con 10 filas por tabla y luego
+    con 1.000. La cantidad de consultas no puede superar MAXIMO_CONSULTAS ni crecer con los datos:
+    si crece, el error lista las consultas que se repiten (típicamente un N+1).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Los archivos de prueba (documento y foto a descargar) van a un directorio temporal.
+        medios = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(medios.cleanup)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=medios.name))
+
+    @classmethod
+    def setUpTestData(cls):
+        sitio = Sitio.objects.create(nombre_sitio='Centro')
+        taller = Taller.objects.create(nombre_taller='Taller Central')
+        cls.actores = {'sitio': sitio, 'taller': taller}
+        for rol in Roles:
+            cls.actores[rol] = Usuario.objects.create(
+                username=rol.lower(), rol=rol, first_name=rol.label, last_name='Prueba',
+                especialidad=Usuario.Especialidades.GENERAL if rol == Roles.MECANICO else None,
+            )
+        cls.actores['vehiculo'] = Vehiculo.objects.create(
+            patente='CH0001', marca='Volvo', modelo='FH', año=2021, sitio=sitio, chofer_asignado=cls.actores[Roles.CHOFER],
+        )
+
+    def _parametros(self):
+        """Argumentos para las rutas que los necesitan, tomados del conjunto de prueba."""
+        abierto = lambda estado: Mantenimiento.objects.filter(estado=estado).exclude(vehiculo=self.actores['vehiculo']).first()
+        documento = Documento.objects.first()
+        foto = FotoMantenimiento.objects.filter(mantenimiento__estado=Estado.DIAGNOSTICO).first()
+        for archivo in (documento.archivo, foto.imagen):
+            if not archivo.storage.exists(archivo.name):
+                archivo.storage.save(archivo.name, ContentFile(b'prueba'))
+        en_diagnostico = abierto(Estado.DIAGNOSTICO).id
+        return {
+            'user_edit': {'pk': self.actores[Roles.CHOFER].pk},
+            'user_deactivate': {'pk': self.actores[Roles.CHOFER].pk},
+            'vehicle_edit': {'pk': self.actores['vehiculo'].pk},
+            'vehicle_deactivate': {'pk': self.actores['vehiculo'].pk},
+            'sitio_edit': {'pk': self.actores['sitio'].pk},
+            'sitio_delete': {'pk': self.actores['sitio'].pk},
+            'procesar_insumo': {'insumo_id': Insumo.objects.first().id},
+            'validar_reparacion': {'mantenimiento_id': abierto(Estado.REPARADO).id},
+            'gestion_documentos_por_vehiculo': {'patente': documento.vehiculo_id},
+            'eliminar_documento': {'documento_id': documento.id},
+            'descargar_documento': {'documento_id': documento.id},
+            'descargar_foto_mantenimiento': {'foto_id': foto.id},
+            'asignar_mantenimiento': {'mantenimiento_id': abierto(Estado.EN_TALLER).id},
+            'detalle_mantenimiento': {'mantenimiento_id': en_diagnostico},
+            'iniciar_pausa': {'mantenimiento_id': en_diagnostico},
+            'terminar_pausa': {'mantenimiento_id': en_diagnostico},
+            'cerrar_reparacion': {'mantenimiento_id': en_diagnostico},
+        }
+
+    def _solicitudes(self):
+        """Lista de (nombre, url, parámetros GET) para cada ruta, más variantes con filtros o exportación."""
+        argumentos = self._parametros()
+        hoy = timezone.localdate()
+        consultas = {
+            'busqueda_global': {'q': 'frenos'},
+            'agenda_eventos': {'start': (hoy - timedelta(days=7)).isoformat(), 'end': (hoy + timedelta(days=7)).isoformat()},
+        }
+        solicitudes = []
+        for patron in urls.urlpatterns:
+            if patron.name in RUTAS_EXCLUIDAS:
+                continue
+            url = reverse(patron.name, kwargs=argumentos.get(patron.name))
+            solicitudes.append((patron.name, url, consultas.get(patron.name, {})))
+        solicitudes += [
+            ('supervisor_reportes (csv)', reverse('supervisor_reportes'), {'export': 'csv'}),
+            ('supervisor_reportes (xlsx)', reverse('supervisor_reportes'), {'export': 'xlsx'}),
+            ('seguimiento_mantenimientos (filtro)', reverse('seguimiento_mantenimientos'), {'estado': Estado.DIAGNOSTICO}),
+        ]
+        return solicitudes
+
+    def _medir(self):
+        """Retorna {(rol, ruta): lista de SQL ejecutadas} cargando cada ruta con cada rol."""
+        cliente = Client(raise_request_exception=False)
+        solicitudes = self._solicitudes()
+        medidas = {}
+        for rol in Roles:
+            for nombre, url, consulta in solicitudes:
+                cliente.force_login(self.actores[rol])
+                cache.clear()  # Se mide la vista, no el caché de paneles.
+                with CaptureQueriesContext(connection) as capturadas:
+                    respuesta = cliente.get(url, consulta)
+                    if respuesta.streaming:
+                        b''.join(respuesta.streaming_content)
+                self.assertLess(respuesta.status_code, 500, f"{nombre} como {rol} respondió {respuesta.status_code}.")
+                medidas[rol, nombre] = [c['sql'] for c in capturadas.captured_queries]
+        return medidas
+
+    @staticmethod
+    def _normalizar(sql):
+        # Sin los valores, las consultas de un N+1 quedan iguales entre sí.
+        return re.sub(r"'[^']*'|\b\d+\b", '?', sql)
+
+    def test_consultas_no_crecen_con_los_datos(self):
+        crear_flota(10, self.actores)
+        pocas = self._medir()
+        crear_flota(990, self.actores)
+        muchas = self._medir()
+
+        for clave, sql in muchas.items():
+            rol, nombre = clave
+            with self.subTest(rol=rol, ruta=nombre):
+                antes = Counter(map(self._normalizar, pocas[clave]))
+                despues = Counter(map(self._normalizar, sql))
+                repetidas = '\n'.join(f"  {n}x {consulta}" for consulta, n in despues.most_common() if n > 1)
+                if len(sql) > len(pocas[clave]):
+                    self.fail(
+                        f"{nombre} como {rol}: {len(pocas[clave])} consultas con 10 filas y {len(sql)} con 1.000. "
+                        f"Consultas que crecieron:\n" + '\n'.join(
+                            f"  +{n}: {consulta}" for consulta, n in (despues - antes).most_common()
+                        )
+                    )
+                self.assertLessEqual(
+                    len(sql), MAXIMO_CONSULTAS,
+                    f"{nombre} como {rol} hizo {len(sql)} consultas. Repetidas:\n{repetidas}",
+                )
+
+
+# --- Flota sintética ---
+
+class FlotaSinteticaTests(TestCase):
+    """Los datos de generar_flota deben quedar como si se hubieran creado desde las vistas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hasta = timezone.now()
+        cls.creados = generar_flota(vehiculos=30, backups=3, años=1, proporcion_abiertos=0.5, hasta=cls.hasta, lote=100)
+
+    def test_cantidades(self):
+        self.assertEqual(self.creados['Vehiculo'], 33)
+        self.assertEqual(Usuario.objects.filter(rol=Roles.CHOFER).count(), 30)
+        self.assertEqual(self.creados['Mantenimiento'], Mantenimiento.objects.count())
+
+    def test_mantenimiento_activo_y_estado_del_vehiculo(self):
+        for vehiculo in Vehiculo.objects.select_related('mantenimiento_activo'):
+            abiertos = list(vehiculo.mantenimientos.exclude(estado=Estado.FINALIZADO))
+            self.assertEqual(abiertos, [vehiculo.mantenimiento_activo] if vehiculo.mantenimiento_activo else [])
+            if vehiculo.mantenimiento_activo and vehiculo.mantenimiento_activo.estado not in (Estado.AGENDADO, Estado.VALIDADO):
+                self.assertEqual(vehiculo.estado_actual, Vehiculo.EstadoVehiculo.EN_TALLER)
+
+    def test_fechas_y_contadores(self):
+        self.assertFalse(Historial_Cambios.objects.filter(fecha_cambio__gt=self.hasta).exists())
+        self.assertFalse(Mantenimiento.objects.filter(fecha_salida_real__gt=self.hasta).exists())
+        self.assertFalse(Pausa.objects.filter(inicio_pausa__gt=self.hasta).exists())
+        usuarios = list(Usuario.objects.values_list('pk', flat=True))
+        for clave, (modelo, _, filtro) in contadores.CONTADORES.items():
+            campo = contadores.POR_USUARIO.get(clave)
+            if not campo:
+                self.assertEqual(contadores.leer([clave])[clave], modelo.objects.filter(**filtro).count(), clave)
+                continue
+            for usuario_id in usuarios:
+                self.assertEqual(
+                    contadores.leer([clave], usuario_id)[clave],
+                    modelo.objects.filter(**filtro, **{campo: usuario_id}).count(), (clave, usuario_id),
+                )
+
+
+class FlotaSinteticaDeterministaTests(TestCase):
+    MODELOS = [
+        Sitio, Taller, Usuario, Vehiculo, Mantenimiento, Agenda_Taller, Insumo, Pausa, Observacion,
+        Historial_Cambios, SolicitudBackup,
+    ]
+    # Dependen del momento en que se ejecuta (hash con sal, fechas de alta) y no del generador.
+    # id_registro_afectado repite el id del mantenimiento, que ya se compara por su posición.
+    IGNORADOS = {'password', 'date_joined', 'last_login', 'actualizado_en', 'id_registro_afectado'}
+
+    def _filas(self):
+        """
+        Las filas de cada modelo, con las claves autoincrementales cambiadas por su posición
+        (en PostgreSQL la secuencia no vuelve atrás al revertir) y sin el "#id" de las descripciones.
+        """
+        posiciones = {
+            modelo: {pk: i for i, pk in enumerate(modelo.objects.order_by('pk').values_list('pk', flat=True))}
+            for modelo in self.MODELOS
+        }
+        filas = {}
+        for modelo in self.MODELOS:
+            campos = [c for c in modelo._meta.concrete_fields if c.name not in self.IGNORADOS]
+            convertir = [
+                posiciones[modelo].get if c.primary_key and modelo is not Vehiculo
+                else posiciones[c.related_model].get if c.is_relation and c.related_model is not Vehiculo
+                else (lambda texto: re.sub(r'#\d+', '#', texto)) if c.name == 'descripcion'
+                else None
+                for c in campos
+            ]
+            filas[modelo.__name__] = [
+                tuple(f(v) if f else v for f, v in zip(convertir, fila))
+                for fila in modelo.objects.order_by('pk').values_list(*[c.attname for c in campos])
+            ]
+        return filas
+
+    def test_misma_semilla_mismos_datos(self):
+        hasta = timezone.now()
+        generados = []
+        for _ in range(2):
+            with transaction.atomic():
+                generar_flota(sitios=2, talleres=2, usuarios_por_rol=2, vehiculos=10, backups=2, años=1,
+                              proporcion_abiertos=0.5, semilla=7, hasta=hasta, lote=50)
+                generados.append(self._filas())
+                transaction.set_rollback(True)
+
+        self.assertGreater(len(generados[0]['Pausa']), 0)
+        for modelo in self.MODELOS:
+            self.assertEqual(generados[0][modelo.__name__], generados[1][modelo.__name__], modelo.__name__)
+
+
+# --- Perfilado de vistas ---
+
+class PerfiladoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chofer = Usuario.objects.create(username='chofer', rol=Roles.CHOFER)
+        cls.staff = Usuario.objects.create(username='staff', rol=Roles.COORDINACION, is_staff=True)
+
+    def setUp(self):
+        perfilado.vaciar()
+        # El middleware reemplaza Template.render al cargarse con PERFILADO activo; no debe quedar para las demás pruebas.
+        self.addCleanup(perfilado.desinstalar)
+
+    def test_desactivado_no_mide(self):
+        self.client.force_login(self.chofer)
+        response = self.client.get(reverse('chofer_dashboard'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(perfilado.mediciones(), [])
+
+    @override_settings(PERFILADO=True)
+    def test_mide_cada_peticion(self):
+        # Un cliente nuevo para que el middleware se cargue con PERFILADO activo.
+        cliente = Client()
+        cliente.force_login(self.chofer)
+        response = cliente.get(reverse('chofer_dashboard'))
+
+        medicion, = perfilado.mediciones()
+        self.assertEqual(medicion.vista, 'chofer_dashboard')
+        self.assertGreater(medicion.consultas, 0)
+        self.assertGreater(medicion.plantillas_ms, 0)
+        self.assertIn(f'desc="{medicion.consultas} consultas"', response['Server-Timing'])
+
+        cliente.force_login(self.staff)
+        response = cliente.get(reverse('perfilado_vistas'))
+        self.assertContains(response, 'chofer_dashboard')
+
+    def test_instalar_es_reversible(self):
+        original = Template.render
+        self.assertTrue(perfilado.instalar())
+        self.assertFalse(perfilado.instalar())
+        self.assertIsNot(Template.render, original)
+        perfilado.desinstalar()
+        self.assertIs(Template.render, original)
+
+    def test_agrupa_consultas_repetidas(self):
+        with perfilado.medir() as en_curso:
+            for patente in ('AA11', 'BB22', 'CC33'):
+                Vehiculo.objects.filter(patente=patente).exists()
+        sql, veces = en_curso.sql.most_common(1)[0]
+        self.assertEqual(veces, 3)
+        self.assertIn('operaciones_vehiculo', sql)
+
+    def test_solo_staff(self):
+        self.client.force_login(self.chofer)
+        self.assertEqual(self.client.get(reverse('perfilado_vistas')).status_code, 302)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('perfilado_vistas')).status_code, 200)
+
+
+# --- Métricas para Prometheus ---
+
+class MetricasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chofer = Usuario.objects.create(username='chofer', rol=Roles.CHOFER)
+        cls.staff = Usuario.objects.create(username='staff', rol=Roles.SUPERVISOR, is_staff=True)
+        sitio = Sitio.objects.create(nombre_sitio='Centro')
+        Vehiculo.objects.create(patente='AA11', marca='Volvo', modelo='FH', año=2020, sitio=sitio,
+                                estado_actual=Vehiculo.EstadoVehiculo.EN_TALLER)
+        Vehiculo.objects.create(patente='BB22', marca='Volvo', modelo='FH', año=2020, sitio=sitio)
+        Mantenimiento.objects.create(vehiculo_id='AA11', solicitado_por=cls.chofer, estado=Estado.DIAGNOSTICO, motivo_ingreso='Frenos')
+        SolicitudBackup.objects.create(chofer=cls.chofer)
+
+    def setUp(self):
+        metricas.reiniciar()
+        cache.clear()
+
+    def test_peticiones_latencia_y_consultas_por_vista(self):
+        self.client.force_login(self.chofer)
+        self.client.get(reverse('chofer_dashboard'))
+        self.client.force_login(self.staff)
+        texto = self.client.get(reverse('metricas_prometheus')).content.decode()
+
+        self.assertIn('gestion_peticiones_total{vista="chofer_dashboard",metodo="GET",estado="200"} 1', texto)
+        self.assertIn('gestion_peticion_duracion_segundos_bucket{vista="chofer_dashboard",le="+Inf"} 1', texto)
+        self.assertIn('gestion_peticion_duracion_segundos_count{vista="chofer_dashboard"} 1', texto)
+        consultas = re.search(r'gestion_consultas_sql_total\{vista="chofer_dashboard"\} (\d+)', texto)
+        self.assertGreater(int(consultas.group(1)), 0)
+
+    def test_indicadores_de_negocio_en_una_consulta_cacheada(self):
+        with CaptureQueriesContext(connection) as consultas:
+            texto = metricas.exposicion()
+            metricas.exposicion()
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('gestion_vehiculos{estado="EN_TALLER"} 1', texto)
+        self.assertIn('gestion_vehiculos{estado="DE_BAJA"} 0', texto)
+        self.assertIn('gestion_mantenimientos_abiertos{estado="DIAGNOSTICO"} 1', texto)
+        self.assertIn('gestion_solicitudes_backup_pendientes 1', texto)
+        self.assertIn('gestion_insumos_pendientes 0', texto)
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metricas_prometheus')).status_code, 401)
+        response = self.client.get(reverse('metricas_prometheus'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICAS_TOKEN='')
+    def test_sin_token_solo_staff(self):
+        url = reverse('metricas_prometheus')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.chofer)
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+# --- Contadores de pendientes ---
+
+class ContadoresPendientesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.coordinador = Usuario.objects.create(username='coordinador', rol=Roles.COORDINACION)
+        cls.chofer = Usuario.objects.create(username='chofer', rol=Roles.CHOFER)
+        sitio = Sitio.objects.create(nombre_sitio='Centro')
+        Vehiculo.objects.create(patente='AA11', marca='Volvo', modelo='FH', año=2020, sitio=sitio, chofer_asignado=cls.chofer)
+        mantenimiento = Mantenimiento.objects.create(
+            vehiculo_id='AA11', solicitado_por=cls.chofer, estado=Estado.DIAGNOSTICO, motivo_ingreso='Frenos',
+        )
+        cls.insumo = Insumo.objects.create(mantenimiento=mantenimiento, nombre_insumo='Pastillas de freno')
+        Insumo.objects.create(mantenimiento=mantenimiento, nombre_insumo='Líquido de frenos')
+        contadores.recalcular()
+
+    def _pendientes(self):
+        return contadores.leer(['insumos_pendientes'])['insumos_pendientes']
+
+    def test_dos_aprobaciones_simultaneas_descuentan_una_vez(self):
+        # Dos coordinadores cargaron el insumo cuando todavía estaba pendiente.
+        primera, segunda = Insumo.objects.get(pk=self.insumo.pk), Insumo.objects.get(pk=self.insumo.pk)
+        pendiente = {'estado_aprobacion': Insumo.EstadoAprobacion.PENDIENTE}
+        self.assertTrue(efectos.actualizar_si(primera, pendiente, estado_aprobacion=Insumo.EstadoAprobacion.APROBADO))
+        self.assertFalse(efectos.actualizar_si(segunda, pendiente, estado_aprobacion=Insumo.EstadoAprobacion.RECHAZADO))
+
+        self.assertEqual(self._pendientes(), 1)
+        self.assertEqual(Insumo.objects.get(pk=self.insumo.pk).estado_aprobacion, Insumo.EstadoAprobacion.APROBADO)
+
+    def test_procesar_insumo_mantiene_el_contador_exacto(self):
+        self.client.force_login(self.coordinador)
+        url = reverse('procesar_insumo', args=[self.insumo.pk])
+        self.client.post(url, {'accion': 'aprobar'})
+        self.client.post(url, {'accion': 'rechazar'})
+
+        self.assertEqual(self._pendientes(), 1)
+        self.assertEqual(
+            self._pendientes(),
+            Insumo.objects.filter(estado_aprobacion=Insumo.EstadoAprobacion.PENDIENTE).count(),
+        )
+
+    def test_guardar_sin_campos_de_contadores_no_consulta_valores_anteriores(self):
+        self.insumo.nombre_insumo = 'Pastillas traseras'
+        with self.assertNumQueries(1):
+            self.insumo.save(update_fields=['nombre_insumo'])
+        self.assertEqual(self._pendientes(), 2)
+
+    def test_trabajos_activos_por_mecanico(self):
+        primero = Usuario.objects.create(username='mecanico1', rol=Roles.MECANICO)
+        segundo = Usuario.objects.create(username='mecanico2', rol=Roles.MECANICO)
+        mantenimiento = self.insumo.mantenimiento
+        mantenimiento.mecanico_asignado = primero
+        mantenimiento.save()
+        self.assertEqual(contadores.leer(['trabajos_activos'], primero.pk), {'trabajos_activos': 1})
+
+        mantenimiento.mecanico_asignado = segundo
+        mantenimiento.save(update_fields=['mecanico_asignado'])
+        self.assertEqual(contadores.leer(['trabajos_activos'], primero.pk), {'trabajos_activos': 0})
+        self.assertEqual(contadores.leer(['trabajos_activos'], segundo.pk), {'trabajos_activos': 1})
+
+        self.client.force_login(segundo)
+        self.assertEqual(self.client.get(reverse('mecanico_dashboard')).context['pendientes']['trabajos_activos'], 1)
+
+    def test_llegadas_agendadas_del_guardia(self):
+        guardia = Usuario.objects.create(username='guardia', rol=Roles.GUARDIA)
+        Vehiculo.objects.create(patente='BB22', marca='Volvo', modelo='FH', año=2020, sitio=Sitio.objects.get())
+        Mantenimiento.objects.create(vehiculo_id='BB22', solicitado_por=self.chofer, estado=Estado.AGENDADO, motivo_ingreso='Luces')
+
+        self.client.force_login(guardia)
+        respuesta = self.client.get(reverse('registro_entrada'))
+        self.assertEqual(respuesta.context['pendientes']['llegadas_agendadas'], 1)
+
+
+# --- Auditoría ---
+
+class AuditoriaTests(TestCase):
+    def _registrar(self, descripcion):
+        auditoria.registrar(tipo_cambio=Historial_Cambios.TipoCambio.EDICION, descripcion=descripcion)
+
+    def _descripciones(self):
+        return sorted(Historial_Cambios.objects.values_list('descripcion', flat=True))
+
+    def test_un_insert_por_transaccion_confirmada(self):
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self._registrar('primero')
+                try:
+                    with transaction.atomic():
+                        self._registrar('revertido')
+                        raise ValueError
+                except ValueError:
+                    pass
+                self._registrar('segundo')
+            self.assertEqual(self._descripciones(), [])
+
+        self.assertEqual(self._descripciones(), ['primero', 'segundo'])
+        inserts = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('INSERT INTO "operaciones_historial_cambios"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_lo_confirmado_sobrevive_a_un_error_posterior(self):
+        with self.assertRaises(ValueError), self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self._registrar('confirmado')
+            # La vista falla después de confirmar su cambio: el registro ya quedó escrito.
+            raise ValueError
+
+        self.assertEqual(self._descripciones(), ['confirmado'])
+
+    def test_una_transaccion_revertida_no_deja_registros(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self._registrar('revertido')
+                transaction.set_rollback(True)
+            with transaction.atomic():
+                self._registrar('confirmado')
+
+        self.assertEqual(self._descripciones(), ['confirmado'])
+
+    def test_un_error_al_escribir_se_propaga(self):
+        with mock.patch.object(Historial_Cambios.objects, 'bulk_create', side_effect=Exception('sin conexión')):
+            with self.assertRaisesMessage(Exception, 'sin conexión'), self.captureOnCommitCallbacks(execute=True):
+                self._registrar('cambio')
+
+    def test_el_escritor_en_segundo_plano_reintenta(self):
+        registro = Historial_Cambios(tipo_cambio=Historial_Cambios.TipoCambio.EDICION, descripcion='cambio')
+        guardar = Historial_Cambios.objects.bulk_create
+        fallas = iter([Exception('base de datos ocupada')])
+
+        def falla_una_vez(lote):
+            for error in fallas:
+                raise error
+            return guardar(lote)
+
+        with mock.patch.object(Historial_Cambios.objects, 'bulk_create', side_effect=falla_una_vez), \
+                mock.patch.object(auditoria.time, 'sleep'), mock.patch.object(auditoria.connection, 'close'), \
+                self.assertLogs('operaciones.auditoria', 'WARNING'):
+            auditoria.escritor._guardar([registro])
+
+        self.assertEqual(self._descripciones(), ['cambio'])
+
+
+# --- Resúmenes mensuales de KPIs ---
+
+class ResumenesMensualesTests(TestCase):
+    def test_un_resumen_por_periodo_sin_taller_ni_sitio(self):
+        ResumenMensualKPI.objects.create(año=2026, mes=3)
+        ResumenMensualInsumo.objects.create(año=2026, mes=3, nombre_insumo='Filtro')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ResumenMensualKPI.objects.create(año=2026, mes=3)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ResumenMensualInsumo.objects.create(año=2026, mes=3, nombre_insumo='Filtro')
+
+    def test_cierres_del_mismo_periodo_suman_en_la_misma_fila(self):
+        chofer = Usuario.objects.create(username='chofer', rol=Roles.CHOFER)
+        salida = timezone.now()
+        for patente in ('AA11', 'BB22'):
+            Vehiculo.objects.create(patente=patente, marca='Volvo', modelo='FH', año=2020)
+            mantenimiento = Mantenimiento.objects.create(
+                vehiculo_id=patente, solicitado_por=chofer, estado=Estado.FINALIZADO, motivo_ingreso='Frenos',
+                fecha_hora_llegada=salida - timedelta(hours=2), fecha_salida_real=salida,
+            )
+            Insumo.objects.create(mantenimiento=mantenimiento, nombre_insumo='Filtro')
+            registrar_mantenimiento_finalizado(mantenimiento)
+
+        resumen = ResumenMensualKPI.objects.get()
+        self.assertIsNone(resumen.taller_id)
+        self.assertIsNone(resumen.sitio_id)
+        self.assertEqual(resumen.total_mantenimientos, 2)
+        self.assertEqual(resumen.segundos_en_taller, 4 * 3600)
+        self.assertEqual(ResumenMensualInsumo.objects.get().total, 2)
+
+
+# --- Transiciones de estado de los mantenimientos ---
+
+class TransicionesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.supervisor = Usuario.objects.create(username='supervisor', rol=Roles.SUPERVISOR)
+        chofer = Usuario.objects.create(username='chofer', rol=Roles.CHOFER)
+        sitio = Sitio.objects.create(nombre_sitio='Centro')
+        cls.ids = {}
+        for patente, estado in (('AA11', Estado.REPARADO), ('BB22', Estado.REPARADO), ('CC33', Estado.DIAGNOSTICO)):
+            Vehiculo.objects.create(patente=patente, marca='Volvo', modelo='FH', año=2020, sitio=sitio,
+                                    estado_actual=Vehiculo.EstadoVehiculo.EN_TALLER)
+            cls.ids[patente] = Mantenimiento.objects.create(
+                vehiculo_id=patente, solicitado_por=chofer, estado=estado, motivo_ingreso='Frenos',
+                fecha_hora_llegada=timezone.now() - timedelta(hours=3),
+            ).id
+        contadores.recalcular()
+
+    def _mantenimientos(self, *patentes):
+        return list(Mantenimiento.objects.select_related('vehiculo').filter(id__in=[self.ids[p] for p in patentes]))
+
+    def _contadores_exactos(self):
+        incrementales = dict(ContadorPendientes.objects.values_list('clave', 'valor'))
+        contadores.recalcular()
+        self.assertEqual(incrementales, dict(ContadorPendientes.objects.values_list('clave', 'valor')))
+
+    def test_validar_en_bloque_omite_los_que_no_estan_en_origen(self):
+        aplicados = transiciones.aplicar(transiciones.VALIDAR, self._mantenimientos('AA11', 'BB22', 'CC33'), usuario=self.supervisor)
+
+        self.assertEqual(sorted(m.vehiculo_id for m in aplicados), ['AA11', 'BB22'])
+        estados = dict(Mantenimiento.objects.values_list('vehiculo_id', 'estado'))
+        self.assertEqual(estados, {'AA11': Estado.VALIDADO, 'BB22': Estado.VALIDADO, 'CC33': Estado.DIAGNOSTICO})
+        self.assertEqual(
+            dict(Vehiculo.objects.values_list('patente', 'estado_actual')),
+            {'AA11': 'DISPONIBLE', 'BB22': 'DISPONIBLE', 'CC33': 'EN_TALLER'},
+        )
+        self.assertEqual(contadores.leer(['reparaciones_por_validar'])['reparaciones_por_validar'], 0)
+        self._contadores_exactos()
+
+    def test_mantenimiento_que_otro_usuario_ya_movio(self):
+        cargado = self._mantenimientos('AA11')
+        # Otro supervisor lo rechazó después de que esta petición lo leyera.
+        Mantenimiento.objects.filter(id=self.ids['AA11']).update(estado=Estado.DIAGNOSTICO)
+
+        with self.assertRaises(transiciones.TransicionInvalida):
+            transiciones.aplicar(transiciones.VALIDAR, cargado, usuario=self.supervisor)
+        self.assertEqual(Mantenimiento.objects.get(id=self.ids['AA11']).estado, Estado.DIAGNOSTICO)
+        self.assertEqual(Vehiculo.objects.get(patente='AA11').estado_actual, Vehiculo.EstadoVehiculo.EN_TALLER)
+
+    def test_finalizar_libera_el_vehiculo_y_suma_los_kpis(self):
+        self.assertEqual(Vehiculo.objects.get(patente='AA11').mantenimiento_activo_id, self.ids['AA11'])
+        transiciones.aplicar(transiciones.VALIDAR, self._mantenimientos('AA11'), usuario=self.supervisor)
+        transiciones.aplicar(transiciones.FINALIZAR, self._mantenimientos('AA11'), usuario=self.supervisor)
+
+        mantenimiento = Mantenimiento.objects.get(id=self.ids['AA11'])
+        self.assertEqual(mantenimiento.estado, Estado.FINALIZADO)
+        self.assertIsNotNone(mantenimiento.fecha_salida_real)
+        self.assertIsNone(Vehiculo.objects.get(patente='AA11').mantenimiento_activo_id)
+        self.assertEqual(Vehiculo.objects.get(patente='BB22').mantenimiento_activo_id, self.ids['BB22'])
+        self.assertEqual(ResumenMensualKPI.objects.get().total_mantenimientos, 1)
+        self._contadores_exactos()
+
+    def test_un_registro_de_auditoria_por_mantenimiento(self):
+        # Se insertan dentro de la transacción, sin esperar a confirmarla.
+        transiciones.aplicar(transiciones.VALIDAR, self._mantenimientos('AA11', 'BB22', 'CC33'), usuario=self.supervisor)
+
+        registros = Historial_Cambios.objects.filter(tipo_evento=Historial_Cambios.TipoEvento.VALIDACION_REPARACION)
+        self.assertEqual(
+            sorted(registros.values_list('mantenimiento_id', flat=True)), sorted([self.ids['AA11'], self.ids['BB22']]),
+        )
+        self.assertTrue(all(r.usuario_id == self.supervisor.id for r in registros))
+
+    def test_la_auditoria_se_revierte_con_la_transicion(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            transiciones.aplicar(transiciones.VALIDAR, self._mantenimientos('AA11'), usuario=self.supervisor)
+            raise IntegrityError
+
+        self.assertFalse(Historial_Cambios.objects.filter(mantenimiento_id=self.ids['AA11']).exists())
+        self.assertEqual(Mantenimiento.objects.get(id=self.ids['AA11']).estado, Estado.REPARADO)
+
+
+# --- Actualización en vivo de los paneles ---
+
+class PanelesEnVivoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.supervisor = Usuario.objects.create(username='supervisor', rol=Roles.SUPERVISOR)
+
+    def test_la_recarga_en_vivo_no_consume_los_mensajes(self):
+        self.client.force_login(self.supervisor)
+        # Deja un mensaje pendiente para la próxima página.
+        self.client.post(reverse('validar_reparaciones'))
+
+        seccion = self.client.get(reverse('supervisor_dashboard'), headers={'X-En-Vivo': '1'})
+        self.assertContains(seccion, 'id="reparaciones_por_validar"')
+        self.assertNotContains(seccion, 'navbar')
+        self.assertIn('X-En-Vivo', seccion['Vary'])
+
+        pagina = self.client.get(reverse('supervisor_dashboard'))
+        self.assertContains(pagina, 'Debe seleccionar al menos una reparación.')
+
+
+# --- Archivo del historial de auditoría ---
+
+class ArchivoHistorialTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.enterContext(override_settings(HISTORIAL_ARCHIVO_DIR=directorio.name))
+        self.fecha = timezone.now() - timedelta(days=400)
+
+    def _registro(self, descripcion):
+        return Historial_Cambios.objects.create(
+            tipo_cambio=Historial_Cambios.TipoCambio.EDICION, descripcion=descripcion, fecha_cambio=self.fecha,
+        )
+
+    def test_no_borra_registros_que_llegan_despues_de_escribir_el_archivo(self):
+        for n in range(3):
+            self._registro(f'viejo {n}')
+        reemplazar = archivo_historial.os.replace
+
+        def llega_uno_tarde(origen, destino):
+            # Un registro con fecha pasada se inserta entre la escritura del archivo y el borrado.
+            self._registro('tardío')
+            reemplazar(origen, destino)
+
+        with mock.patch.object(archivo_historial.os, 'replace', llega_uno_tarde):
+            archivo_historial.archivar_historial(antes_de=timezone.now() - timedelta(days=30))
+
+        archivo = ArchivoHistorial.objects.get()
+        archivadas = [fila['descripcion'] for fila in archivo_historial.leer_archivo(archivo)]
+        self.assertEqual(archivadas, ['viejo 0', 'viejo 1', 'viejo 2'])
+        self.assertEqual(archivo.registros, 3)
+        self.assertEqual(list(Historial_Cambios.objects.values_list('descripcion', flat=True)), ['tardío'])
+
+
+# --- Búsqueda global (índice FTS5) ---
+
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chofer = Usuario.objects.create(username='chofer', rol=Roles.CHOFER)
+        sitio = Sitio.objects.create(nombre_sitio='Centro')
+        Vehiculo.objects.create(patente='AA11', marca='Volvo', modelo='FH', año=2020, sitio=sitio)
+        cls.mantenimiento = Mantenimiento.objects.create(vehiculo_id='AA11', solicitado_por=cls.chofer, motivo_ingreso='Luces')
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("El índice FTS5 solo existe con SQLite.")
+
+    def _indexado(self, fuente, registro_id):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT texto FROM operaciones_busqueda WHERE rowid = %s", [registro_id * 4 + fuente])
+            fila = cursor.fetchone()
+        return fila[0] if fila else None
+
+    def _encontrados(self, texto):
+        return [resultado.objeto for resultado in busqueda.buscar(texto)]
+
+    def test_historial_sincronizado(self):
+        registro = Historial_Cambios.objects.create(tipo_cambio=Historial_Cambios.TipoCambio.EDICION, descripcion='Cambio de embrague')
+        self.assertEqual(self._indexado(busqueda.FUENTE_HISTORIAL, registro.pk), 'Cambio de embrague')
+
+        Historial_Cambios.objects.filter(pk=registro.pk).update(descripcion='Cambio de radiador')
+        self.assertEqual(self._indexado(busqueda.FUENTE_HISTORIAL, registro.pk), 'Cambio de radiador')
+        self.assertEqual(self._encontrados('embrague'), [])
+        self.assertEqual(self._encontrados('radiador'), [registro])
+
+        registro_id = registro.pk
+        registro.delete()
+        self.assertIsNone(self._indexado(busqueda.FUENTE_HISTORIAL, registro_id))
+
+    def test_mantenimiento_sincronizado(self):
+        mantenimiento_id = self.mantenimiento.pk
+        self.assertEqual(self._indexado(busqueda.FUENTE_MANTENIMIENTO, mantenimiento_id), 'Luces  ')
+
+        Mantenimiento.objects.filter(pk=mantenimiento_id).update(diagnostico='Ampolleta quemada', trabajo_realizado='Reemplazo')
+        self.assertEqual(self._indexado(busqueda.FUENTE_MANTENIMIENTO, mantenimiento_id), 'Luces Ampolleta quemada Reemplazo')
+        self.assertEqual(self._encontrados('ampolleta'), [self.mantenimiento])
+
+        Mantenimiento.objects.filter(pk=mantenimiento_id).update(motivo_ingreso='Luces traseras')
+        self.assertEqual(self._indexado(busqueda.FUENTE_MANTENIMIENTO, mantenimiento_id), 'Luces traseras Ampolleta quemada Reemplazo')
+
+        Mantenimiento.objects.filter(pk=mantenimiento_id).delete()
+        self.assertIsNone(self._indexado(busqueda.FUENTE_MANTENIMIENTO, mantenimiento_id))
+
+    def test_observacion_sincronizada(self):
+        observacion = Observacion.objects.create(mantenimiento=self.mantenimiento, usuario=self.chofer, texto='Rayón en la puerta')
+        self.assertEqual(self._encontrados('rayon'), [observacion])
+
+        Observacion.objects.filter(pk=observacion.pk).update(texto='Abolladura en la puerta')
+        self.assertEqual(self._encontrados('rayon'), [])
+        self.assertEqual(self._encontrados('abolladura'), [observacion])
+
+        observacion_id = observacion.pk
+        observacion.delete()
+        self.assertIsNone(self._indexado(busqueda.FUENTE_OBSERVACION, observacion_id))
+
+    def test_resultados_por_relevancia(self):
+        def observar(texto):
+            return Observacion.objects.create(mantenimiento=self.mantenimiento, usuario=self.chofer, texto=texto)
+
+        una_vez = observar('Revisar frenos, luces, espejos, neumáticos, batería, aceite y refrigerante del motor')
+        tres_veces = observar('frenos frenos frenos')
+        dos_veces = observar('frenos delanteros y frenos traseros')
+
+        self.assertEqual(self._encontrados('frenos'), [tres_veces, dos_veces, una_vez])
+
+    def test_consulta_sin_operadores(self):
+        self.assertEqual(busqueda._consulta_fts('frenos OR "luces" NEAR(a b) -aceite*'), '"frenos" "OR" "luces" "NEAR" "a" "b" "aceite"*')
+        self.assertIsNone(busqueda._consulta_fts('"* - ()'))
+        # Escrito así, un MATCH directo fallaría por sintaxis; con la consulta segura solo no encuentra nada.
+        self.assertEqual(self._encontrados('frenos AND "luces'), [])
+        self.assertEqual(self._encontrados('luces OR'), [])
+
+    def test_fragmento_escapado(self):
+        fragmento = busqueda._resaltar('<script>\x02frenos\x03</script> & "x"')
+        self.assertEqual(fragmento, '&lt;script&gt;<mark>frenos</mark>&lt;/script&gt; &amp; &quot;x&quot;')
+
+        Observacion.objects.create(mantenimiento=self.mantenimiento, usuario=self.chofer, texto='<b>frenos</b> gastados')
+        self.assertEqual(busqueda.buscar('frenos')[0].fragmento, '&lt;b&gt;<mark>frenos</mark>&lt;/b&gt; gastados')
+
+
+# --- Medición de índices ---
+
+class MedirIndicesTests(TestCase):
+    def test_base_de_datos_vacia_omite_las_vistas_sin_datos_de_ejemplo(self):
+        consultas, omitidas = consultas_por_vista()
+
+        self.assertIn('jefe_taller_dashboard', [vista for vista, _ in consultas])
+        self.assertIn(('registro_salida', ['vehiculo']), omitidas)
+        self.assertIn(('mecanico_dashboard (activos)', ['mecanico']), omitidas)
+        for _, consulta in consultas:
+            consulta.explain()
@@ -0,0 +1,134 @@
+# operaciones/transiciones.py
+from collections import namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import contadores, efectos
+from .kpis import registrar_mantenimiento_finalizado
+from .models import Historial_Cambios, Mantenimiento, Vehiculo
+
+Estado = Mantenimiento.Estado
+TipoEvento = Historial_Cambios.TipoEvento
+
+
+class TransicionInvalida(Exception):
+    """Ningún mantenimiento estaba en un estado desde el que se permita la transición."""
+
+
+# origenes: estados desde los que se permite; destino: estado final.
+# tipo_evento/descripcion: registro de auditoría (None si la vista registra el suyo).
+# estado_vehiculo: nuevo estado del vehículo, o None si no cambia.
+# campos: valores por defecto según (usuario, ahora); quien llama puede sobrescribirlos.
+Transicion = namedtuple('Transicion', ['origenes', 'destino', 'tipo_evento', 'descripcion', 'estado_vehiculo', 'campos'])
+
+INGRESAR = Transicion(
+    [Estado.AGENDADO], Estado.EN_TALLER, TipoEvento.ENTRADA_TALLER,
+    lambda m: f"Vehículo {m.vehiculo.patente} ingresó al taller para mantenimiento #{m.id} a las {timezone.localtime(m.fecha_hora_llegada):%H:%M}.",
+    Vehiculo.EstadoVehiculo.EN_TALLER,
+    lambda usuario, ahora: {'fecha_hora_llegada': ahora},
+)
+ASIGNAR = Transicion(
+    [Estado.EN_TALLER], Estado.DIAGNOSTICO, TipoEvento.ASIGNACION_MECANICO,
+    lambda m: f"Jefe de Taller asignó mant. de {m.vehiculo.patente} a {m.mecanico_asignado.display_name}.",
+    None, None,
+)
+INICIAR_REPARACION = Transicion([Estado.DIAGNOSTICO], Estado.EN_REPARACION, None, None, None, None)
+CERRAR = Transicion(
+    [Estado.DIAGNOSTICO, Estado.EN_REPARACION], Estado.REPARADO, TipoEvento.CIERRE_REPARACION,
+    lambda m: "Mecánico marcó la reparación como finalizada.",
+    None, None,
+)
+VALIDAR = Transicion(
+    [Estado.REPARADO], Estado.VALIDADO, TipoEvento.VALIDACION_REPARACION,
+    lambda m: f"Reparación validada por supervisor. Patente: {m.vehiculo.patente}",
+    # El vehículo queda listo para ser retirado por el chofer.
+    Vehiculo.EstadoVehiculo.DISPONIBLE,
+    lambda usuario, ahora: {'validado_por': usuario, 'fecha_validacion': ahora},
+)
+RECHAZAR = Transicion(
+    [Estado.REPARADO], Estado.DIAGNOSTICO, TipoEvento.RECHAZO_REPARACION,
+    lambda m: f"Reparación de {m.vehiculo.patente} rechazada. Vuelve a diagnóstico.",
+    None, None,
+)
+# La salida del vehículo (registro de salida o intercambio) la registra cada vista.
+FINALIZAR = Transicion(
+    [Estado.VALIDADO], Estado.FINALIZADO, None, None, None,
+    lambda usuario, ahora: {'fecha_salida_real': ahora},
+)
+
+
+def aplicar(transicion, mantenimientos, usuario=None, descripcion=None, **campos):
+    """
+    Aplica `transicion` a uno o varios mantenimientos en una sola transacción: un UPDATE
+    condicionado al estado de origen, el estado del vehículo, la auditoría y los KPIs.
+    Los que otro usuario ya cambió de estado se omiten; si no queda ninguno se lanza
+    TransicionInvalida. Retorna la lista de mantenimientos actualizados.
+
+    Los UPDATE en bloque no emiten señales: los efectos de cada fila (contadores, caché de
+    paneles, eventos en vivo y mantenimiento activo) se aplican con efectos.al_guardar.
+    Los registros de auditoría se insertan dentro de la misma transacción.
+    Conviene pasar los mantenimientos con select_related('vehiculo').
+    """
+    mantenimientos = list(mantenimientos)
+    ahora = timezone.now()
+    valores = {'estado': transicion.destino}
+    if transicion.campos:
+        valores.update(transicion.campos(usuario, ahora))
+    valores.update(campos)
+
+    with transaction.atomic():
+        anteriores = {
+            fila.pop('id'): fila
+            for fila in Mantenimiento.objects.select_for_update().filter(
+                id__in=[m.id for m in mantenimientos], estado__in=transicion.origenes,
+            ).values('id', 'estado', 'mecanico_asignado_id')
+        }
+        aplicados = [m for m in mantenimientos if m.id in anteriores]
+        if not aplicados:
+            raise TransicionInvalida(f"El mantenimiento no está en un estado que permita pasar a {Estado(transicion.destino).label}.")
+
+        actualizados = Mantenimiento.objects.filter(
+            id__in=anteriores, estado__in=transicion.origenes,
+        ).update(**valores)
+        if actualizados != len(anteriores):
+            # Otro proceso los cambió entre la lectura y el UPDATE: no aplicamos nada.
+            raise TransicionInvalida("Los mantenimientos cambiaron de estado mientras se procesaban. Intente nuevamente.")
+
+        for mantenimiento in aplicados:
+            for campo, valor in valores.items():
+                setattr(mantenimiento, campo, valor)
+
+        if transicion.estado_vehiculo:
+            _cambiar_estado_vehiculos([m.vehiculo for m in aplicados], transicion.estado_vehiculo)
+
+        with contadores.en_bloque():
+            for mantenimiento in aplicados:
+                efectos.al_guardar(mantenimiento, anteriores[mantenimiento.id])
+        if transicion.destino == Estado.FINALIZADO:
+            for mantenimiento in aplicados:
+                registrar_mantenimiento_finalizado(mantenimiento)
+
+        if transicion.tipo_evento:
+            describir = descripcion or transicion.descripcion
+            Historial_Cambios.objects.bulk_create([
+                Historial_Cambios(
+                    usuario=usuario,
+                    tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
+                    tipo_evento=transicion.tipo_evento,
+                    tabla_afectada="Mantenimiento",
+                    id_registro_afectado=mantenimiento.id,
+                    vehiculo_id=mantenimiento.vehiculo_id,
+                    mantenimiento=mantenimiento,
+                    descripcion=describir(mantenimiento),
+                )
+                for mantenimiento in aplicados
+            ])
+    return aplicados
+
+
+def _cambiar_estado_vehiculos(vehiculos, estado):
+    Vehiculo.objects.filter(patente__in=[v.patente for v in vehiculos]).update(estado_actual=estado)
+    for vehiculo in vehiculos:
+        vehiculo.estado_actual = estado
+        efectos.al_guardar(vehiculo, {'chofer_asignado_id': vehiculo.chofer_asignado_id})
@@ -40,9 +40,14 @@ urlpatterns = [
     path('gestion/backups/', views.gestion_backups, name='gestion_backups'),
     path('reportes/intercambios/', views.reporte_intercambios, name='reporte_intercambios'),
     path('reportes/entradas_salidas/', views.reporte_entradas_salidas, name='reporte_entradas_salidas'),
+    path('reportes/historial_archivado/', views.historial_archivado, name='historial_archivado'),
+    path('busqueda/', views.busqueda_global, name='busqueda_global'),
+    path('perfilado/', views.perfilado_vistas, name='perfilado_vistas'),
+    path('metrics', views.metricas_prometheus, name='metricas_prometheus'),
     path('gestion/insumos/', views.gestion_insumos, name='gestion_insumos'),
     path('gestion/insumos/procesar/<int:insumo_id>/', views.procesar_insumo, name='procesar_insumo'),
     path('gestion/agenda/', views.gestion_agenda, name='gestion_agenda'),
+    path('gestion/agenda/eventos/', views.agenda_eventos, name='agenda_eventos'),
 
     # URLs de Guardia
     path('guardia/registro_entrada/', views.registro_entrada, name='registro_entrada'),
@@ -55,6 +60,7 @@ urlpatterns = [
     path('dashboard/supervisor/', views.supervisor_dashboard, name='supervisor_dashboard'),
     path('supervisor/reportes/', views.supervisor_reportes, name='supervisor_reportes'),
     path('mantenimiento/<int:mantenimiento_id>/validar/', views.validar_reparacion, name='validar_reparacion'),
+    path('mantenimiento/validar_seleccionados/', views.validar_reparaciones, name='validar_reparaciones'),
     path('seguimiento/mantenimientos/', views.seguimiento_mantenimientos, name='seguimiento_mantenimientos'),
     path('supervisor/documentos/', views.seleccionar_vehiculo_documentos, name='seleccionar_vehiculo_documentos'),
     path('supervisor/documentos/<str:patente>/', views.gestion_documentos_por_vehiculo, name='gestion_documentos_por_vehiculo'),
@@ -65,6 +71,8 @@ urlpatterns = [
     path('documentos/descargar/<int:documento_id>/', views.descargar_documento, name='descargar_documento'),
     path('fotos/descargar/<int:foto_id>/', views.descargar_foto_mantenimiento, name='descargar_foto_mantenimiento'),
     path('asignar/<int:mantenimiento_id>/', views.asignar_mantenimiento, name='asignar_mantenimiento'),
+    path('asignar/despachar/', views.despachar_trabajos, name='despachar_trabajos'),
+    path('eventos/', views.eventos_en_vivo, name='eventos_en_vivo'),
     path('mantenimiento/<int:mantenimiento_id>/', views.detalle_mantenimiento, name='detalle_mantenimiento'),
     path('mantenimiento/<int:mantenimiento_id>/iniciar_pausa/', views.iniciar_pausa, name='iniciar_pausa'),
     path('mantenimiento/<int:mantenimiento_id>/terminar_pausa/', views.terminar_pausa, name='terminar_pausa'),
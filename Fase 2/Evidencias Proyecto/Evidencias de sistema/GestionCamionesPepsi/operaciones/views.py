@@ -5,16 +5,32 @@ from django.utils import timezone
 from django.urls import reverse_lazy
 from datetime import timedelta, datetime
 from django.contrib.auth.decorators import login_required
-from .models import Vehiculo, Mantenimiento, Usuario, Agenda_Taller, Documento, Historial_Cambios, Insumo, FotoMantenimiento, Pausa, Sitio, SolicitudBackup, Taller, Observacion
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from .models import Vehiculo, Mantenimiento, Usuario, Agenda_Taller, Documento, Historial_Cambios, Insumo, FotoMantenimiento, Pausa, Sitio, SolicitudBackup, Taller, Observacion, ResumenMensualKPI, ResumenMensualInsumo, ArchivoHistorial
 from .forms import MantenimientoSolicitudForm, DiagnosticoForm, InsumoForm, FotoMantenimientoForm, PausaForm, DocumentoForm, CustomUserCreationForm, CustomUserChangeForm, VehiculoForm, SitioForm, GeneradorAgendaForm, EliminadorAgendaForm, AsignarBackupForm
 from django.contrib import messages
 from .decorators import role_required
-from django.db.models import Case, When, Value
+from . import auditoria, efectos, metricas, perfilado, transiciones
+from .asignacion import despachar_trabajos_pendientes
+from .cache_paneles import obtener_panel
+from .eventos import ROLES_CON_EVENTOS, broker
+from .panel_chofer import ResumenChofer
+from .paginacion import KeysetPaginationMixin, PaginaKeyset, TAMAÑO_PAGINA, paginar_keyset
+from .archivo_historial import leer_archivo
+from .busqueda import buscar
+from .exports import COLUMNAS_REPORTE_MANTENIMIENTOS, IndiceBackups, filas_reporte_mantenimientos, respuesta_csv, respuesta_xlsx
 from django.db.models import Q
-from django.http import FileResponse, Http404, HttpResponse
-import json, io
-import pandas as pd
-from django.db.models import Count, Avg, F
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date, quote_etag
+import hashlib
+import hmac
+from itertools import islice
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Prefetch, Sum
 import csv
 
 @login_required
@@ -48,84 +64,40 @@ def chofer_dashboard(request):
     Muestra sus vehículos, notificaciones importantes sobre backups y el estado
     de sus mantenimientos activos.
     """
-    # Obtenemos todos los vehículos, tanto principales como de respaldo, que el chofer tiene asignados.
-    vehiculos_asignados = Vehiculo.objects.filter(
-        chofer_asignado=request.user
-    ).order_by('patente')
+    # Vehículos y mantenimientos abiertos del chofer, cargados una sola vez.
+    resumen = obtener_panel(Usuario.Roles.CHOFER, lambda: ResumenChofer(request.user), usuario_id=request.user.id)
 
-    # Vehículos principales y backup
-    vehiculos_principales = vehiculos_asignados.filter(es_backup=False)
-    vehiculos_backup = vehiculos_asignados.filter(es_backup=True)
-    
-    # El vehículo principal del chofer, incluso si está en taller
-    vehiculo_principal = vehiculos_asignados.filter(es_backup=False).first()
-    
     # Notificación 1: Backup asignado pendiente de retiro
-    backup_por_retirar = vehiculos_asignados.filter(
-        es_backup=True,
-        estado_actual=Vehiculo.EstadoVehiculo.ASIGNADO
-    ).first()
+    backup_por_retirar = resumen.backup_por_retirar
     if backup_por_retirar:
         mensaje = (f"**Vehículo de Respaldo Asignado:** Se te ha asignado el vehículo de respaldo con patente "
                    f"**{backup_por_retirar.patente}**. Por favor, dirígete al recinto para retirarlo.")
         messages.info(request, mensaje)
 
     # Si el chofer está usando un backup, verificamos si su vehículo principal ya está listo.
-    backup_en_uso = vehiculos_asignados.filter(
-        es_backup=True,
-        estado_actual=Vehiculo.EstadoVehiculo.EN_RUTA
-    ).first()
-
-    mantenimiento_listo = None
+    backup_en_uso = resumen.backup_en_uso
     if backup_en_uso:
         # Si el vehículo principal está listo (VALIDADO), notificamos para devolver el backup.
-        mantenimiento_listo = Mantenimiento.objects.filter( 
-            vehiculo=vehiculo_principal, estado=Mantenimiento.Estado.VALIDADO
-        ).first()
-
+        mantenimiento_listo = resumen.mantenimiento_listo
         if mantenimiento_listo:
             mensaje = (f"**¡Atención!** Tu vehículo principal ({mantenimiento_listo.vehiculo.patente}) está listo. "
                        f"Por favor, coordina la devolución del vehículo de respaldo ({backup_en_uso.patente}).")
             messages.warning(request, mensaje)
 
-    # Mantenimientos activos para el chofer
-    mantenimientos_activos = Mantenimiento.objects.filter(
-        vehiculo=vehiculo_principal,
-        estado__in=[
-            Mantenimiento.Estado.AGENDADO,
-            Mantenimiento.Estado.EN_TALLER,
-            Mantenimiento.Estado.DIAGNOSTICO,
-            Mantenimiento.Estado.EN_REPARACION,
-            Mantenimiento.Estado.REPARADO,
-            Mantenimiento.Estado.VALIDADO,
-        ]
-    ).order_by('-fecha_solicitud').first()
-
-    # El mantenimiento a mostrar en el dashboard es el activo.
-    # Si hay uno validado, ese tiene prioridad para mostrar el botón de confirmación.
-    mantenimiento_actual = Mantenimiento.objects.filter(
-        vehiculo=vehiculo_principal
-    ).exclude(
-        estado=Mantenimiento.Estado.FINALIZADO
-    ).select_related(
-        'taller', 'vehiculo__sitio'
-    ).order_by('-fecha_solicitud').first()
-    
+    # El mantenimiento a mostrar en el dashboard es el activo más reciente.
+    mantenimiento_actual = resumen.mantenimiento_actual
+
     # Si el mantenimiento está validado, mostramos un mensaje de éxito.
     if mantenimiento_actual and mantenimiento_actual.estado == Mantenimiento.Estado.VALIDADO:
-        info_taller = f" en el taller '{mantenimiento_actual.taller.nombre_taller}'" if mantenimiento_actual.taller else ""
         mensaje = (f"**¡Vehículo Listo!** Tu vehículo principal ({mantenimiento_actual.vehiculo.patente}) está listo para ser retirado. "
                    f"El guardia registrará la salida.")
         messages.success(request, mensaje)
 
     # Contexto final unificado
     context = {
-        'vehiculos_principales': vehiculos_principales,
-        'vehiculos_backup': vehiculos_backup,
+        'vehiculos_principales': resumen.vehiculos_principales,
+        'vehiculos_backup': resumen.vehiculos_backup,
         'mantenimiento_actual': mantenimiento_actual,
-        'ultimo_mantenimiento': Mantenimiento.objects.filter(
-            solicitado_por=request.user
-        ).order_by('-fecha_solicitud').first(),
     }
 
     return render(request, 'chofer/dashboard.html', context)
@@ -143,35 +115,52 @@ def solicitar_atencion(request):
         form = MantenimientoSolicitudForm(request.POST, user=request.user)
         if form.is_valid():
             slot_id = form.cleaned_data['agenda_slot']
-            try:
-                agenda_slot = Agenda_Taller.objects.get(id=slot_id)
-            except Agenda_Taller.DoesNotExist:
+            agenda_slot = Agenda_Taller.objects.filter(id=slot_id).only('taller_id', 'mantenimiento_id', 'hora_inicio').first()
+            if agenda_slot is None:
                 messages.error(request, "El horario seleccionado no es válido.")
                 return redirect('solicitar_atencion')
 
-            # Verificamos que el horario no haya sido tomado por otro usuario mientras el chofer decidía.
-            if agenda_slot.mantenimiento is not None:
+            # Descarte rápido si el horario ya aparece tomado; la reserva real se decide más abajo.
+            if agenda_slot.mantenimiento_id is not None:
                 messages.warning(request, "Ese horario ya fue tomado. Elija otro.")
                 return redirect('solicitar_atencion')
 
-            # Creamos el mantenimiento con estado 'AGENDADO'.
-            mantenimiento = form.save(commit=False)
-            mantenimiento.solicitado_por = request.user
-            mantenimiento.estado = Mantenimiento.Estado.AGENDADO
-            mantenimiento.taller = agenda_slot.taller
-            mantenimiento.save()
-
-            # "Reservamos" el slot de la agenda, vinculándolo al mantenimiento recién creado.
-            agenda_slot.mantenimiento = mantenimiento
-            agenda_slot.save()
+            try:
+                with transaction.atomic():
+                    # Creamos el mantenimiento con estado 'AGENDADO'. La restricción única
+                    # impide un segundo mantenimiento abierto para el mismo vehículo.
+                    mantenimiento = form.save(commit=False)
+                    mantenimiento.solicitado_por = request.user
+                    mantenimiento.estado = Mantenimiento.Estado.AGENDADO
+                    mantenimiento.taller_id = agenda_slot.taller_id
+                    mantenimiento.save()
+
+                    # "Reservamos" el slot con un UPDATE condicional: solo lo toma si sigue libre.
+                    # Si otro chofer lo reservó mientras tanto no se actualiza ninguna fila y deshacemos todo.
+                    reservado = Agenda_Taller.objects.filter(
+                        id=slot_id, mantenimiento__isnull=True
+                    ).update(mantenimiento=mantenimiento, actualizado_en=timezone.now())
+
+                    if reservado:
+                        auditoria.registrar(
+                            usuario=request.user,
+                            tipo_cambio=Historial_Cambios.TipoCambio.CREACION,
+                            tipo_evento=Historial_Cambios.TipoEvento.SOLICITUD_MANTENIMIENTO,
+                            tabla_afectada="Mantenimiento",
+                            id_registro_afectado=mantenimiento.id,
+                            vehiculo=mantenimiento.vehiculo,
+                            mantenimiento=mantenimiento,
+                            descripcion=f"Chofer solicitó mantenimiento para el {agenda_slot.hora_inicio.strftime('%d/%m')}"
+                        )
+                    else:
+                        transaction.set_rollback(True)
+            except IntegrityError:
+                messages.error(request, "Este vehículo ya tiene un mantenimiento en curso.")
+                return redirect('chofer_dashboard')
 
-            Historial_Cambios.objects.create(
-                usuario=request.user,
-                tipo_cambio=Historial_Cambios.TipoCambio.CREACION,
-                tabla_afectada="Mantenimiento",
-                id_registro_afectado=mantenimiento.id,
-                descripcion=f"Chofer solicitó mantenimiento para el {agenda_slot.hora_inicio.strftime('%d/%m')}"
-            )
+            if not reservado:
+                messages.warning(request, "Ese horario ya fue tomado. Elija otro.")
+                return redirect('solicitar_atencion')
 
             messages.success(request, f"Cita agendada para la patente {mantenimiento.vehiculo.patente}.")
             return redirect('chofer_dashboard')
@@ -182,7 +171,7 @@ def solicitar_atencion(request):
     slots_disponibles = Agenda_Taller.objects.filter(
         mantenimiento__isnull=True,
         hora_inicio__gte=timezone.now()
-    ).order_by('hora_inicio')
+    ).select_related('taller').order_by('hora_inicio')
 
     context = {'form': form, 'slots_disponibles': slots_disponibles}
     return render(request, 'chofer/solicitar_atencion.html', context)
@@ -267,15 +256,9 @@ def coordinacion_dashboard(request):
     """
     Panel principal para el rol de Coordinación.
     """
-    # Contamos las solicitudes pendientes para mostrar notificaciones en el panel.
-    pending_backups_count = SolicitudBackup.objects.filter(estado=SolicitudBackup.EstadoSolicitud.PENDIENTE).count()
-    pending_insumos_count = Insumo.objects.filter(estado_aprobacion=Insumo.EstadoAprobacion.PENDIENTE).count()
-
-    context = {
-        'pending_backups_count': pending_backups_count,
-        'pending_insumos_count': pending_insumos_count,
-    }
-    return render(request, 'coordinacion/coordinacion.html', context)
+    # Los contadores de solicitudes pendientes llegan a la plantilla como `pendientes`
+    # (ver context_processors.contadores_pendientes).
+    return render(request, 'coordinacion/coordinacion.html')
 
 #Vistas de Gestión para Coordinación
 
@@ -371,8 +354,9 @@ def gestion_agenda(request):
                 count = slots_query.count()
                 slots_query.delete()
 
-                Historial_Cambios.objects.create(
+                auditoria.registrar(
                     usuario=request.user, tipo_cambio=Historial_Cambios.TipoCambio.ELIMINACION,
+                    tipo_evento=Historial_Cambios.TipoEvento.AGENDA,
                     tabla_afectada="Agenda_Taller",
                     descripcion=f"Se eliminaron {count} slots de agenda del taller '{data['taller']}' entre {data['fecha_inicio']} y {data['fecha_fin']}."
                 )
@@ -391,8 +375,9 @@ def gestion_agenda(request):
                     descripcion_slot = str(slot) # Guardamos una descripción para el mensaje.
                     slot.delete()
                     
-                    Historial_Cambios.objects.create(
+                    auditoria.registrar(
                         usuario=request.user, tipo_cambio=Historial_Cambios.TipoCambio.ELIMINACION,
+                        tipo_evento=Historial_Cambios.TipoEvento.AGENDA,
                         tabla_afectada="Agenda_Taller", id_registro_afectado=slot_id,
                         descripcion=f"Se eliminó el slot específico: {descripcion_slot}."
                     )
@@ -406,26 +391,7 @@ def gestion_agenda(request):
         generador_form = GeneradorAgendaForm()
         eliminador_form = EliminadorAgendaForm()
 
-    # Lógica para el Calendario
-    eventos_agenda = Agenda_Taller.objects.select_related('mantenimiento__vehiculo').all()
-    calendar_events = []
-    for evento in eventos_agenda:
-        if evento.mantenimiento:
-            title = f"Ocupado: {evento.mantenimiento.vehiculo.patente}"
-            backgroundColor = '#dc3545' # Rojo para ocupado
-        else:
-            title = "Disponible"
-            backgroundColor = '#198754' # Verde para disponible
-        
-        calendar_events.append({
-            'title': title,
-            'start': evento.hora_inicio.isoformat(),
-            'end': evento.hora_final.isoformat(),
-            'backgroundColor': backgroundColor,
-            'borderColor': backgroundColor,
-            'textColor': 'white',
-        })
-
+    # Los eventos del calendario se cargan por rango de fechas desde 'agenda_eventos'.
     slots_eliminables = Agenda_Taller.objects.filter(
         mantenimiento__isnull=True
     ).select_related('taller').order_by('hora_inicio')
@@ -433,12 +399,84 @@ def gestion_agenda(request):
     context = {
         'form_generador': generador_form,
         'form_eliminador': eliminador_form,
-        'calendar_events': json.dumps(calendar_events),
         'slots_eliminables': slots_eliminables,
+        'talleres': Taller.objects.order_by('nombre_taller'),
     }
     return render(request, 'coordinacion/gestion_agenda.html', context)
 
 
+def _parsear_fecha_calendario(valor):
+    """FullCalendar envía fechas ISO 8601, con o sin hora y zona horaria."""
+    fecha = parse_datetime(valor or '')
+    if fecha is None:
+        dia = parse_date(valor or '')
+        if dia is None:
+            return None
+        fecha = datetime.combine(dia, datetime.min.time())
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+@login_required
+@role_required(allowed_roles=[Usuario.Roles.COORDINACION])
+def agenda_eventos(request):
+    """
+    Feed JSON para FullCalendar con los bloques de agenda de la ventana visible
+    (parámetros `start`, `end` y opcionalmente `taller`).
+    Responde 304 si los bloques de la ventana no cambiaron desde la última consulta.
+    """
+    inicio = _parsear_fecha_calendario(request.GET.get('start'))
+    fin = _parsear_fecha_calendario(request.GET.get('end'))
+    if inicio is None or fin is None or inicio >= fin:
+        return JsonResponse({'error': "Parámetros 'start' y 'end' inválidos."}, status=400)
+
+    # Un bloque es visible si se superpone con la ventana, aunque empiece antes o termine después.
+    bloques = Agenda_Taller.objects.filter(hora_inicio__lt=fin, hora_final__gt=inicio)
+    taller_id = request.GET.get('taller')
+    if taller_id:
+        if not taller_id.isdigit():
+            return JsonResponse({'error': "Parámetro 'taller' inválido."}, status=400)
+        bloques = bloques.filter(taller_id=taller_id)
+
+    # Las eliminaciones no dejan fecha de modificación, por eso el ETag incluye también el total de bloques.
+    estado = bloques.aggregate(total=Count('id'), ultima_modificacion=Max('actualizado_en'))
+    ultima_modificacion = estado['ultima_modificacion']
+    etag = quote_etag(hashlib.md5(
+        f"{estado['total']}|{ultima_modificacion.isoformat() if ultima_modificacion else ''}".encode()
+    ).hexdigest())
+
+    respuesta = get_conditional_response(request, etag=etag, last_modified=(
+        int(ultima_modificacion.timestamp()) if ultima_modificacion else None
+    ))
+    if respuesta is None:
+        calendar_events = []
+        for evento in bloques.values('hora_inicio', 'hora_final', 'mantenimiento__vehiculo__patente').order_by('hora_inicio'):
+            if evento['mantenimiento__vehiculo__patente']:
+                title = f"Ocupado: {evento['mantenimiento__vehiculo__patente']}"
+                backgroundColor = '#dc3545' # Rojo para ocupado
+            else:
+                title = "Disponible"
+                backgroundColor = '#198754' # Verde para disponible
+
+            calendar_events.append({
+                'title': title,
+                'start': evento['hora_inicio'].isoformat(),
+                'end': evento['hora_final'].isoformat(),
+                'backgroundColor': backgroundColor,
+                'borderColor': backgroundColor,
+                'textColor': 'white',
+            })
+        respuesta = JsonResponse(calendar_events, safe=False)
+
+    respuesta['ETag'] = etag
+    if ultima_modificacion:
+        respuesta['Last-Modified'] = http_date(ultima_modificacion.timestamp())
+    # El navegador puede guardar la respuesta, pero debe revalidarla en cada cambio de vista.
+    patch_cache_control(respuesta, private=True, no_cache=True)
+    return respuesta
+
+
 from django.views.generic import ListView, CreateView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 
@@ -449,11 +487,12 @@ class CoordinationRequiredMixin(UserPassesTestMixin):
 
 #Gestión de Usuarios
 
-class UserListView(LoginRequiredMixin, CoordinationRequiredMixin, ListView):
-    """Muestra una lista de todos los usuarios, con filtros por rol y especialidad."""
+class UserListView(LoginRequiredMixin, CoordinationRequiredMixin, KeysetPaginationMixin, ListView):
+    """Muestra una lista paginada de los usuarios, con filtros por rol y especialidad."""
     model = Usuario
     template_name = 'coordinacion/user_list.html'
     context_object_name = 'usuarios'
+    orden_keyset = ('first_name', 'id')
 
     def get_queryset(self):
         queryset = super().get_queryset().order_by('first_name')
@@ -517,8 +556,9 @@ class UserEditView(LoginRequiredMixin, CoordinationRequiredMixin, UpdateView):
         if new_password:
             descripcion_historial += " Se cambió la contraseña."
 
-        Historial_Cambios.objects.create(
+        auditoria.registrar(
             usuario=self.request.user, tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
+            tipo_evento=Historial_Cambios.TipoEvento.USUARIO,
             tabla_afectada="Usuario", id_registro_afectado=usuario.id,
             descripcion=descripcion_historial
         )
@@ -542,11 +582,12 @@ def user_deactivate(request, pk):
 
 # Gestión de Vehículos
 
-class VehicleListView(LoginRequiredMixin, CoordinationRequiredMixin, ListView):
-    """Muestra una lista de todos los vehículos, con filtros."""
+class VehicleListView(LoginRequiredMixin, CoordinationRequiredMixin, KeysetPaginationMixin, ListView):
+    """Muestra una lista paginada de los vehículos, con filtros."""
     model = Vehiculo
     template_name = 'coordinacion/vehicle_list.html'
     context_object_name = 'vehiculos'
+    orden_keyset = ('patente',)
 
     def get_queryset(self):
         queryset = super().get_queryset().select_related('chofer_asignado', 'sitio').order_by('patente')
@@ -695,16 +736,23 @@ def gestion_backups(request):
                         vehiculo.chofer_asignado = chofer_solicitante 
                         vehiculo.estado_actual = Vehiculo.EstadoVehiculo.ASIGNADO
                         vehiculo.save()
+                        auditoria.registrar(
+                            usuario=request.user, tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
+                            tipo_evento=Historial_Cambios.TipoEvento.ASIGNACION_BACKUP,
+                            tabla_afectada="Vehiculo", id_registro_afectado=vehiculo.patente, vehiculo=vehiculo,
+                            descripcion=f"Coordinador asignó backup {vehiculo.patente} a {chofer_solicitante.get_full_name()}."
+                        )
                         messages.success(request, f"Vehículo de respaldo {patente} asignado a {chofer_solicitante.get_full_name()}.")
 
                         # Si la asignación viene de una solicitud, la marcamos como atendida
-                        if solicitud_id:
-                            solicitud = SolicitudBackup.objects.get(id=solicitud_id)
-                            solicitud.estado = SolicitudBackup.EstadoSolicitud.ATENDIDA
-                            solicitud.atendido_por = request.user
-                            solicitud.fecha_atencion = timezone.now()
-                            solicitud.vehiculo_asignado = vehiculo
-                            solicitud.save()
+                        # (solo si sigue pendiente, para no descontarla dos veces del contador).
+                        solicitud = SolicitudBackup.objects.filter(id=solicitud_id).first() if solicitud_id else None
+                        if solicitud:
+                            efectos.actualizar_si(
+                                solicitud, {'estado': SolicitudBackup.EstadoSolicitud.PENDIENTE},
+                                estado=SolicitudBackup.EstadoSolicitud.ATENDIDA, atendido_por=request.user,
+                                fecha_atencion=timezone.now(), vehiculo_asignado=vehiculo,
+                            )
                     else:
                         messages.error(request, f"No se puede asignar un respaldo. El vehículo principal de {chofer_solicitante.get_full_name()} no está en el taller.")
 
@@ -714,8 +762,8 @@ def gestion_backups(request):
                 return redirect('gestion_backups')
 
 
-    backups_disponibles = Vehiculo.objects.filter(es_backup=True, estado_actual=Vehiculo.EstadoVehiculo.DISPONIBLE)
-    backups_asignados = Vehiculo.objects.filter(es_backup=True, estado_actual__in=[Vehiculo.EstadoVehiculo.ASIGNADO, Vehiculo.EstadoVehiculo.EN_RUTA])
+    backups_disponibles = Vehiculo.objects.filter(es_backup=True, estado_actual=Vehiculo.EstadoVehiculo.DISPONIBLE).select_related('sitio')
+    backups_asignados = Vehiculo.objects.filter(es_backup=True, estado_actual__in=[Vehiculo.EstadoVehiculo.ASIGNADO, Vehiculo.EstadoVehiculo.EN_RUTA]).select_related('chofer_asignado')
     solicitudes_pendientes = SolicitudBackup.objects.filter(estado=SolicitudBackup.EstadoSolicitud.PENDIENTE).select_related('chofer')
     form = AsignarBackupForm()
     context = {
@@ -733,10 +781,11 @@ def reporte_intercambios(request):
     Muestra un historial de los movimientos de vehículos de respaldo.
     """
     historial = Historial_Cambios.objects.filter(
-        descripcion__icontains='backup'
-    ).select_related('usuario').order_by('-fecha_cambio')
+        tipo_evento__in=Historial_Cambios.EVENTOS_BACKUP
+    ).select_related('usuario')
+    pagina = paginar_keyset(request, historial, ('-fecha_cambio', '-id'))
 
-    context = {'historial': historial}
+    context = {'historial': pagina.objetos, 'pagina': pagina}
     return render(request, 'coordinacion/reporte_intercambios.html', context)
 
 @login_required
@@ -747,14 +796,111 @@ def reporte_entradas_salidas(request):
     registradas por los guardias.
     """
     historial = Historial_Cambios.objects.filter(
-        Q(descripcion__icontains='ingresó al taller para mantenimiento') |
-        Q(descripcion__icontains='salió del recinto tras finalizar mantenimiento')
-    ).select_related('usuario').order_by('-fecha_cambio')
+        tipo_evento__in=Historial_Cambios.EVENTOS_ENTRADA_SALIDA
+    ).select_related('usuario')
+    pagina = paginar_keyset(request, historial, ('-fecha_cambio', '-id'))
 
-    context = {'historial': historial}
+    context = {'historial': pagina.objetos, 'pagina': pagina}
     return render(request, 'coordinacion/reporte_entradas_salidas.html', context)
 
 
+@login_required
+@role_required(allowed_roles=[Usuario.Roles.COORDINACION])
+def historial_archivado(request):
+    """
+    Consulta (solo lectura) de los registros de auditoría movidos a archivos por
+    `archivar_historial`. Se elige un archivo mensual y se recorre por páginas.
+    """
+    archivos = ArchivoHistorial.objects.all()
+    archivo = None
+    registros = []
+    pagina = None
+    tipo_evento = request.GET.get('tipo_evento') or None
+
+    archivo_id = request.GET.get('archivo')
+    if archivo_id:
+        archivo = get_object_or_404(ArchivoHistorial, id=archivo_id)
+        # El archivo se lee en orden, así que los cursores son la posición de la fila.
+        try:
+            inicio = max(int(request.GET.get('despues') or request.GET.get('antes') or 0), 0)
+        except ValueError:
+            inicio = 0
+        try:
+            filas = islice(leer_archivo(archivo, tipo_evento), inicio, inicio + TAMAÑO_PAGINA + 1)
+            registros = list(filas)
+        except FileNotFoundError:
+            messages.error(request, f"No se encontró el archivo {archivo.archivo}.")
+
+        hay_mas = len(registros) > TAMAÑO_PAGINA
+        registros = registros[:TAMAÑO_PAGINA]
+        etiquetas = dict(Historial_Cambios.TipoEvento.choices)
+        for registro in registros:
+            registro['evento'] = etiquetas.get(registro['tipo_evento'], registro['tipo_evento'])
+        pagina = PaginaKeyset(
+            registros,
+            cursor_siguiente=inicio + TAMAÑO_PAGINA if hay_mas else None,
+            cursor_anterior=max(inicio - TAMAÑO_PAGINA, 0) if inicio else None,
+        )
+
+    context = {
+        'archivos': archivos,
+        'archivo': archivo,
+        'registros': registros,
+        'pagina': pagina,
+        'tipo_evento': tipo_evento,
+        'tipos_evento': Historial_Cambios.TipoEvento.choices,
+    }
+    return render(request, 'coordinacion/historial_archivado.html', context)
+
+
+@login_required
+@role_required(allowed_roles=[Usuario.Roles.COORDINACION, Usuario.Roles.SUPERVISOR])
+def busqueda_global(request):
+    """
+    Búsqueda de texto en el historial de auditoría, los mantenimientos (motivo, diagnóstico
+    y trabajo realizado) y las observaciones, ordenada por relevancia.
+    """
+    q = request.GET.get('q', '').strip()
+    resultados = buscar(q) if q else []
+    return render(request, 'busqueda.html', {'q': q, 'resultados': resultados})
+
+
+@staff_member_required
+def perfilado_vistas(request):
+    """
+    Resumen por vista de las últimas peticiones medidas por PerfiladoMiddleware en este proceso
+    (se activa con PERFILADO=1). Con POST se vacían las mediciones.
+    """
+    if request.method == 'POST':
+        perfilado.vaciar()
+        messages.success(request, "Se vaciaron las mediciones.")
+        return redirect('perfilado_vistas')
+
+    context = {
+        'activo': settings.PERFILADO,
+        'capacidad': settings.PERFILADO_MUESTRAS,
+        'resumenes': perfilado.resumen_por_vista(),
+        'recientes': perfilado.mediciones()[:-51:-1],
+    }
+    return render(request, 'perfilado.html', context)
+
+
+def metricas_prometheus(request):
+    """
+    Métricas de peticiones y del negocio en el formato de texto de Prometheus.
+    El scraper se identifica con METRICAS_TOKEN; sin token configurado, solo el personal staff
+    (con sesión iniciada) puede verlas.
+    """
+    token = settings.METRICAS_TOKEN
+    if token:
+        autorizado = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        autorizado = request.user.is_active and request.user.is_staff
+    if not autorizado:
+        return HttpResponse(status=401)
+    return HttpResponse(metricas.exposicion(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required
 @role_required(allowed_roles=[Usuario.Roles.COORDINACION, Usuario.Roles.JEFE_TALLER])
 def gestion_insumos(request):
@@ -790,25 +936,38 @@ def procesar_insumo(request, insumo_id):
         accion = request.POST.get('accion')
 
         if accion in ['aprobar', 'rechazar']:
-            insumo.aprobado_por = request.user
-            insumo.fecha_aprobacion = timezone.now()
-            
             if accion == 'aprobar':
-                insumo.estado_aprobacion = Insumo.EstadoAprobacion.APROBADO
-                messages.success(request, f"Insumo '{insumo.nombre_insumo}' APROBADO.")
-                desc_historial = f"Aprobó insumo '{insumo.nombre_insumo}' para mant. #{insumo.mantenimiento.id}."
+                nuevo_estado = Insumo.EstadoAprobacion.APROBADO
+                desc_historial = f"Aprobó insumo '{insumo.nombre_insumo}' para mant. #{insumo.mantenimiento_id}."
+                tipo_evento = Historial_Cambios.TipoEvento.INSUMO_APROBADO
             else: # rechazar
-                insumo.estado_aprobacion = Insumo.EstadoAprobacion.RECHAZADO
+                nuevo_estado = Insumo.EstadoAprobacion.RECHAZADO
+                desc_historial = f"Rechazó insumo '{insumo.nombre_insumo}' para mant. #{insumo.mantenimiento_id}."
+                tipo_evento = Historial_Cambios.TipoEvento.INSUMO_RECHAZADO
+
+            # Solo se procesa si sigue pendiente: si otro usuario lo resolvió al mismo tiempo,
+            # no se actualiza nada y el contador de pendientes no se descuenta dos veces.
+            with transaction.atomic():
+                procesado = efectos.actualizar_si(
+                    insumo, {'estado_aprobacion': Insumo.EstadoAprobacion.PENDIENTE},
+                    estado_aprobacion=nuevo_estado, aprobado_por=request.user, fecha_aprobacion=timezone.now(),
+                )
+            if not procesado:
+                messages.warning(request, f"El insumo '{insumo.nombre_insumo}' ya fue procesado por otro usuario.")
+                return redirect('gestion_insumos')
+
+            if accion == 'aprobar':
+                messages.success(request, f"Insumo '{insumo.nombre_insumo}' APROBADO.")
+            else:
                 messages.warning(request, f"Insumo '{insumo.nombre_insumo}' RECHAZADO.")
-                desc_historial = f"Rechazó insumo '{insumo.nombre_insumo}' para mant. #{insumo.mantenimiento.id}."
-            
-            insumo.save()
 
-            Historial_Cambios.objects.create(
+            auditoria.registrar(
                 usuario=request.user,
                 tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
+                tipo_evento=tipo_evento,
                 tabla_afectada="Insumo",
                 id_registro_afectado=insumo.id,
+                mantenimiento_id=insumo.mantenimiento_id,
                 descripcion=desc_historial
             )
         else:
@@ -827,43 +986,48 @@ def intercambio_vehiculo(request):
         chofer_id = request.POST.get('chofer_id')
         try:
             chofer = Usuario.objects.get(id=chofer_id)
-            
-            # 1. Encontrar y procesar el vehículo de respaldo
-            backup = Vehiculo.objects.filter(chofer_asignado=chofer, es_backup=True, estado_actual=Vehiculo.EstadoVehiculo.EN_RUTA).first()
-            if backup:
-                backup.chofer_asignado = None
-                backup.estado_actual = Vehiculo.EstadoVehiculo.DISPONIBLE
-                backup.save()
-            
-            # 2. Encontrar el mantenimiento validado del vehículo principal
-            mantenimiento_validado = Mantenimiento.objects.get(
-                vehiculo__chofer_asignado=chofer,
-                vehiculo__es_backup=False,
-                estado=Mantenimiento.Estado.VALIDADO
-            )
-            vehiculo_principal = mantenimiento_validado.vehiculo
-            vehiculo_principal.estado_actual = Vehiculo.EstadoVehiculo.DISPONIBLE
-            vehiculo_principal.save() # El estado cambiará a EN_RUTA en el registro de salida.
-
-            # 3. Finalizar el ciclo de mantenimiento
-            mantenimiento_validado.estado = Mantenimiento.Estado.FINALIZADO
-            mantenimiento_validado.fecha_salida_real = timezone.now()
-            mantenimiento_validado.save()
-
-            # 4. Registrar en el historial
-            Historial_Cambios.objects.create(
-                usuario=request.user,
-                tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
-                tabla_afectada="Vehiculo",
-                id_registro_afectado=chofer.id,
-                descripcion=f"Intercambio procesado para {chofer.get_full_name()}. Devuelve backup {backup.patente if backup else 'N/A'} y retira {vehiculo_principal.patente}."
+            vehiculo_principal = Vehiculo.objects.select_related('mantenimiento_activo').get(
+                chofer_asignado=chofer,
+                es_backup=False,
+                mantenimiento_activo__estado=Mantenimiento.Estado.VALIDADO
             )
+            mantenimiento_validado = vehiculo_principal.mantenimiento_activo
+            mantenimiento_validado.vehiculo = vehiculo_principal
+
+            # Todo el intercambio se confirma junto: si falla un paso, nada queda a medias.
+            with transaction.atomic():
+                # 1. Finalizar el ciclo de mantenimiento (falla si otro guardia ya lo procesó)
+                transiciones.aplicar(transiciones.FINALIZAR, [mantenimiento_validado], usuario=request.user)
+
+                # 2. Liberar el vehículo de respaldo
+                backup = Vehiculo.objects.filter(chofer_asignado=chofer, es_backup=True, estado_actual=Vehiculo.EstadoVehiculo.EN_RUTA).first()
+                if backup:
+                    backup.chofer_asignado = None
+                    backup.estado_actual = Vehiculo.EstadoVehiculo.DISPONIBLE
+                    backup.save(update_fields=['chofer_asignado', 'estado_actual'])
+
+                vehiculo_principal.estado_actual = Vehiculo.EstadoVehiculo.DISPONIBLE
+                vehiculo_principal.save(update_fields=['estado_actual']) # El estado cambiará a EN_RUTA en el registro de salida.
+
+                # 3. Registrar en el historial
+                auditoria.registrar(
+                    usuario=request.user,
+                    tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
+                    tipo_evento=Historial_Cambios.TipoEvento.INTERCAMBIO_BACKUP,
+                    tabla_afectada="Vehiculo",
+                    id_registro_afectado=chofer.id,
+                    vehiculo=vehiculo_principal,
+                    mantenimiento=mantenimiento_validado,
+                    descripcion=f"Intercambio procesado para {chofer.get_full_name()}. Devuelve backup {backup.patente if backup else 'N/A'} y retira {vehiculo_principal.patente}."
+                )
             messages.success(request, f"Intercambio para {chofer.get_full_name()} procesado con éxito.")
 
         except Usuario.DoesNotExist:
             messages.error(request, "El chofer especificado no existe.")
-        except Mantenimiento.DoesNotExist:
+        except Vehiculo.DoesNotExist:
             messages.error(request, "No se encontró un mantenimiento validado para este chofer.")
+        except transiciones.TransicionInvalida:
+            messages.error(request, "Este intercambio ya fue procesado por otro usuario.")
         
         return redirect('intercambio_vehiculo')
 
@@ -885,43 +1049,50 @@ def mecanico_dashboard(request):
     Panel principal para el Mecánico.
     Separa los trabajos en dos listas: los que están activos y los que ya ha completado.
     """
-    mantenimientos_activos = Mantenimiento.objects.filter(
-        mecanico_asignado=request.user,
-        estado__in=[
-            Mantenimiento.Estado.DIAGNOSTICO,
-            Mantenimiento.Estado.EN_REPARACION
-        ]
-    ).order_by('agenda__hora_inicio')
+    def construir():
+        # Junto a los trabajos activos traemos, en una sola consulta adicional, solo la última
+        # observación de rechazo de cada uno (Prefetch con slice usa una función de ventana).
+        mantenimientos_activos = Mantenimiento.objects.filter(
+            mecanico_asignado=request.user,
+            estado__in=[
+                Mantenimiento.Estado.DIAGNOSTICO,
+                Mantenimiento.Estado.EN_REPARACION
+            ]
+        ).select_related('vehiculo', 'agenda').prefetch_related(
+            Prefetch(
+                'observaciones',
+                queryset=Observacion.objects.filter(
+                    tipo=Observacion.Tipo.RECHAZO_SUPERVISOR
+                ).order_by('-fecha', '-id')[:1],
+                to_attr='ultimo_rechazo',
+            )
+        ).order_by('agenda__hora_inicio')
+
+        # --- Consulta 2: Trabajos Completados ---
+        mantenimientos_completados = Mantenimiento.objects.filter(
+            mecanico_asignado=request.user,
+            estado__in=[
+                Mantenimiento.Estado.REPARADO,
+                Mantenimiento.Estado.VALIDADO,
+                Mantenimiento.Estado.FINALIZADO
+            ]
+        ).select_related('vehiculo', 'agenda').order_by('-fecha_salida_real')
+
+        return {
+            'mantenimientos_activos': list(mantenimientos_activos),
+            'mantenimientos_completados': list(mantenimientos_completados),
+        }
+
+    context = obtener_panel(Usuario.Roles.MECANICO, construir, usuario_id=request.user.id)
 
     # Notificación de trabajos rechazados
-    for mant in mantenimientos_activos:
-        if mant.estado == Mantenimiento.Estado.DIAGNOSTICO:
-            # Un mantenimiento vuelve a 'Diagnóstico' si es rechazado.
-            # Buscamos la última observación de rechazo para este mantenimiento.
-            observacion_rechazo = Observacion.objects.filter(
-                mantenimiento=mant,
-                texto__startswith='RECHAZO DE SUPERVISOR:'
-            ).order_by('-fecha').first()
-
-            if observacion_rechazo:
-                motivo = observacion_rechazo.texto.replace("RECHAZO DE SUPERVISOR: ", "")
-                mensaje = f"**Trabajo Rechazado (Patente {mant.vehiculo.patente}):** El supervisor devolvió el trabajo con la siguiente observación: \"{motivo}\""
-                messages.error(request, mensaje)
-
-    # --- Consulta 2: Trabajos Completados ---
-    mantenimientos_completados = Mantenimiento.objects.filter(
-        mecanico_asignado=request.user,
-        estado__in=[
-            Mantenimiento.Estado.REPARADO,
-            Mantenimiento.Estado.VALIDADO,
-            Mantenimiento.Estado.FINALIZADO
-        ]
-    ).order_by('-fecha_salida_real')
+    for mant in context['mantenimientos_activos']:
+        # Un mantenimiento vuelve a 'Diagnóstico' si es rechazado.
+        if mant.estado == Mantenimiento.Estado.DIAGNOSTICO and mant.ultimo_rechazo:
+            motivo = mant.ultimo_rechazo[0].texto.replace("RECHAZO DE SUPERVISOR: ", "")
+            mensaje = f"**Trabajo Rechazado (Patente {mant.vehiculo.patente}):** El supervisor devolvió el trabajo con la siguiente observación: \"{motivo}\""
+            messages.error(request, mensaje)
 
-    context = {
-        'mantenimientos_activos': mantenimientos_activos,
-        'mantenimientos_completados': mantenimientos_completados
-    }
     return render(request, 'mecanico/mecanico.html', context)
 
 @login_required
@@ -941,21 +1112,23 @@ def supervisor_dashboard(request):
     Muestra una lista prioritaria de mantenimientos que los mecánicos han marcado
     como 'REPARADO' y que están pendientes de su validación.
     """
-    mantenimientos_por_validar = Mantenimiento.objects.filter(
-        estado=Mantenimiento.Estado.REPARADO
-    ).select_related('vehiculo', 'mecanico_asignado').order_by('fecha_solicitud')
+    mantenimientos_por_validar = obtener_panel(Usuario.Roles.SUPERVISOR, lambda: list(
+        Mantenimiento.objects.filter(
+            estado=Mantenimiento.Estado.REPARADO
+        ).select_related('vehiculo', 'mecanico_asignado').order_by('fecha_solicitud')
+    ))
 
     context = {
         'mantenimientos_por_validar': mantenimientos_por_validar,
     }
-    return render(request, 'supervisor/supervisor.html', context)
+    return render_con_seccion_en_vivo(request, 'supervisor/supervisor.html', 'supervisor/reparaciones_por_validar.html', context)
 
 @login_required
 @role_required(allowed_roles=[Usuario.Roles.SUPERVISOR])
 def supervisor_reportes(request):
     """
-    Genera KPIs y permite exportar datos detallados de mantenimientos a un archivo Excel.
-    Permite filtrar por mes o por año completo.
+    Genera KPIs y permite exportar datos detallados de mantenimientos a un archivo Excel
+    (`?export`) o CSV (`?export=csv`). Permite filtrar por mes o por año completo.
     """
     today = timezone.now()
     year = int(request.GET.get('year', today.year))
@@ -980,87 +1153,47 @@ def supervisor_reportes(request):
             mantenimientos_query = mantenimientos_query.filter(fecha_salida_real__month=month)
 
         # Para evitar múltiples consultas a la base de datos dentro del bucle (problema N+1),
-        # traemos todas las solicitudes de backup relevantes de una sola vez.
-        chofer_ids = [m.solicitado_por_id for m in mantenimientos_query if m.solicitado_por_id]
-        
+        # traemos todas las solicitudes de backup relevantes de una sola vez, ya ordenadas
+        # para el cruce por intervalos. Los choferes se filtran con una subconsulta.
         solicitudes_backup = SolicitudBackup.objects.filter(
-            chofer_id__in=chofer_ids,
-            estado=SolicitudBackup.EstadoSolicitud.ATENDIDA
-        ).select_related('vehiculo_asignado')
-
-        # Organizamos los backups en un diccionario para un acceso rápido.
-        backups_por_chofer = {}
-        for sb in solicitudes_backup:
-            backups_por_chofer.setdefault(sb.chofer_id, []).append(sb)
-
-        # Preparamos los datos para pandas
-        data_list = []
-        for mant in mantenimientos_query:
-            horas_en_taller = 'N/A'
-            if mant.fecha_hora_llegada and mant.fecha_salida_real:
-                delta = mant.fecha_salida_real - mant.fecha_hora_llegada
-                horas_en_taller = round(delta.total_seconds() / 3600, 2)
-
-            backup_otorgado = "No"
-            backup_patente = "N/A"
-            if mant.solicitado_por_id in backups_por_chofer:
-                for solicitud_backup in backups_por_chofer[mant.solicitado_por_id]:
-                    # Verificamos si la fecha de atención del backup está dentro del rango del mantenimiento
-                    if mant.fecha_hora_llegada <= solicitud_backup.fecha_atencion <= mant.fecha_salida_real:
-                        if solicitud_backup.vehiculo_asignado:
-                            backup_otorgado = "Sí"
-                            backup_patente = solicitud_backup.vehiculo_asignado.patente
-                            break # Si encontramos un backup en el rango, paramos de buscar.
-
-            data_list.append({
-                'ID Mantenimiento': mant.id,
-                'Patente': mant.vehiculo.patente,
-                'Vehículo': f"{mant.vehiculo.marca} {mant.vehiculo.modelo}",
-                'Mecánico': mant.mecanico_asignado.display_name if mant.mecanico_asignado else "N/A",
-                'Especialidad Mecánico': mant.mecanico_asignado.get_especialidad_display() if mant.mecanico_asignado else "N/A",
-                'Chofer': mant.solicitado_por.display_name if mant.solicitado_por else "N/A",
-                'Fecha Solicitud': mant.fecha_solicitud.strftime('%Y-%m-%d'),
-                'Fecha Finalización': mant.fecha_salida_real.strftime('%Y-%m-%d'),
-                'Horas en Taller': horas_en_taller,
-                'Taller': mant.taller.nombre_taller if mant.taller else "N/A",
-                'Sitio del Vehículo': mant.vehiculo.sitio.nombre_sitio if mant.vehiculo.sitio else "N/A",
-                'Diagnóstico': mant.diagnostico,
-                'Trabajo Realizado': mant.trabajo_realizado,
-                'Backup Otorgado': backup_otorgado,
-                'Patente Backup': backup_patente,
-            })
+            chofer_id__in=mantenimientos_query.values('solicitado_por_id'),
+            estado=SolicitudBackup.EstadoSolicitud.ATENDIDA,
+            fecha_atencion__isnull=False,
+            vehiculo_asignado__isnull=False,
+        ).order_by('chofer_id', 'fecha_atencion').only('chofer_id', 'fecha_atencion', 'vehiculo_asignado_id')
+        indice_backups = IndiceBackups(solicitudes_backup)
 
-        # Usamos pandas para crear un archivo Excel en memoria.
-        df = pd.DataFrame(data_list)
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Mantenimientos')
-        output.seek(0)
+        # Las filas se generan en streaming desde la base de datos, sin armar la lista completa en memoria.
+        filas = filas_reporte_mantenimientos(mantenimientos_query, indice_backups)
+        nombre_archivo = f"reporte_mantenimientos_{year}-{month_str}"
 
-        # Servimos el archivo Excel generado.
-        response = HttpResponse(output, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="reporte_mantenimientos_{year}-{month_str}.xlsx"'
-        return response
+        if request.GET.get('export') == 'csv':
+            return respuesta_csv(COLUMNAS_REPORTE_MANTENIMIENTOS, filas, nombre_archivo)
+        return respuesta_xlsx(COLUMNAS_REPORTE_MANTENIMIENTOS, filas, nombre_archivo, titulo_hoja='Mantenimientos')
 
     #Lógica para mostrar KPIs en la página
-    mantenimientos_periodo = Mantenimiento.objects.filter(
-        fecha_salida_real__year=year,
-        estado=Mantenimiento.Estado.FINALIZADO
-    )
+    # Se leen los resúmenes mensuales precalculados en vez de recorrer el historial completo.
+    resumenes_periodo = ResumenMensualKPI.objects.filter(año=year)
+    insumos_periodo = ResumenMensualInsumo.objects.filter(año=year)
     if month:
-        mantenimientos_periodo = mantenimientos_periodo.filter(fecha_salida_real__month=month)
-    
-    total_mantenimientos_mes = mantenimientos_periodo.count()
-
-    insumos_mes = Insumo.objects.filter(mantenimiento__in=mantenimientos_periodo)
-    total_insumos_mes = insumos_mes.count()
+        resumenes_periodo = resumenes_periodo.filter(mes=month)
+        insumos_periodo = insumos_periodo.filter(mes=month)
+
+    totales = resumenes_periodo.aggregate(
+        mantenimientos=Sum('total_mantenimientos'),
+        insumos=Sum('total_insumos'),
+        segundos=Sum('segundos_en_taller'),
+        con_tiempo=Sum('mantenimientos_con_tiempo'),
+    )
+    total_mantenimientos_mes = totales['mantenimientos'] or 0
+    total_insumos_mes = totales['insumos'] or 0
 
-    tiempo_promedio_reparacion = mantenimientos_periodo.aggregate(
-        avg_time=Avg(F('fecha_salida_real') - F('fecha_hora_llegada'))
-    )['avg_time']
+    tiempo_promedio_reparacion = None
+    if totales['con_tiempo']:
+        tiempo_promedio_reparacion = timedelta(seconds=totales['segundos'] / totales['con_tiempo'])
 
-    top_insumos = insumos_mes.values('nombre_insumo').annotate(
-        total=Count('nombre_insumo')
+    top_insumos = insumos_periodo.values('nombre_insumo').annotate(
+        total=Sum('total')
     ).order_by('-total')[:5]
 
     years_disponibles = range(2024, today.year + 2) # Rango de años para el filtro.
@@ -1085,34 +1218,74 @@ def supervisor_reportes(request):
 @login_required
 @role_required(allowed_roles=[Usuario.Roles.JEFE_TALLER])
 def jefe_taller_dashboard(request):
-    #Obtenemos los trabajos que el Guardia marcó como 'EN_TALLER'
-    trabajos_pendientes = Mantenimiento.objects.filter(
-        estado=Mantenimiento.Estado.EN_TALLER,
-        mecanico_asignado__isnull=True
-    ).order_by('fecha_hora_llegada')
-
-    trabajos_para_asignar = []
-    for trabajo in trabajos_pendientes:
-        # Para cada trabajo, buscamos mecánicos y los ordenamos por prioridad.
-        tipo_requerido = trabajo.agenda.tipo_atencion
-        
-        mecanicos_disponibles = Usuario.objects.filter(rol=Usuario.Roles.MECANICO).annotate(
-            orden_prioridad=Case(
-                When(especialidad=tipo_requerido, then=Value(1)),
-                When(especialidad=Usuario.Especialidades.GENERAL, then=Value(2)),
-                default=Value(3),
-            )
-        ).order_by('orden_prioridad', 'first_name')
+    def construir():
+        #Obtenemos los trabajos que el Guardia marcó como 'EN_TALLER'
+        trabajos_pendientes = Mantenimiento.objects.filter(
+            estado=Mantenimiento.Estado.EN_TALLER,
+            mecanico_asignado__isnull=True
+        ).select_related('vehiculo', 'agenda').order_by('fecha_hora_llegada')
+
+        # Traemos a los mecánicos una sola vez; la prioridad de cada trabajo se calcula en memoria.
+        mecanicos = list(Usuario.objects.filter(rol=Usuario.Roles.MECANICO).order_by('first_name'))
+        rankings = {}
+
+        trabajos_para_asignar = []
+        for trabajo in trabajos_pendientes:
+            # Para cada trabajo, ordenamos los mecánicos por prioridad:
+            # 1) especialidad requerida, 2) generales, 3) el resto.
+            tipo_requerido = trabajo.agenda.tipo_atencion
+            if tipo_requerido not in rankings:
+                prioridades = [
+                    (1 if m.especialidad == tipo_requerido else 2 if m.especialidad == Usuario.Especialidades.GENERAL else 3, m)
+                    for m in mecanicos
+                ]
+                # sorted() es estable, así que dentro de cada prioridad se mantiene el orden por nombre.
+                rankings[tipo_requerido] = sorted(prioridades, key=lambda par: par[0])
+
+            trabajos_para_asignar.append({
+                'trabajo': trabajo,
+                'mecanicos_disponibles': rankings[tipo_requerido]
+            })
 
-        trabajos_para_asignar.append({
-            'trabajo': trabajo,
-            'mecanicos_disponibles': mecanicos_disponibles
-        })
+        return trabajos_para_asignar
 
     context = {
-        'trabajos_para_asignar': trabajos_para_asignar
+        'trabajos_para_asignar': obtener_panel(Usuario.Roles.JEFE_TALLER, construir)
     }
-    return render(request, 'jefe_taller/jefe_taller.html', context)
+    return render_con_seccion_en_vivo(request, 'jefe_taller/jefe_taller.html', 'jefe_taller/trabajos_para_asignar.html', context)
+
+
+@login_required
+@role_required(allowed_roles=ROLES_CON_EVENTOS)
+def eventos_en_vivo(request):
+    """
+    Flujo server-sent events con los cambios de estado de mantenimientos que le interesan
+    al rol del usuario. Los paneles lo usan para actualizarse sin recargar la página.
+    Con ASGI el flujo es asíncrono y no ocupa un hilo por cliente.
+    """
+    if isinstance(request, ASGIRequest):
+        flujo = broker.flujo_async(request.user.rol)
+    else:
+        flujo = broker.flujo_sync(request.user.rol)
+
+    response = StreamingHttpResponse(flujo, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Evita que un proxy (ej: nginx) acumule los eventos.
+    return response
+
+
+def render_con_seccion_en_vivo(request, plantilla, seccion, context):
+    """
+    Renderiza la página completa o, si la pide en_vivo.js (cabecera X-En-Vivo), solo la
+    plantilla de la sección que se actualiza. La sección no extiende base.html, así que la
+    recarga en segundo plano no consume los mensajes pendientes del usuario.
+    """
+    if request.headers.get('X-En-Vivo'):
+        response = render(request, seccion, context)
+    else:
+        response = render(request, plantilla, context)
+    patch_vary_headers(response, ['X-En-Vivo'])
+    return response
 
 
 @login_required
@@ -1128,20 +1301,9 @@ def asignar_mantenimiento(request, mantenimiento_id):
             messages.error(request, "Debe seleccionar un mecánico para asignar el trabajo.")
             return redirect('jefe_taller_dashboard')
         try:
-            trabajo = Mantenimiento.objects.get(id=mantenimiento_id)
+            trabajo = Mantenimiento.objects.select_related('vehiculo').get(id=mantenimiento_id)
             mecanico = Usuario.objects.get(id=mecanico_id)
-            
-            trabajo.mecanico_asignado = mecanico
-            trabajo.estado = Mantenimiento.Estado.DIAGNOSTICO
-            trabajo.save()
-            
-            Historial_Cambios.objects.create(
-                usuario=request.user,
-                tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
-                tabla_afectada="Mantenimiento",
-                id_registro_afectado=trabajo.id,
-                descripcion=f"Jefe de Taller asignó mant. de {trabajo.vehiculo.patente} a {mecanico.display_name}."
-            )
+            transiciones.aplicar(transiciones.ASIGNAR, [trabajo], usuario=request.user, mecanico_asignado=mecanico)
             
             messages.success(request, f"Trabajo de {trabajo.vehiculo.patente} asignado a {mecanico.display_name}.")
             
@@ -1149,9 +1311,26 @@ def asignar_mantenimiento(request, mantenimiento_id):
             messages.error(request, "El trabajo que intentas asignar no existe.")
         except Usuario.DoesNotExist:
             messages.error(request, "El mecánico seleccionado no existe.")
+        except transiciones.TransicionInvalida:
+            messages.warning(request, "Este trabajo ya fue asignado o cambió de estado.")
             
     return redirect('jefe_taller_dashboard')
 
+@login_required
+@role_required(allowed_roles=[Usuario.Roles.JEFE_TALLER])
+def despachar_trabajos(request):
+    """
+    Asigna automáticamente todos los trabajos pendientes según especialidad y carga de los mecánicos.
+    """
+    if request.method == 'POST':
+        asignaciones = despachar_trabajos_pendientes(usuario=request.user)
+        if asignaciones:
+            messages.success(request, f"Se asignaron automáticamente {len(asignaciones)} trabajos.")
+        else:
+            messages.info(request, "No hay trabajos pendientes o mecánicos activos para asignar.")
+
+    return redirect('jefe_taller_dashboard')
+
 @login_required
 @role_required(allowed_roles=[Usuario.Roles.MECANICO])
 def detalle_mantenimiento(request, mantenimiento_id):
@@ -1182,19 +1361,26 @@ def detalle_mantenimiento(request, mantenimiento_id):
         if form_name == 'diagnostico':
             diag_form = DiagnosticoForm(request.POST, instance=mantenimiento)
             if diag_form.is_valid():
-                # Al guardar el primer diagnóstico, el estado pasa a 'EN_REPARACION'.
-                if mantenimiento.estado == Mantenimiento.Estado.DIAGNOSTICO:
-                    mantenimiento.estado = Mantenimiento.Estado.EN_REPARACION
-                
-                diag_form.save()
-                
-                Historial_Cambios.objects.create(
-                    usuario=request.user,
-                    tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
-                    tabla_afectada="Mantenimiento",
-                    id_registro_afectado=mantenimiento.id,
-                    descripcion="Mecánico actualizó diagnóstico/trabajo."
-                )
+                with transaction.atomic():
+                    # Solo los textos: el estado lo cambia la transición, no el formulario.
+                    diag_form.save(commit=False).save(update_fields=['diagnostico', 'trabajo_realizado'])
+                    # Al guardar el primer diagnóstico, el estado pasa a 'EN_REPARACION'.
+                    if mantenimiento.estado == Mantenimiento.Estado.DIAGNOSTICO:
+                        try:
+                            transiciones.aplicar(transiciones.INICIAR_REPARACION, [mantenimiento], usuario=request.user)
+                        except transiciones.TransicionInvalida:
+                            pass  # Ya estaba en reparación.
+
+                    auditoria.registrar(
+                        usuario=request.user,
+                        tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
+                        tipo_evento=Historial_Cambios.TipoEvento.DIAGNOSTICO,
+                        tabla_afectada="Mantenimiento",
+                        id_registro_afectado=mantenimiento.id,
+                        vehiculo_id=mantenimiento.vehiculo_id,
+                        mantenimiento=mantenimiento,
+                        descripcion="Mecánico actualizó diagnóstico/trabajo."
+                    )
                 messages.success(request, "Diagnóstico actualizado.")
         
         elif form_name == 'insumo':
@@ -1205,11 +1391,14 @@ def detalle_mantenimiento(request, mantenimiento_id):
                 insumo.solicitado_por = request.user
                 insumo.save()
                 
-                Historial_Cambios.objects.create(
+                auditoria.registrar(
                     usuario=request.user,
                     tipo_cambio=Historial_Cambios.TipoCambio.CREACION,
+                    tipo_evento=Historial_Cambios.TipoEvento.INSUMO_SOLICITADO,
                     tabla_afectada="Insumo",
                     id_registro_afectado=insumo.id,
+                    vehiculo_id=mantenimiento.vehiculo_id,
+                    mantenimiento=mantenimiento,
                     descripcion=f"Mecánico añadió insumo: {insumo.nombre_insumo} (Cant: {insumo.cantidad})."
                 )
                 messages.success(request, f"Insumo '{insumo.nombre_insumo}' añadido.")
@@ -1222,11 +1411,14 @@ def detalle_mantenimiento(request, mantenimiento_id):
                 foto.subido_por = request.user
                 foto.save()
                 
-                Historial_Cambios.objects.create(
+                auditoria.registrar(
                     usuario=request.user,
                     tipo_cambio=Historial_Cambios.TipoCambio.CREACION,
+                    tipo_evento=Historial_Cambios.TipoEvento.FOTO_EVIDENCIA,
                     tabla_afectada="FotoMantenimiento",
                     id_registro_afectado=foto.id,
+                    vehiculo_id=mantenimiento.vehiculo_id,
+                    mantenimiento=mantenimiento,
                     descripcion="Mecánico subió foto de evidencia."
                 )
                 messages.success(request, "Foto subida con éxito.")
@@ -1286,11 +1478,14 @@ def iniciar_pausa(request, mantenimiento_id):
                 # inicio_pausa se setea automáticamente (auto_now_add=True)
                 pausa.save()
                 
-                Historial_Cambios.objects.create(
+                auditoria.registrar(
                     usuario=request.user,
                     tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
+                    tipo_evento=Historial_Cambios.TipoEvento.INICIO_PAUSA,
                     tabla_afectada="Pausa",
                     id_registro_afectado=pausa.id,
+                    vehiculo_id=mantenimiento.vehiculo_id,
+                    mantenimiento=mantenimiento,
                     descripcion=f"Mecánico inició pausa. Motivo: {pausa.motivo}"
                 )
                 messages.success(request, f"Pausa iniciada. Motivo: {pausa.motivo}")
@@ -1325,11 +1520,14 @@ def terminar_pausa(request, mantenimiento_id):
             pausa_activa.fin_pausa = timezone.now() # Usamos timezone
             pausa_activa.save()
             
-            Historial_Cambios.objects.create(
+            auditoria.registrar(
                 usuario=request.user,
                 tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
+                tipo_evento=Historial_Cambios.TipoEvento.FIN_PAUSA,
                 tabla_afectada="Pausa",
                 id_registro_afectado=pausa_activa.id,
+                vehiculo_id=mantenimiento.vehiculo_id,
+                mantenimiento=mantenimiento,
                 descripcion="Mecánico terminó la pausa."
             )
             messages.success(request, "Pausa terminada. Puedes continuar con el trabajo.")
@@ -1355,19 +1553,13 @@ def cerrar_reparacion(request, mantenimiento_id):
             messages.error(request, "Debe completar el Diagnóstico y el Trabajo Realizado antes de cerrar.")
             return redirect('detalle_mantenimiento', mantenimiento_id=mantenimiento.id)
             
-        mantenimiento.estado = Mantenimiento.Estado.REPARADO
         # La fecha de finalización se registrará cuando el supervisor valide o el guardia despache.
         # Aquí solo se marca el fin del trabajo del mecánico.
-        mantenimiento.save()
-        
-        # 3. Creamos el registro de auditoría
-        Historial_Cambios.objects.create(
-            usuario=request.user,
-            tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
-            tabla_afectada="Mantenimiento",
-            id_registro_afectado=mantenimiento.id,
-            descripcion="Mecánico marcó la reparación como finalizada."
-        )
+        try:
+            transiciones.aplicar(transiciones.CERRAR, [mantenimiento], usuario=request.user)
+        except transiciones.TransicionInvalida:
+            messages.error(request, "Este mantenimiento ya fue cerrado o no está en reparación.")
+            return redirect('mecanico_dashboard')
         
         messages.success(request, "Trabajo finalizado y enviado a validación del Supervisor.")
         
@@ -1383,7 +1575,7 @@ def validar_reparacion(request, mantenimiento_id):
     Muestra toda la información de un mantenimiento para que el supervisor la revise.
     """
     mantenimiento = get_object_or_404(
-        Mantenimiento, 
+        Mantenimiento.objects.select_related('vehiculo'),
         id=mantenimiento_id, 
         estado=Mantenimiento.Estado.REPARADO
     )
@@ -1392,55 +1584,32 @@ def validar_reparacion(request, mantenimiento_id):
         accion = request.POST.get('accion')
         observacion_texto = request.POST.get('observaciones_supervisor', '').strip()
 
-        if accion == 'validar':
-            mantenimiento.estado = Mantenimiento.Estado.VALIDADO
-            mantenimiento.validado_por = request.user
-            mantenimiento.fecha_validacion = timezone.now()
-            mantenimiento.save()
-
-            # El vehículo ahora está listo para ser retirado por el chofer.
-            vehiculo = mantenimiento.vehiculo
-            vehiculo.estado_actual = Vehiculo.EstadoVehiculo.DISPONIBLE
-            vehiculo.save()
-
-            Historial_Cambios.objects.create(
-                usuario=request.user,
-                tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
-                tabla_afectada="Mantenimiento",
-                id_registro_afectado=mantenimiento.id,
-                descripcion=f"Reparación validada por supervisor. Patente: {mantenimiento.vehiculo.patente}"
-            )
+        try:
+            if accion == 'validar':
+                transiciones.aplicar(transiciones.VALIDAR, [mantenimiento], usuario=request.user)
+                messages.success(request, f"La reparación del vehículo {mantenimiento.vehiculo.patente} ha sido validada correctamente.")
+                return redirect('supervisor_dashboard')
 
-            messages.success(request, f"La reparación del vehículo {mantenimiento.vehiculo.patente} ha sido validada correctamente.")
+            elif accion == 'rechazar':
+                if not observacion_texto:
+                    messages.error(request, "Para rechazar una reparación, debe dejar una observación explicando el motivo.")
+                else:
+                    with transaction.atomic():
+                        # Vuelve a Diagnóstico, con la observación del rechazo.
+                        transiciones.aplicar(transiciones.RECHAZAR, [mantenimiento], usuario=request.user)
+                        Observacion.objects.create(
+                            mantenimiento=mantenimiento,
+                            usuario=request.user,
+                            tipo=Observacion.Tipo.RECHAZO_SUPERVISOR,
+                            texto=f"RECHAZO DE SUPERVISOR: {observacion_texto}"
+                        )
+
+                    messages.warning(request, f"La reparación ha sido rechazada y se ha notificado con su observación.")
+                    return redirect('supervisor_dashboard')
+        except transiciones.TransicionInvalida:
+            messages.error(request, "Otro supervisor ya revisó esta reparación.")
             return redirect('supervisor_dashboard')
 
-        elif accion == 'rechazar':
-            if not observacion_texto:
-                messages.error(request, "Para rechazar una reparación, debe dejar una observación explicando el motivo.")
-            else:
-                # 1. Cambiamos el estado del mantenimiento de vuelta a Diagnóstico
-                mantenimiento.estado = Mantenimiento.Estado.DIAGNOSTICO
-                mantenimiento.save()
-
-                # Añadimos la observación de rechazo
-                Observacion.objects.create(
-                    mantenimiento=mantenimiento,
-                    usuario=request.user,
-                    texto=f"RECHAZO DE SUPERVISOR: {observacion_texto}"
-                )
-
-                # Creamos un registro en el historial sobre el rechazo
-                Historial_Cambios.objects.create(
-                    usuario=request.user,
-                    tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
-                    tabla_afectada="Mantenimiento",
-                    id_registro_afectado=mantenimiento.id,
-                    descripcion=f"Reparación de {mantenimiento.vehiculo.patente} rechazada. Vuelve a diagnóstico."
-                )
-
-                messages.warning(request, f"La reparación ha sido rechazada y se ha notificado con su observación.")
-                return redirect('supervisor_dashboard')
-
     # Para el método GET, cargamos toda la información relevante del mantenimiento.
     fotos = mantenimiento.fotos.all()
     insumos = mantenimiento.insumos.all()
@@ -1454,11 +1623,32 @@ def validar_reparacion(request, mantenimiento_id):
     }
     return render(request, 'supervisor/validar_reparacion.html', context)
 
+@login_required
+@role_required(allowed_roles=[Usuario.Roles.SUPERVISOR])
+def validar_reparaciones(request):
+    """
+    Valida de una vez las reparaciones seleccionadas en el panel del Supervisor.
+    Las que otro supervisor ya revisó se omiten.
+    """
+    if request.method == 'POST':
+        ids = [i for i in request.POST.getlist('mantenimientos') if i.isdigit()]
+        seleccionados = Mantenimiento.objects.filter(id__in=ids).select_related('vehiculo')
+        if not ids:
+            messages.error(request, "Debe seleccionar al menos una reparación.")
+        else:
+            try:
+                validados = transiciones.aplicar(transiciones.VALIDAR, seleccionados, usuario=request.user)
+                messages.success(request, f"Se validaron {len(validados)} de {len(ids)} reparaciones seleccionadas.")
+            except transiciones.TransicionInvalida:
+                messages.warning(request, "Las reparaciones seleccionadas ya fueron revisadas.")
+
+    return redirect('supervisor_dashboard')
+
 @login_required
 @role_required(allowed_roles=[Usuario.Roles.SUPERVISOR])
 def seguimiento_mantenimientos(request):
     """
-    Muestra una lista de todos los mantenimientos en el sistema,
+    Muestra una lista paginada de todos los mantenimientos en el sistema,
     permitiendo al supervisor tener una visión completa.
     """
     filtro_patente = request.GET.get('patente', '').strip()
@@ -1466,7 +1656,7 @@ def seguimiento_mantenimientos(request):
 
     todos_los_mantenimientos = Mantenimiento.objects.select_related(
         'vehiculo', 'mecanico_asignado', 'solicitado_por'
-    ).order_by('-fecha_solicitud')
+    )
 
     if filtro_patente:
         todos_los_mantenimientos = todos_los_mantenimientos.filter(vehiculo__patente__icontains=filtro_patente)
@@ -1474,9 +1664,12 @@ def seguimiento_mantenimientos(request):
     if filtro_estado:
         todos_los_mantenimientos = todos_los_mantenimientos.filter(estado=filtro_estado)
 
+    pagina = paginar_keyset(request, todos_los_mantenimientos, ('-fecha_solicitud', '-id'))
+
     # Pasamos los filtros actuales de vuelta a la plantilla para que se mantengan en los inputs.
     context = {
-        'mantenimientos': todos_los_mantenimientos,
+        'mantenimientos': pagina.objetos,
+        'pagina': pagina,
         'estados_posibles': Mantenimiento.Estado.choices, # Pasamos los estados para el dropdown
         'filtro_patente_actual': filtro_patente,
         'filtro_estado_actual': filtro_estado,
@@ -1519,11 +1712,13 @@ def gestion_documentos_por_vehiculo(request, patente):
             documento.subido_por = request.user
             documento.save()
 
-            Historial_Cambios.objects.create(
+            auditoria.registrar(
                 usuario=request.user,
                 tipo_cambio=Historial_Cambios.TipoCambio.CREACION,
+                tipo_evento=Historial_Cambios.TipoEvento.DOCUMENTO,
                 tabla_afectada="Documento",
                 id_registro_afectado=documento.id,
+                vehiculo=vehiculo,
                 descripcion=f"Subió '{documento.nombre_documento}' para vehículo {vehiculo.patente}."
             )
             messages.success(request, "Documento subido correctamente.")
@@ -1576,50 +1771,39 @@ def registro_entrada(request):
         observaciones_guardia = request.POST.get('observaciones', '').strip()
         fotos = request.FILES.getlist('fotos')
 
-        # Buscamos si hay un mantenimiento agendado para este vehículo
-        mantenimiento_agendado = Mantenimiento.objects.filter(
-            vehiculo__patente=patente,
-            estado=Mantenimiento.Estado.AGENDADO
-        ).select_related('vehiculo').order_by('fecha_solicitud').first()
+        # Buscamos si el mantenimiento en curso del vehículo está agendado
+        vehiculo = Vehiculo.objects.select_related('mantenimiento_activo').filter(
+            patente=patente,
+            mantenimiento_activo__estado=Mantenimiento.Estado.AGENDADO
+        ).first()
+        mantenimiento_agendado = vehiculo.mantenimiento_activo if vehiculo else None
 
         if mantenimiento_agendado:
-            vehiculo = mantenimiento_agendado.vehiculo
-            now = timezone.now()
-
-            # Si hay cita, actualizamos el mantenimiento y el vehículo para el taller
-            mantenimiento_agendado.fecha_hora_llegada = now
-            mantenimiento_agendado.estado = Mantenimiento.Estado.EN_TALLER
-            mantenimiento_agendado.save()
-            
-            # Guardar observaciones y fotos asociadas al mantenimiento
-            if observaciones_guardia:
-                Observacion.objects.create(
-                    mantenimiento=mantenimiento_agendado,
-                    usuario=request.user,
-                    texto=f"OBSERVACIÓN DE GUARDIA (ENTRADA): {observaciones_guardia}"
-                )
-            
-            for foto_file in fotos:
-                FotoMantenimiento.objects.create(
-                    mantenimiento=mantenimiento_agendado,
-                    imagen=foto_file,
-                    descripcion="Foto de ingreso registrada por guardia.",
-                    subido_por=request.user
-                )
-
-            # El vehículo pasa a estar EN_TALLER
-            vehiculo.estado_actual = Vehiculo.EstadoVehiculo.EN_TALLER
-            vehiculo.save()
-
-            descripcion_historial = f"Vehículo {vehiculo.patente} ingresó al taller para mantenimiento #{mantenimiento_agendado.id} a las {now.strftime('%H:%M')}."
-            
-            Historial_Cambios.objects.create(
-                usuario=request.user,
-                tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
-                tabla_afectada="Vehiculo",
-                id_registro_afectado=vehiculo.patente,
-                descripcion=descripcion_historial
-            )
+            mantenimiento_agendado.vehiculo = vehiculo
+            try:
+                with transaction.atomic():
+                    # El mantenimiento pasa a EN_TALLER y el vehículo también.
+                    transiciones.aplicar(transiciones.INGRESAR, [mantenimiento_agendado], usuario=request.user)
+
+                    # Guardar observaciones y fotos asociadas al mantenimiento
+                    if observaciones_guardia:
+                        Observacion.objects.create(
+                            mantenimiento=mantenimiento_agendado,
+                            usuario=request.user,
+                            tipo=Observacion.Tipo.ENTRADA_GUARDIA,
+                            texto=f"OBSERVACIÓN DE GUARDIA (ENTRADA): {observaciones_guardia}"
+                        )
+
+                    for foto_file in fotos:
+                        FotoMantenimiento.objects.create(
+                            mantenimiento=mantenimiento_agendado,
+                            imagen=foto_file,
+                            descripcion="Foto de ingreso registrada por guardia.",
+                            subido_por=request.user
+                        )
+            except transiciones.TransicionInvalida:
+                messages.warning(request, f"El vehículo {vehiculo.patente} ya fue ingresado al taller.")
+                return redirect('registro_entrada')
 
             msg = f"Vehículo {vehiculo.patente} ingresado al taller para su cita."
             if fotos:
@@ -1634,7 +1818,7 @@ def registro_entrada(request):
     context = {
         'vehiculos_para_entrar': vehiculos_para_entrar
     }
-    return render(request, 'guardia/RegistroEntrada.html', context)
+    return render_con_seccion_en_vivo(request, 'guardia/RegistroEntrada.html', 'guardia/patentes_agendadas.html', context)
 
 
 @login_required
@@ -1669,46 +1853,65 @@ def registro_salida(request):
         now = timezone.now()
 
         try:
-            vehiculo = Vehiculo.objects.get(patente=patente)
+            vehiculo = Vehiculo.objects.select_related('mantenimiento_activo').get(patente=patente)
             chofer_asignado = None
 
-            mantenimiento_finalizado = Mantenimiento.objects.filter(
-                vehiculo=vehiculo,
-                estado=Mantenimiento.Estado.VALIDADO
-            ).order_by('-fecha_validacion').first()
-
-            if mantenimiento_finalizado:
-                mantenimiento_finalizado.fecha_salida_real = now
-                mantenimiento_finalizado.estado = Mantenimiento.Estado.FINALIZADO
-                mantenimiento_finalizado.save()
-                descripcion_historial = f"Vehículo {vehiculo.patente} salió del recinto tras finalizar mantenimiento #{mantenimiento_finalizado.id}."
-                messages.success(request, f"Vehículo {vehiculo.patente} salió correctamente tras finalizar su mantenimiento.")
+            mantenimiento_finalizado = vehiculo.mantenimiento_activo
+            if mantenimiento_finalizado and mantenimiento_finalizado.estado == Mantenimiento.Estado.VALIDADO:
+                mantenimiento_finalizado.vehiculo = vehiculo
             else:
-                descripcion_historial = f"Vehículo {vehiculo.patente} salió del recinto."
-                messages.success(request, f"Vehículo {vehiculo.patente} salió correctamente.")
+                mantenimiento_finalizado = None
 
             # Si se seleccionó un chofer, se le asigna el vehículo y se pone en ruta.
             if chofer_id:
                 try:
                     chofer_asignado = Usuario.objects.get(id=chofer_id)
-                    vehiculo.chofer_asignado = chofer_asignado
-                    vehiculo.estado_actual = Vehiculo.EstadoVehiculo.EN_RUTA
-                    descripcion_historial += f" Asignado a {chofer_asignado.display_name} a las {now.strftime('%H:%M')}."
                 except Usuario.DoesNotExist:
                     messages.error(request, "El chofer seleccionado no es válido.")
                     return redirect('registro_salida')
-            else:
-                vehiculo.estado_actual = Vehiculo.EstadoVehiculo.DISPONIBLE
 
-            vehiculo.save()
+            # El cierre del mantenimiento, el vehículo y el historial se confirman juntos.
+            with transaction.atomic():
+                if mantenimiento_finalizado:
+                    try:
+                        transiciones.aplicar(
+                            transiciones.FINALIZAR, [mantenimiento_finalizado],
+                            usuario=request.user, fecha_salida_real=now,
+                        )
+                    except transiciones.TransicionInvalida:
+                        messages.warning(request, f"La salida del vehículo {vehiculo.patente} ya fue registrada.")
+                        return redirect('registro_salida')
+                    descripcion_historial = f"Vehículo {vehiculo.patente} salió del recinto tras finalizar mantenimiento #{mantenimiento_finalizado.id}."
+                else:
+                    descripcion_historial = f"Vehículo {vehiculo.patente} salió del recinto."
 
-            Historial_Cambios.objects.create(
-                usuario=request.user,
-                tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
-                tabla_afectada="Vehiculo",
-                id_registro_afectado=vehiculo.patente,
-                descripcion=descripcion_historial
-            )
+                if chofer_asignado:
+                    vehiculo.chofer_asignado = chofer_asignado
+                    vehiculo.estado_actual = Vehiculo.EstadoVehiculo.EN_RUTA
+                    descripcion_historial += f" Asignado a {chofer_asignado.display_name} a las {now.strftime('%H:%M')}."
+                else:
+                    vehiculo.estado_actual = Vehiculo.EstadoVehiculo.DISPONIBLE
+
+                vehiculo.save(update_fields=['chofer_asignado', 'estado_actual'])
+
+                auditoria.registrar(
+                    usuario=request.user,
+                    tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
+                    tipo_evento=(
+                        Historial_Cambios.TipoEvento.SALIDA_TALLER if mantenimiento_finalizado
+                        else Historial_Cambios.TipoEvento.SALIDA_VEHICULO
+                    ),
+                    tabla_afectada="Vehiculo",
+                    id_registro_afectado=vehiculo.patente,
+                    vehiculo=vehiculo,
+                    mantenimiento=mantenimiento_finalizado,
+                    descripcion=descripcion_historial
+                )
+
+            if mantenimiento_finalizado:
+                messages.success(request, f"Vehículo {vehiculo.patente} salió correctamente tras finalizar su mantenimiento.")
+            else:
+                messages.success(request, f"Vehículo {vehiculo.patente} salió correctamente.")
             return redirect('registro_salida')
 
         except Vehiculo.DoesNotExist:
@@ -1746,11 +1949,13 @@ def registro_backup(request):
             vehiculo.estado_actual = Vehiculo.EstadoVehiculo.EN_RUTA
             vehiculo.save()
 
-            Historial_Cambios.objects.create(
+            auditoria.registrar(
                 usuario=request.user,
                 tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
+                tipo_evento=Historial_Cambios.TipoEvento.ENTREGA_BACKUP,
                 tabla_afectada="Vehiculo",
                 id_registro_afectado=vehiculo.patente,
+                vehiculo=vehiculo,
                 descripcion=f"Backup {vehiculo.patente} entregado a {chofer.first_name} {chofer.last_name} a las {timezone.now().strftime('%H:%M')}."
             )
 
@@ -1786,9 +1991,10 @@ def guardia_gestion_backups(request):
             if accion == 'registrar_salida' and vehiculo.estado_actual == Vehiculo.EstadoVehiculo.ASIGNADO:
                 vehiculo.estado_actual = Vehiculo.EstadoVehiculo.EN_RUTA
                 vehiculo.save()
-                Historial_Cambios.objects.create(
+                auditoria.registrar(
                     usuario=request.user, tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
-                    tabla_afectada="Vehiculo", id_registro_afectado=vehiculo.patente,
+                    tipo_evento=Historial_Cambios.TipoEvento.SALIDA_BACKUP,
+                    tabla_afectada="Vehiculo", id_registro_afectado=vehiculo.patente, vehiculo=vehiculo,
                     descripcion=f"Guardia registró salida de backup {vehiculo.patente} con chofer {vehiculo.chofer_asignado.display_name}."
                 )
                 messages.success(request, f"Salida del vehículo de respaldo {vehiculo.patente} registrada.")
@@ -1807,9 +2013,10 @@ def guardia_gestion_backups(request):
                     vehiculo.sitio = sitio_devolucion
                     vehiculo.save()
                     
-                    Historial_Cambios.objects.create(
+                    auditoria.registrar(
                         usuario=request.user, tipo_cambio=Historial_Cambios.TipoCambio.EDICION,
-                        tabla_afectada="Vehiculo", id_registro_afectado=vehiculo.patente,
+                        tipo_evento=Historial_Cambios.TipoEvento.DEVOLUCION_BACKUP,
+                        tabla_afectada="Vehiculo", id_registro_afectado=vehiculo.patente, vehiculo=vehiculo,
                         descripcion=f"Guardia registró ingreso de backup {vehiculo.patente} de chofer {chofer_anterior.display_name} en sitio {sitio_devolucion.nombre_sitio}."
                     )
                     messages.success(request, f"Ingreso del vehículo de respaldo {vehiculo.patente} registrado.")
@@ -1825,8 +2032,8 @@ def guardia_gestion_backups(request):
         return redirect('guardia_gestion_backups')
 
     # Para el método GET, separamos los vehículos según su estado para mostrarlos en listas diferentes.
-    backups_pendientes_salida = Vehiculo.objects.filter(es_backup=True, estado_actual=Vehiculo.EstadoVehiculo.ASIGNADO)
-    backups_en_ruta = Vehiculo.objects.filter(es_backup=True, estado_actual=Vehiculo.EstadoVehiculo.EN_RUTA)
+    backups_pendientes_salida = Vehiculo.objects.filter(es_backup=True, estado_actual=Vehiculo.EstadoVehiculo.ASIGNADO).select_related('chofer_asignado')
+    backups_en_ruta = Vehiculo.objects.filter(es_backup=True, estado_actual=Vehiculo.EstadoVehiculo.EN_RUTA).select_related('chofer_asignado')
     sitios = Sitio.objects.all()
 
     context = {
@@ -0,0 +1,37 @@
+// Actualiza en vivo las secciones marcadas con `data-en-vivo` cuando el servidor avisa
+// (server-sent events) que un mantenimiento cambió de estado. Con la cabecera X-En-Vivo la
+// vista responde solo la sección, sin base.html, para no consumir los mensajes pendientes.
+(function () {
+    const url = document.currentScript.dataset.eventosUrl;
+    if (!url || !window.EventSource) {
+        return;
+    }
+
+    let pendiente = null;
+
+    function refrescarSecciones() {
+        fetch(window.location.href, { headers: { 'X-En-Vivo': '1' } })
+            .then(function (respuesta) {
+                return respuesta.ok ? respuesta.text() : null;
+            })
+            .then(function (html) {
+                if (!html) {
+                    return;
+                }
+                const nuevo = new DOMParser().parseFromString(html, 'text/html');
+                document.querySelectorAll('[data-en-vivo]').forEach(function (seccion) {
+                    const reemplazo = nuevo.getElementById(seccion.id);
+                    if (reemplazo) {
+                        seccion.replaceWith(reemplazo);
+                    }
+                });
+            });
+    }
+
+    const fuente = new EventSource(url);
+    fuente.addEventListener('mantenimiento', function () {
+        // Varios cambios seguidos (ej: asignación automática) se agrupan en una sola recarga.
+        clearTimeout(pendiente);
+        pendiente = setTimeout(refrescarSecciones, 300);
+    });
+})();